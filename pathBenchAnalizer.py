@@ -1,27 +1,2024 @@
 import os
+import io
+import contextlib
 import sys
+import mmap
 import json
+import pickle
+import hashlib
 import time
 import signal
 import argparse
 import subprocess
+import queue
+import select
+import threading
+import http.client
+import urllib.parse
 import statistics
 import re
-import random
 from collections import defaultdict
-import pandas as pd
-import xlsxwriter
+from functools import lru_cache
+from itertools import cycle, islice, zip_longest
+import numpy as np
+
+
+#################################################
+# FUNCIONES DE INGESTA DE ARISTAS (edges.txt)
+#################################################
+
+# Tamaño de los bloques que se parsean de una vez desde el archivo mapeado en memoria
+EDGES_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def _iter_aligned_ranges(mm, start, end, chunk_size):
+    """Divide el rango [start, end) de un archivo mapeado en bloques que terminan en salto de línea"""
+    position = start
+    while position < end:
+        stop = min(position + chunk_size, end)
+        if stop < end:
+            newline = mm.find(b'\n', stop - 1, end)
+            stop = end if newline == -1 else newline + 1
+        yield position, stop
+        position = stop
+
+
+def _parse_edges_block(block):
+    """Parsea un bloque de bytes de edges.txt en columnas origen, relación y destino"""
+    import pandas as pd
+    
+    frame = pd.read_csv(io.BytesIO(block), header=None, usecols=[0, 1, 2],
+                        names=['origin', 'relation', 'target'], dtype=str, engine='c',
+                        keep_default_na=False, na_values=[''])
+    # Las líneas con menos de tres campos se descartan, igual que en el parseo línea a línea
+    return frame.dropna()
+
+
+def _encode_values(values, vocabulary):
+    """Codifica valores de texto a ids enteros usando un vocabulario compartido entre bloques"""
+    import pandas as pd
+    
+    codes, uniques = pd.factorize(values)
+    mapping = np.fromiter((vocabulary.setdefault(value, len(vocabulary)) for value in uniques),
+                          dtype=np.int64, count=len(uniques))
+    return mapping[codes]
+
+
+def load_edge_arrays(edges_path, start=0, end=None, chunk_size=EDGES_CHUNK_SIZE):
+    """
+    Carga edges.txt (o un rango de bytes del archivo) mediante memory-map y lo convierte
+    en arrays NumPy de (id de relación, id de origen, id de destino).
+    """
+    import pandas as pd
+    
+    relation_vocab = {}
+    node_vocab = {}
+    relation_parts = []
+    origin_parts = []
+    target_parts = []
+    
+    with open(edges_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = len(mm) if end is None else min(end, len(mm))
+                for block_start, block_end in _iter_aligned_ranges(mm, start, end, chunk_size):
+                    frame = _parse_edges_block(mm[block_start:block_end])
+                    if frame.empty:
+                        continue
+                    
+                    relation_parts.append(_encode_values(frame['relation'], relation_vocab).astype(np.int32))
+                    # Orígenes y destinos comparten el mismo espacio de ids de nodo
+                    node_codes = _encode_values(pd.concat([frame['origin'], frame['target']], ignore_index=True),
+                                                node_vocab).astype(np.int32)
+                    origin_parts.append(node_codes[:len(frame)])
+                    target_parts.append(node_codes[len(frame):])
+    
+    def concat(parts):
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+    
+    return {
+        'relations': list(relation_vocab),
+        'nodes': np.array(list(node_vocab), dtype=object),
+        'relation': concat(relation_parts),
+        'origin': concat(origin_parts),
+        'target': concat(target_parts)
+    }
+
+
+def _count_degrees(node_codes, rows, node_names):
+    """Cuenta grados con bincount y registra la fila de primera aparición de cada nodo"""
+    counts = np.bincount(node_codes)
+    nodes, first_seen = np.unique(node_codes, return_index=True)
+    return node_names[nodes], counts[nodes], rows[first_seen]
+
+
+def _degree_partials(edge_arrays):
+    """
+    Calcula los conteos parciales de grados por (relación, nodo) de un conjunto de aristas,
+    sin ordenar, junto con la fila donde aparece por primera vez cada relación y cada nodo.
+    """
+    relation = edge_arrays['relation']
+    node_names = edge_arrays['nodes']
+    order = np.argsort(relation, kind='stable')
+    boundaries = np.searchsorted(relation[order], np.arange(len(edge_arrays['relations']) + 1))
+    
+    partials = {}
+    for relation_id, relation_name in enumerate(edge_arrays['relations']):
+        rows = order[boundaries[relation_id]:boundaries[relation_id + 1]]
+        partials[relation_name] = {
+            'first_row': int(rows[0]),
+            'outgoing': _count_degrees(edge_arrays['origin'][rows], rows, node_names),
+            'incoming': _count_degrees(edge_arrays['target'][rows], rows, node_names)
+        }
+    
+    return partials
+
+
+def _sort_degree_partials(partials):
+    """
+    Ordena los conteos parciales: las etiquetas por orden de aparición en edges.txt y los nodos
+    de mayor a menor número de conexiones, desempatando por primera aparición.
+    """
+    degree_tables = {}
+    for relation_name in sorted(partials, key=lambda name: partials[name]['first_row']):
+        degree_tables[relation_name] = {}
+        for direction in ('outgoing', 'incoming'):
+            names, counts, first_rows = partials[relation_name][direction]
+            order = np.lexsort((first_rows, -counts))
+            degree_tables[relation_name][direction] = (names[order], counts[order])
+    
+    return degree_tables
+
+
+def compute_degree_tables(edge_arrays):
+    """
+    Calcula por etiqueta los grados salientes y entrantes de cada nodo. Cada tabla es un par
+    (ids de nodo, conexiones) ordenado de forma descendente y en el orden de aparición de
+    las etiquetas en edges.txt.
+    """
+    return _sort_degree_partials(_degree_partials(edge_arrays))
+
+
+def _shard_ranges(edges_path, num_shards):
+    """Divide edges.txt en rangos de bytes contiguos alineados a saltos de línea"""
+    size = os.path.getsize(edges_path)
+    if size == 0:
+        return []
+    
+    with open(edges_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return list(_iter_aligned_ranges(mm, 0, size, max(1, -(-size // num_shards))))
+
+
+def _count_degrees_shard(edges_path, start, end):
+    """Worker: cuenta los grados parciales de un rango de bytes de edges.txt"""
+    edge_arrays = load_edge_arrays(edges_path, start, end)
+    return len(edge_arrays['relation']), _degree_partials(edge_arrays)
+
+
+def _merge_degree_partials(shard_results):
+    """
+    Fusiona los conteos parciales de cada shard sumando conexiones y desplazando las filas de
+    primera aparición según el número de aristas de los shards anteriores.
+    """
+    import pandas as pd
+    
+    collected = defaultdict(lambda: {'first_row': None, 'outgoing': [], 'incoming': []})
+    row_offset = 0
+    for num_rows, partials in shard_results:
+        for relation_name, partial in partials.items():
+            merged = collected[relation_name]
+            if merged['first_row'] is None:
+                merged['first_row'] = partial['first_row'] + row_offset
+            for direction in ('outgoing', 'incoming'):
+                names, counts, first_rows = partial[direction]
+                merged[direction].append((names, counts, first_rows + row_offset))
+        row_offset += num_rows
+    
+    partials = {}
+    for relation_name, merged in collected.items():
+        partials[relation_name] = {'first_row': merged['first_row']}
+        for direction in ('outgoing', 'incoming'):
+            pieces = merged[direction]
+            frame = pd.DataFrame({
+                'node': np.concatenate([names for names, _, _ in pieces]),
+                'count': np.concatenate([counts for _, counts, _ in pieces]),
+                'first_row': np.concatenate([first_rows for _, _, first_rows in pieces])
+            })
+            grouped = frame.groupby('node', sort=False).agg({'count': 'sum', 'first_row': 'min'})
+            partials[relation_name][direction] = (
+                grouped.index.to_numpy(dtype=object),
+                grouped['count'].to_numpy(),
+                grouped['first_row'].to_numpy()
+            )
+    
+    return partials
+
+
+def compute_degree_tables_parallel(edges_path, workers):
+    """
+    Calcula las mismas tablas que compute_degree_tables repartiendo edges.txt en shards
+    procesados por un pool de procesos.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    ranges = _shard_ranges(edges_path, workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_count_degrees_shard, edges_path, start, end) for start, end in ranges]
+        shard_results = [future.result() for future in futures]
+    
+    return _sort_degree_partials(_merge_degree_partials(shard_results))
+
+
+#################################################
+# CACHÉ PERSISTENTE DE TABLAS DE GRADOS
+#################################################
+
+DEGREE_CACHE_VERSION = 1
+
+# Bytes leídos al inicio, mitad y final de edges.txt para el hash de contenido
+FINGERPRINT_SAMPLE_SIZE = 1024 * 1024
+
+
+def degree_cache_path(edges_path):
+    """Ruta del caché binario de grados que se guarda junto al dataset"""
+    return os.path.join(os.path.dirname(edges_path), "edges.degrees.npz")
+
+
+def dataset_fingerprint(edges_path, sample_size=FINGERPRINT_SAMPLE_SIZE):
+    """
+    Huella del dataset: tamaño, mtime y un hash BLAKE2 de bloques muestreados del contenido,
+    de modo que calcularla cueste milisegundos incluso en SF 3.
+    """
+    stat = os.stat(edges_path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(edges_path, 'rb') as f:
+        for offset in sorted({0, max(0, (stat.st_size - sample_size) // 2), max(0, stat.st_size - sample_size)}):
+            f.seek(offset)
+            digest.update(f.read(sample_size))
+    return f"v{DEGREE_CACHE_VERSION}:{stat.st_size}:{stat.st_mtime_ns}:{digest.hexdigest()}"
+
+
+def save_degree_cache(cache_path, fingerprint, degree_tables):
+    """Guarda las tablas de grados en un .npz compacto (escritura atómica)"""
+    arrays = {
+        'fingerprint': np.array(fingerprint),
+        'relations': np.array(list(degree_tables), dtype=str)
+    }
+    for direction in ('outgoing', 'incoming'):
+        tables = [degree_tables[relation][direction] for relation in degree_tables]
+        lengths = [len(nodes) for nodes, _ in tables]
+        arrays[f'{direction}_offsets'] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        arrays[f'{direction}_nodes'] = np.concatenate([np.asarray(nodes, dtype=str) for nodes, _ in tables]) \
+            if tables else np.empty(0, dtype=str)
+        arrays[f'{direction}_counts'] = np.concatenate([counts for _, counts in tables]) \
+            if tables else np.empty(0, dtype=np.int64)
+    
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temp_path, cache_path)
+
+
+def load_degree_cache(cache_path, fingerprint):
+    """Carga las tablas de grados del caché; devuelve None si no existe, es inválido o está obsoleto"""
+    if not os.path.exists(cache_path):
+        return None
+    
+    try:
+        with np.load(cache_path) as cache:
+            if str(cache['fingerprint']) != fingerprint:
+                return None
+            
+            degree_tables = {relation: {} for relation in cache['relations'].tolist()}
+            for direction in ('outgoing', 'incoming'):
+                offsets = cache[f'{direction}_offsets']
+                nodes = cache[f'{direction}_nodes'].astype(object)
+                counts = cache[f'{direction}_counts']
+                for index, relation in enumerate(degree_tables):
+                    start, end = offsets[index], offsets[index + 1]
+                    degree_tables[relation][direction] = (nodes[start:end], counts[start:end])
+            return degree_tables
+    except Exception as e:
+        print(f"⚠️  Caché de grados inválido ({cache_path}): {e}")
+        return None
+
+
+#################################################
+# MOTOR DE SELECCIÓN DE NODOS POR MODO
+#################################################
+
+def _iter_available(excluded, start, stop, step=1):
+    """Recorre posiciones del ranking saltando las que ya fueron seleccionadas"""
+    for position in range(start, stop, step):
+        if position not in excluded:
+            yield position
+
+
+def _available_to_position(index, excluded_sorted):
+    """Convierte un índice de la lista de nodos disponibles en su posición en el ranking completo"""
+    position = index
+    for taken in excluded_sorted:
+        if taken > position:
+            break
+        position += 1
+    return position
+
+
+def _select_min_positions(counts, k, excluded):
+    """
+    Los k nodos disponibles con menos conexiones, en el mismo orden que un sort ascendente
+    estable del ranking: se toma la cola del ranking y se completa el grupo de empate del borde
+    con sus primeras posiciones, localizado por búsqueda binaria.
+    """
+    total = len(counts)
+    tail = list(islice(_iter_available(excluded, total - 1, -1, -1), k))
+    if not tail:
+        return []
+    
+    boundary = counts[tail[-1]]
+    ascending = counts[::-1]
+    group_start = total - int(np.searchsorted(ascending, boundary, side='right'))
+    group_end = total - int(np.searchsorted(ascending, boundary, side='left'))
+    lesser = sorted((position for position in tail if counts[position] < boundary),
+                    key=lambda position: (counts[position], position))
+    return lesser + list(islice(_iter_available(excluded, group_start, group_end), k - len(lesser)))
+
+
+def select_positions(counts, mode, k, excluded=frozenset(), adjust=True):
+    """
+    Selecciona posiciones de un ranking ordenado por conexiones descendentes sin volver a
+    ordenarlo. excluded contiene las posiciones ya elegidas por modos anteriores y adjust
+    replica el ajuste de bordes que se aplica al elegir los nodos de nodos.txt.
+    """
+    total = len(counts)
+    available = total - len(excluded)
+    
+    if mode == "max":
+        return list(islice(_iter_available(excluded, 0, total), k))
+    
+    if mode == "min":
+        return _select_min_positions(counts, k, excluded)
+    
+    if mode in ("med", ".25", ".75"):
+        if adjust and available <= k:
+            return list(_iter_available(excluded, 0, total))
+        
+        center = {"med": available // 2, ".25": available // 4, ".75": (available * 3) // 4}[mode]
+        half_count = k // 2
+        remainder = k % 2
+        start_idx = max(0, center - half_count)
+        end_idx = min(available, center + half_count + remainder)
+        
+        if adjust:
+            if start_idx == 0:
+                end_idx = min(available, k)
+            elif end_idx == available:
+                start_idx = max(0, available - k)
+        
+        first_position = _available_to_position(start_idx, sorted(excluded))
+        return list(islice(_iter_available(excluded, first_position, total), max(0, end_idx - start_idx)))
+    
+    return []
+
+
+#################################################
+# PARSER DE EXPRESIONES DE CAMINO (AST)
+#################################################
+
+# Nodos del AST (tuplas inmutables, reutilizables como claves de caché):
+#   ('label', nombre)
+#   ('seq', (hijos...))            concatenación con /
+#   ('alt', (hijos...))            alternativa con |
+#   ('repeat', hijo, mín, máx)     ?, *, +, {m,n}; máx None = no acotado
+
+_PATH_EXPRESSION_RE = re.compile(r'ALL TRAILS \?\w+\s+(.+?)\]=>')
+_PATH_TOKEN_RE = re.compile(r':\w+|\{[^}]*\}|\S')
+_QUANTIFIER_RE = re.compile(r'^\{\s*(\d*)\s*(,?)\s*(\d*)\s*\}$')
+
+
+_SIMPLE_QUANTIFIERS = {'?': (0, 1), '*': (0, None), '+': (1, None)}
+
+
+def _parse_quantifier(token):
+    """Convierte un cuantificador (?, *, + o {m,n}) en sus límites (mín, máx)"""
+    if token in _SIMPLE_QUANTIFIERS:
+        return _SIMPLE_QUANTIFIERS[token]
+    match = _QUANTIFIER_RE.match(token)
+    if not match or not (match.group(1) or match.group(3)):
+        raise ValueError(f"Cuantificador inválido: {token}")
+    min_hops = int(match.group(1) or 0)
+    if not match.group(2):
+        return min_hops, min_hops
+    return min_hops, (int(match.group(3)) if match.group(3) else None)
+
+
+def _close_group(alternatives, sequence):
+    """Construye el nodo de un grupo a partir de sus alternativas y la secuencia en curso"""
+    alternatives.append(sequence[0] if len(sequence) == 1 else ('seq', tuple(sequence)))
+    return alternatives[0] if len(alternatives) == 1 else ('alt', tuple(alternatives))
+
+
+@lru_cache(maxsize=None)
+def parse_path_expression(expression):
+    """
+    Parsea una expresión de camino de MillenniumDB (concatenación /, alternativa |, ?, *, +,
+    {m,n} y paréntesis) a un AST de tuplas. Lanza ValueError si la sintaxis no es válida.
+    """
+    # Parser de una sola pasada con una pila de grupos (alternativas, secuencia en curso)
+    stack = []
+    alternatives = []
+    sequence = []
+    expect_atom = True
+    
+    for token in _PATH_TOKEN_RE.findall(expression):
+        if token[0] == ':' and len(token) > 1 and expect_atom:
+            sequence.append(('label', token[1:]))
+            expect_atom = False
+        elif token == '(' and expect_atom:
+            stack.append((alternatives, sequence))
+            alternatives = []
+            sequence = []
+        elif expect_atom:
+            raise ValueError(f"Token inesperado: {token}")
+        elif token == '/':
+            expect_atom = True
+        elif token == '|':
+            alternatives.append(sequence[0] if len(sequence) == 1 else ('seq', tuple(sequence)))
+            sequence = []
+            expect_atom = True
+        elif token == ')':
+            if not stack:
+                raise ValueError("Paréntesis de cierre sin abrir")
+            node = _close_group(alternatives, sequence)
+            alternatives, sequence = stack.pop()
+            sequence.append(node)
+        elif token in _SIMPLE_QUANTIFIERS or token[0] == '{':
+            min_hops, max_hops = _parse_quantifier(token)
+            sequence[-1] = ('repeat', sequence[-1], min_hops, max_hops)
+        else:
+            raise ValueError(f"Token inesperado: {token}")
+    
+    if expect_atom:
+        raise ValueError("Expresión de camino incompleta")
+    if stack:
+        raise ValueError("Falta cerrar un paréntesis")
+    return _close_group(alternatives, sequence)
+
+
+@lru_cache(maxsize=None)
+def template_path_ast(pattern):
+    """AST de la expresión de camino de una plantilla/consulta ALL TRAILS, o None si no se puede parsear"""
+    path_match = _PATH_EXPRESSION_RE.search(pattern)
+    if not path_match:
+        return None
+    try:
+        return parse_path_expression(path_match.group(1))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def _first_labels(ast):
+    """(etiquetas que pueden abrir un camino, en orden de aparición; si la expresión acepta el camino vacío)"""
+    kind = ast[0]
+    if kind == 'label':
+        return (ast[1],), False
+    
+    if kind == 'repeat':
+        _, child, min_hops, max_hops = ast
+        if max_hops == 0:
+            return (), True
+        labels, nullable = _first_labels(child)
+        return labels, nullable or min_hops == 0
+    
+    labels = []
+    if kind == 'alt':
+        nullable = False
+        for child in ast[1]:
+            child_labels, child_nullable = _first_labels(child)
+            labels.extend(child_labels)
+            nullable = nullable or child_nullable
+        return tuple(dict.fromkeys(labels)), nullable
+    
+    # 'seq': se acumulan etiquetas mientras los elementos previos puedan ser vacíos
+    for child in ast[1]:
+        child_labels, child_nullable = _first_labels(child)
+        labels.extend(child_labels)
+        if not child_nullable:
+            return tuple(dict.fromkeys(labels)), False
+    return tuple(dict.fromkeys(labels)), True
+
+
+def first_labels(ast):
+    """Conjunto (ordenado por aparición) de etiquetas por las que puede empezar un camino"""
+    return list(_first_labels(ast)[0])
+
+
+def ast_is_bounded(ast):
+    """Indica si todos los cuantificadores de la expresión tienen un máximo finito"""
+    if ast[0] == 'label':
+        return True
+    if ast[0] == 'repeat':
+        return ast[3] is not None and ast_is_bounded(ast[1])
+    return all(ast_is_bounded(child) for child in ast[1])
+
+
+#################################################
+# FORMA CANÓNICA DE CONSULTAS
+#################################################
+
+# Camino vacío (x{0}, x{0,0}): concatenación sin elementos, neutra al concatenar. Como texto se
+# escribe con una etiqueta fija repetida cero veces, para que la forma canónica se pueda volver a parsear
+_EMPTY_PATH = ('seq', ())
+_EMPTY_PATH_TEXT = ":_{0}"
+
+
+def _canonical_repeat(child, min_hops, max_hops):
+    """Normaliza un cuantificador: elimina {1,1} y funde repeticiones anidadas equivalentes"""
+    # Con máximo 0 solo queda el camino vacío, sea cual sea la expresión repetida
+    if max_hops == 0 or child == _EMPTY_PATH:
+        return _EMPTY_PATH
+    if (min_hops, max_hops) == (1, 1):
+        return child
+    if child[0] == 'repeat' and child[2] <= 1:
+        # (x{a,b}){c,d} == x{c*a,d*b} cuando a <= 1 (los rangos de cada vuelta se solapan)
+        _, inner, inner_min, inner_max = child
+        if max_hops is None or inner_max is None:
+            return _canonical_repeat(inner, min_hops * inner_min, None)
+        return _canonical_repeat(inner, min_hops * inner_min, max_hops * inner_max)
+    return ('repeat', child, min_hops, max_hops)
+
+
+def _canonical_alternatives(children):
+    """
+    Aplana, deduplica y ordena las alternativas, absorbiendo x cuando también aparece x{m,n} con
+    m <= 1 <= n. El camino vacío como alternativa (x|y{0}) se convierte en un cuantificador {0,1}
+    sobre el resto, salvo que alguna alternativa ya acepte el camino vacío. Devuelve el nodo resultante.
+    """
+    flat = []
+    for child in children:
+        flat.extend(child[1] if child[0] == 'alt' else (child,))
+    alternatives = set(flat)
+    nullable = _EMPTY_PATH in alternatives
+    alternatives.discard(_EMPTY_PATH)
+    for child in flat:
+        if child[0] == 'repeat' and child[2] <= 1 and (child[3] is None or child[3] >= 1):
+            alternatives.discard(child[1])
+    
+    if not alternatives:
+        return _EMPTY_PATH
+    alternatives = sorted(alternatives, key=path_ast_to_text)
+    node = alternatives[0] if len(alternatives) == 1 else ('alt', tuple(alternatives))
+    if nullable and not any(_first_labels(child)[1] for child in alternatives):
+        return _canonical_repeat(node, 0, 1)
+    return node
+
+
+@lru_cache(maxsize=None)
+def canonicalize_path_ast(ast):
+    """
+    Forma canónica de un AST de camino: concatenaciones y alternativas aplanadas (son asociativas),
+    alternativas sin duplicados y en orden estable, y cuantificadores normalizados.
+    """
+    kind = ast[0]
+    if kind == 'label':
+        return ast
+    if kind == 'repeat':
+        return _canonical_repeat(canonicalize_path_ast(ast[1]), ast[2], ast[3])
+
+    children = [canonicalize_path_ast(child) for child in ast[1]]
+    if kind == 'alt':
+        return _canonical_alternatives(children)
+    children = [part for child in children
+                for part in (child[1] if child[0] == 'seq' else (child,))]
+    if not children:
+        return _EMPTY_PATH
+    return children[0] if len(children) == 1 else ('seq', tuple(children))
+
+
+def _quantifier_text(min_hops, max_hops):
+    """Representación textual más corta de unos límites de repetición"""
+    for symbol, bounds in _SIMPLE_QUANTIFIERS.items():
+        if bounds == (min_hops, max_hops):
+            return symbol
+    if max_hops is None:
+        return f"{{{min_hops},}}"
+    if min_hops == max_hops:
+        return f"{{{min_hops}}}"
+    return f"{{{min_hops},{max_hops}}}"
+
+
+@lru_cache(maxsize=None)
+def path_ast_to_text(ast):
+    """Serializa un AST a la sintaxis de caminos de MillenniumDB"""
+    if ast == _EMPTY_PATH:
+        return _EMPTY_PATH_TEXT
+    kind = ast[0]
+    if kind == 'label':
+        return f":{ast[1]}"
+    if kind == 'repeat':
+        child_text = path_ast_to_text(ast[1])
+        if ast[1][0] != 'label':
+            child_text = f"({child_text})"
+        return child_text + _quantifier_text(ast[2], ast[3])
+    if kind == 'alt':
+        return "|".join(path_ast_to_text(child) for child in ast[1])
+    return "/".join(f"({path_ast_to_text(child)})" if child[0] == 'alt' else path_ast_to_text(child)
+                    for child in ast[1])
+
+
+@lru_cache(maxsize=None)
+def canonical_path_text(expression):
+    """Expresión de camino en forma canónica, o None si no se puede parsear"""
+    try:
+        return path_ast_to_text(canonicalize_path_ast(parse_path_expression(expression)))
+    except ValueError:
+        return None
+
+
+def canonical_query(query):
+    """
+    Clave canónica de una consulta: la expresión de camino se reescribe en forma canónica y se
+    normalizan los espacios. Dos consultas con la misma clave devuelven los mismos caminos.
+    """
+    path_match = _PATH_EXPRESSION_RE.search(query)
+    if path_match:
+        path_text = canonical_path_text(path_match.group(1))
+        if path_text is not None:
+            query = f"{query[:path_match.start(1)]}({path_text}){query[path_match.end(1):]}"
+    return " ".join(query.split())
+
+
+#################################################
+# FAN-OUT MULTI-SALTO SOBRE ADYACENCIA CSR
+#################################################
+
+# Máximo de saltos con que se evalúan los cuantificadores no acotados (*, +, {m,})
+UNBOUNDED_HOPS = 8
+
+
+def build_label_csr(edge_arrays):
+    """
+    Construye una adyacencia CSR por etiqueta a partir de los arrays de edges.txt: para cada
+    relación, indptr (n_nodos + 1) e indices con los destinos de cada nodo origen.
+    """
+    import pandas as pd
+    
+    num_nodes = len(edge_arrays['nodes'])
+    relation = edge_arrays['relation']
+    order = np.lexsort((edge_arrays['origin'], relation))
+    boundaries = np.searchsorted(relation[order], np.arange(len(edge_arrays['relations']) + 1))
+    
+    csr = {}
+    for relation_id, relation_name in enumerate(edge_arrays['relations']):
+        rows = order[boundaries[relation_id]:boundaries[relation_id + 1]]
+        out_degrees = np.bincount(edge_arrays['origin'][rows], minlength=num_nodes)
+        indptr = np.concatenate([[0], np.cumsum(out_degrees)]).astype(np.int64)
+        csr[relation_name] = (indptr, edge_arrays['target'][rows])
+    
+    return {'nodes': edge_arrays['nodes'], 'node_index': pd.Index(edge_arrays['nodes']), 'csr': csr}
+
+
+def _repeat_bounds(min_hops, max_hops):
+    return min_hops, (max_hops if max_hops is not None else max(min_hops, UNBOUNDED_HOPS))
+
+
+def _propagate_walks(adjacency, label, weights):
+    """Un salto hacia atrás: result[v] = suma de weights[u] sobre las aristas v -etiqueta-> u"""
+    if label not in adjacency['csr']:
+        return np.zeros_like(weights)
+    indptr, indices = adjacency['csr'][label]
+    cumulative = np.concatenate([[0], np.cumsum(weights[indices])])
+    return cumulative[indptr[1:]] - cumulative[indptr[:-1]]
+
+
+def _fanout_vector(adjacency, ast, weights):
+    """Evalúa el AST hacia atrás: caminos que cumplen la expresión seguida de weights"""
+    kind = ast[0]
+    if kind == 'label':
+        return _propagate_walks(adjacency, ast[1], weights)
+    
+    if kind == 'seq':
+        for child in reversed(ast[1]):
+            weights = _fanout_vector(adjacency, child, weights)
+        return weights
+    
+    if kind == 'alt':
+        return sum(_fanout_vector(adjacency, child, weights) for child in ast[1])
+    
+    _, child, min_hops, max_hops = ast
+    min_hops, max_hops = _repeat_bounds(min_hops, max_hops)
+    total = weights.copy() if min_hops == 0 else np.zeros_like(weights)
+    current = weights
+    for hop in range(1, max_hops + 1):
+        current = _fanout_vector(adjacency, child, current)
+        if hop >= min_hops:
+            total += current
+    return total
+
+
+def fanout_counts(adjacency, ast):
+    """
+    Número exacto de caminos (walks) que cumplen la expresión de camino desde cada nodo inicial.
+    Es una cota superior de los resultados ALL TRAILS de la plantilla para ese nodo.
+    """
+    return _fanout_vector(adjacency, ast, np.ones(len(adjacency['nodes']), dtype=np.int64))
+
+
+def _combine_frontier(node_parts, weight_parts):
+    """Une fronteras parciales sumando las multiplicidades de los nodos repetidos"""
+    node_parts = [nodes for nodes in node_parts if len(nodes)]
+    weight_parts = [weights for weights in weight_parts if len(weights)]
+    if not node_parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    nodes, inverse = np.unique(np.concatenate(node_parts), return_inverse=True)
+    weights = np.zeros(len(nodes), dtype=np.int64)
+    np.add.at(weights, inverse, np.concatenate(weight_parts))
+    return nodes, weights
+
+
+def _expand_frontier(adjacency, label, nodes, weights):
+    """Avanza un salto desde una frontera dispersa (nodos, multiplicidades) siguiendo una etiqueta"""
+    if label not in adjacency['csr'] or len(nodes) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    indptr, indices = adjacency['csr'][label]
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    offsets = np.arange(total) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return _combine_frontier([indices[offsets]], [np.repeat(weights, lengths)])
+
+
+def _walk_frontier(adjacency, ast, nodes, weights):
+    """Evalúa el AST hacia adelante sobre una frontera dispersa"""
+    kind = ast[0]
+    if kind == 'label':
+        return _expand_frontier(adjacency, ast[1], nodes, weights)
+    
+    if kind == 'seq':
+        for child in ast[1]:
+            nodes, weights = _walk_frontier(adjacency, child, nodes, weights)
+            if len(nodes) == 0:
+                break
+        return nodes, weights
+    
+    if kind == 'alt':
+        results = [_walk_frontier(adjacency, child, nodes, weights) for child in ast[1]]
+        return _combine_frontier([r[0] for r in results], [r[1] for r in results])
+    
+    _, child, min_hops, max_hops = ast
+    min_hops, max_hops = _repeat_bounds(min_hops, max_hops)
+    node_parts = [nodes] if min_hops == 0 else []
+    weight_parts = [weights] if min_hops == 0 else []
+    current_nodes, current_weights = nodes, weights
+    for hop in range(1, max_hops + 1):
+        current_nodes, current_weights = _walk_frontier(adjacency, child, current_nodes, current_weights)
+        if len(current_nodes) == 0:
+            break
+        if hop >= min_hops:
+            node_parts.append(current_nodes)
+            weight_parts.append(current_weights)
+    return _combine_frontier(node_parts, weight_parts)
+
+
+def count_walks_from(adjacency, ast, start_node):
+    """
+    Número exacto de caminos (walks) que cumplen la expresión desde un único nodo, propagando
+    una frontera dispersa. Es una cota superior de los trails: si vale 0, la consulta
+    ALL TRAILS no tiene resultados.
+    """
+    nodes, weights = _walk_frontier(adjacency, ast, np.array([start_node], dtype=np.int64),
+                                    np.ones(1, dtype=np.int64))
+    return int(weights.sum())
+
+
+#################################################
+# CLIENTE HTTP DE CONSULTAS (KEEP-ALIVE)
+#################################################
+
+QUERY_ENDPOINT = "http://localhost:1234/query"
+# Tiempo máximo de espera de una respuesta (el servidor corta las consultas a los 35 s)
+REQUEST_TIMEOUT = 60
+# Plazo por defecto para que mdb-server responda tras arrancar e intervalo entre sondeos
+SERVER_READY_TIMEOUT = 120
+READINESS_POLL_INTERVAL = 0.05
+# Historial del tiempo hasta estar listo por base de datos y binario del servidor
+SERVER_STARTUP_LOG = "arranque_servidor.csv"
+# Repetición adaptativa: ejecuciones medidas mínimas antes de evaluar la convergencia y máximo por consulta
+ADAPTIVE_MIN_RUNS = 5
+ADAPTIVE_MAX_RUNS = 30
+# Ejecuciones necesarias por consulta en modo adaptativo
+ADAPTIVE_RUNS_LOG = "repeticiones_adaptativas.csv"
+
+
+class QueryConnectionPool:
+    """Pool de conexiones HTTP persistentes hacia el endpoint de consultas de MillenniumDB"""
+    
+    def __init__(self, url=QUERY_ENDPOINT, timeout=REQUEST_TIMEOUT):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+    
+    def acquire(self):
+        """
+        Devuelve una conexión ociosa o abre una nueva; indica si la conexión se está reutilizando.
+        Las conexiones ociosas que el servidor ya cerró (socket legible: EOF) se descartan.
+        """
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+            if connection.sock is not None and not select.select([connection.sock], [], [], 0)[0]:
+                return connection, True
+            connection.close()
+    
+    def release(self, connection):
+        """Devuelve una conexión sana al pool para reutilizarla"""
+        self._idle.put(connection)
+    
+    def close(self):
+        """Cierra todas las conexiones ociosas"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def post_query(pool, query):
+    """
+    Envía una consulta por POST (mismo cuerpo que curl -d) y mide su latencia con reloj monotónico.
+    Devuelve un registro con el estado HTTP, los bytes recibidos y la latencia en ms.
+    """
+    body = query.encode('utf-8')
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    
+    while True:
+        connection, reused = pool.acquire()
+        start = time.perf_counter()
+        sent = False
+        try:
+            connection.request("POST", pool.path, body=body, headers=headers)
+            sent = True
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            # Una conexión keep-alive cerrada por el servidor falla al enviar: reintentar con una nueva.
+            # Si la petición ya se envió no se reintenta: el servidor pudo ejecutarla (y registrarla)
+            if reused and not sent:
+                continue
+            return {"query": query, "start": start, "latency_ms": (time.perf_counter() - start) * 1000,
+                    "status": None, "bytes": 0, "error": str(e) or type(e).__name__}
+        
+        latency_ms = (time.perf_counter() - start) * 1000
+        if response.will_close:
+            connection.close()
+        else:
+            pool.release(connection)
+        return {"query": query, "start": start, "latency_ms": latency_ms,
+                "status": response.status, "bytes": len(payload), "error": None}
+
+
+def wait_for_server(url=QUERY_ENDPOINT, deadline=SERVER_READY_TIMEOUT, process=None, started=None,
+                    interval=READINESS_POLL_INTERVAL):
+    """
+    Sondea el endpoint con un GET sin consulta (no ejecuta nada ni deja un bloque MATCH en el log)
+    hasta recibir cualquier respuesta HTTP. Devuelve los segundos transcurridos desde started
+    (por defecto, desde la llamada), o None si vence el plazo o el proceso del servidor termina antes.
+    """
+    parts = urllib.parse.urlsplit(url)
+    started = time.perf_counter() if started is None else started
+    while True:
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=1)
+        try:
+            connection.request("GET", parts.path or "/")
+            connection.getresponse().read()
+            return time.perf_counter() - started
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+        
+        if process is not None and process.poll() is not None:
+            return None
+        if time.perf_counter() - started >= deadline:
+            return None
+        time.sleep(interval)
+
+
+def record_server_startup(path, db_path, server_bin, ready_s):
+    """Añade al historial CSV el tiempo hasta estar listo junto a la base de datos y la versión del binario"""
+    import csv
+    
+    new_file = not os.path.exists(path)
+    build = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(os.path.getmtime(server_bin))) \
+        if os.path.exists(server_bin) else ""
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["fecha", "base_datos", "binario", "binario_modificado", "listo_s"])
+        writer.writerow([time.strftime('%Y-%m-%d %H:%M:%S'), db_path, server_bin, build, f"{ready_s:.3f}"])
+
+
+#################################################
+# CACHÉ DE PÁGINAS DEL SISTEMA OPERATIVO (MODOS FRÍO / CALIENTE)
+#################################################
+
+# Modos de caché de la pasada principal y alcance de cada reinicio en la pasada en frío
+CACHE_MODES = ("none", "warm", "cold")
+COLD_RESTART_SCOPES = ("query", "template")
+# Log del servidor durante la pasada en frío (no pisa el log de la pasada principal)
+COLD_CACHE_LOG = "result_frio.txt"
+# Tamaño de lectura al precargar los archivos de la base de datos
+PREFETCH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def database_files(db_path):
+    """Archivos regulares que forman la base de datos (db_path puede ser un directorio o un archivo)"""
+    if os.path.isfile(db_path):
+        return [db_path]
+    paths = []
+    for root, _, names in os.walk(db_path):
+        paths.extend(os.path.join(root, name) for name in sorted(names))
+    return [path for path in paths if os.path.isfile(path)]
+
+
+def evict_page_cache(db_path):
+    """
+    Expulsa de la caché de páginas del SO los archivos de la base de datos con posix_fadvise
+    (POSIX_FADV_DONTNEED, sin privilegios de root). Devuelve (archivos, bytes), o None si la
+    plataforma no ofrece posix_fadvise.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return None
+    
+    files = total_bytes = 0
+    for path in database_files(db_path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            # Las páginas sucias no se expulsan: forzar antes su escritura
+            try:
+                os.fdatasync(fd)
+            except OSError:
+                pass
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            files += 1
+            total_bytes += os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    return files, total_bytes
+
+
+def prefetch_page_cache(db_path, chunk_size=PREFETCH_CHUNK_SIZE):
+    """Carga en la caché de páginas los archivos de la base de datos leyéndolos enteros. Devuelve (archivos, bytes)"""
+    buffer = memoryview(bytearray(chunk_size))
+    files = total_bytes = 0
+    for path in database_files(db_path):
+        with open(path, 'rb', buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                total_bytes += read
+        files += 1
+    return files, total_bytes
+
+
+#################################################
+# BARRIDO DE CONCURRENCIA (CICLO CERRADO)
+#################################################
+
+# Log del servidor durante las pruebas de carga (no se mezcla con el log analizado)
+LOAD_TEST_LOG = "result_carga.txt"
+# Percentiles de latencia que se reportan
+LATENCY_PERCENTILES = (50, 90, 99)
+# Ganancia mínima de throughput al duplicar clientes para considerar que el servidor aún escala
+SATURATION_GAIN = 1.10
+
+
+def default_concurrency_levels():
+    """Niveles 1, 2, 4, ... hasta el número de núcleos (incluido)"""
+    cores = os.cpu_count() or 1
+    levels = [1]
+    while levels[-1] * 2 < cores:
+        levels.append(levels[-1] * 2)
+    if levels[-1] != cores:
+        levels.append(cores)
+    return levels
+
+
+def latency_percentiles(latencies, percentiles=LATENCY_PERCENTILES):
+    """Percentiles de una lista de latencias (ms) como {'p50 (ms)': ..., ...}"""
+    values = np.percentile(latencies, percentiles) if len(latencies) else [np.nan] * len(percentiles)
+    return {f"p{p} (ms)": float(value) for p, value in zip(percentiles, values)}
+
+
+def run_closed_loop(pool, queries, clients, duration):
+    """
+    Ciclo cerrado: clients hilos recorren las consultas en orden cíclico y cada uno envía la
+    siguiente solo al recibir la respuesta anterior, durante duration segundos.
+    Devuelve (registros de post_query, segundos transcurridos).
+    """
+    lock = threading.Lock()
+    pending = cycle(queries)
+    records = []
+    
+    def client():
+        local_records = []
+        while time.perf_counter() < deadline:
+            with lock:
+                query = next(pending)
+            local_records.append(post_query(pool, query))
+        with lock:
+            records.extend(local_records)
+    
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    start = time.perf_counter()
+    deadline = start + duration
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records, time.perf_counter() - start
+
+
+def saturation_level(levels, throughputs, gain=SATURATION_GAIN):
+    """
+    Primer nivel de concurrencia a partir del cual pasar al siguiente nivel ya no mejora el
+    throughput en más de un factor gain (la rodilla de la curva), o None si sigue escalando.
+    """
+    for index in range(len(levels) - 1):
+        if throughputs[index + 1] < throughputs[index] * gain:
+            return levels[index]
+    return None
+
+
+#################################################
+# CARGA EN LAZO ABIERTO (TASA DE LLEGADA FIJA)
+#################################################
+
+# Máximo de consultas en vuelo simultáneamente en lazo abierto
+OPEN_LOOP_MAX_IN_FLIGHT = 256
+
+
+def arrival_offsets(rate, duration, arrival="poisson", seed=None):
+    """Instantes previstos de envío (segundos desde el inicio) para una tasa objetivo en consultas/s"""
+    if arrival == "constant":
+        return np.arange(0, duration, 1.0 / rate)
+    
+    # Proceso de Poisson: tiempos entre llegadas exponenciales de media 1/rate
+    rng = np.random.default_rng(seed)
+    batch = int(rate * duration) + 16
+    offsets = np.cumsum(rng.exponential(1.0 / rate, batch))
+    while offsets[-1] < duration:
+        offsets = np.concatenate([offsets, offsets[-1] + np.cumsum(rng.exponential(1.0 / rate, batch))])
+    return offsets[offsets < duration]
+
+
+def run_open_loop(pool, queries, rate, duration, arrival="poisson", max_in_flight=OPEN_LOOP_MAX_IN_FLIGHT,
+                  seed=None):
+    """
+    Lazo abierto: las consultas (en orden cíclico) se envían según un calendario de llegadas fijado
+    de antemano, sin esperar a las respuestas. Cada registro añade scheduled_latency_ms, medida desde
+    el instante previsto de envío y no desde el real, para que las esperas en cola no queden ocultas
+    (coordinated omission). Devuelve (registros, segundos transcurridos).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    pending = cycle(queries)
+    scheduled = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        start = time.perf_counter()
+        for offset in arrival_offsets(rate, duration, arrival, seed):
+            intended = start + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            scheduled.append((intended, executor.submit(post_query, pool, next(pending))))
+    
+    records = []
+    for intended, future in scheduled:
+        record = future.result()
+        finished = record["start"] + record["latency_ms"] / 1000
+        record["scheduled_latency_ms"] = (finished - intended) * 1000
+        records.append(record)
+    return records, time.perf_counter() - start
+
+
+#################################################
+# LOG DEL SERVIDOR: BLOQUES POR CONSULTA Y SEGUIMIENTO INCREMENTAL
+#################################################
+
+# Campos de cada bloque "Query received:" del log de mdb-server (prefijo en bytes, clave, tipo)
+_LOG_FIELDS = (
+    (b"Results:", "results", int),
+    (b"Parser duration:", "parser_ms", float),
+    (b"Optimizer duration:", "optimizer_ms", float),
+    (b"Execution duration:", "execution_ms", float),
+)
+_QUERY_MARKER = b"Query received:"
+# Campos medidos de cada ejecución (sin la consulta)
+_EXECUTION_FIELDS = tuple(key for _, key, _ in _LOG_FIELDS)
+# Fases de cada ejecución: (columna del almacén, nombre en los informes, valor de --rank-by)
+QUERY_PHASES = (('parser_ms', 'Parser', 'parser'), ('optimizer_ms', 'Optimizador', 'optimizer'),
+                ('execution_ms', 'Ejecución', 'execution'))
+
+
+# Valor de cada tipo de campo con el mismo criterio que el parser original: entero en Results y
+# duraciones con sufijo "ms" obligatorio
+_LOG_VALUE_RES = {int: re.compile(rb"\s*(\d+)"), float: re.compile(rb"\s*([\d.]+)\s*ms")}
+
+
+def _log_number(value, cast):
+    """Número de un campo del log (las duraciones deben llevar 'ms'), o None si no cumple el formato"""
+    match = _LOG_VALUE_RES[cast].search(value)
+    if match is None:
+        return None
+    try:
+        return cast(match.group(1))
+    except ValueError:
+        return None
+
+
+class LogBlockParser:
+    """
+    Máquina de estados que agrupa las líneas del log (en bytes, sin salto de línea) en un registro
+    por consulta: query, results, parser_ms, optimizer_ms, execution_ms. Un bloque empieza en
+    "Query received:" y solo se emite si tiene la consulta MATCH y los cuatro valores.
+    """
+    
+    def __init__(self):
+        self.blocks = 0
+        self._current = None
+        self._expect_query = False
+    
+    def feed(self, line):
+        """Procesa una línea; devuelve el registro del bloque anterior si acaba de cerrarse completo"""
+        line = line.strip()
+        if line == _QUERY_MARKER:
+            finished = self.finish()
+            self.blocks += 1
+            self._current = {}
+            self._expect_query = True
+            return finished
+        
+        if self._expect_query:
+            self._expect_query = False
+            if line.startswith(b"MATCH"):
+                self._current["query"] = line.decode('utf-8', errors='replace')
+                return None
+        
+        if self._current is not None and line[:1] in b"RPOE":
+            for prefix, key, cast in _LOG_FIELDS:
+                if line.startswith(prefix):
+                    value = _log_number(line[len(prefix):], cast)
+                    if value is not None:
+                        self._current[key] = value
+                    break
+        return None
+    
+    def finish(self):
+        """Cierra el bloque en curso y lo devuelve si está completo"""
+        current, self._current = self._current, None
+        if current is not None and len(current) == 5:
+            return current
+        return None
+
+
+# Tamaño de lectura del parser en streaming del log
+LOG_CHUNK_SIZE = 16 * 1024 * 1024
+# Marcador de bloque limpio (línea completa, sin espacios): permite el camino rápido por bloques
+_CLEAN_QUERY_MARKER = b"\n" + _QUERY_MARKER + b"\n"
+# Bloque con el formato exacto que escribe mdb-server; se aplica una vez por fragmento, no por línea
+_LOG_NUMBER = rb"(\d+(?:\.\d+)?)"
+_CANONICAL_BLOCK_RE = re.compile(
+    rb"Query received:\n(MATCH[^\n]*)\nResults: (\d+)\nParser duration: " + _LOG_NUMBER +
+    rb" ms\nOptimizer duration: " + _LOG_NUMBER + rb" ms\nExecution duration: " + _LOG_NUMBER +
+    rb" ms\n(?=Query received:\n|\Z)")
+
+
+def _parse_log_lines(lines):
+    """Camino lento y exacto: pasa las líneas por la máquina de estados y genera los registros"""
+    parser = LogBlockParser()
+    for line in lines:
+        record = parser.feed(line)
+        if record is not None:
+            yield record
+    record = parser.finish()
+    if record is not None:
+        yield record
+
+
+def _parse_log_block(block):
+    """
+    Registro de un bloque (texto entre dos marcadores limpios) buscando cada campo con find en
+    lugar de recorrer líneas. Si el bloque tiene algo irregular (campo repetido, no al inicio de
+    línea o sin número) se resuelve con la máquina de estados.
+    """
+    first_end = block.find(b"\n")
+    if first_end < 0:
+        first_end = len(block)
+    first_line = block[:first_end].strip()
+    if not first_line.startswith(b"MATCH"):
+        return None
+    
+    record = {"query": first_line.decode('utf-8', errors='replace')}
+    for prefix, key, cast in _LOG_FIELDS:
+        start = block.find(prefix, first_end)
+        if start < 0:
+            return None
+        if block[start - 1] != 10 or block.find(prefix, start + len(prefix)) >= 0:
+            return next(_parse_log_lines([_QUERY_MARKER] + block.split(b"\n")), None)
+        end = block.find(b"\n", start)
+        value = _log_number(block[start + len(prefix):end if end >= 0 else len(block)], cast)
+        if value is None:
+            return next(_parse_log_lines([_QUERY_MARKER] + block.split(b"\n")), None)
+        record[key] = value
+    return record
+
+
+def _parse_log_chunk(chunk):
+    """Registros de un fragmento que empieza en un marcador limpio (o al inicio del log) y acaba antes de otro"""
+    text = b"\n" + chunk
+    markers = text.count(_QUERY_MARKER)
+    if markers != text.count(_CLEAN_QUERY_MARKER):
+        # Hay marcadores con espacios, \r o repetidos: procesar el fragmento línea a línea
+        yield from _parse_log_lines(chunk.split(b"\n"))
+        return
+    
+    # Camino rápido: todos los bloques del fragmento tienen el formato exacto del servidor
+    matches = _CANONICAL_BLOCK_RE.findall(chunk)
+    if len(matches) == markers:
+        for query, results, parser_ms, optimizer_ms, execution_ms in matches:
+            yield {"query": query.strip().decode('utf-8', errors='replace'), "results": int(results),
+                   "parser_ms": float(parser_ms), "optimizer_ms": float(optimizer_ms),
+                   "execution_ms": float(execution_ms)}
+        return
+    
+    for block in text.split(_CLEAN_QUERY_MARKER)[1:]:
+        record = _parse_log_block(block)
+        if record is not None:
+            yield record
+
+
+def iter_log_records(path, start=0, end=None, chunk_size=LOG_CHUNK_SIZE):
+    """
+    Parser en streaming del log de mdb-server: genera un registro por bloque de consulta completo
+    (query, results, parser_ms, optimizer_ms, execution_ms) leyendo fragmentos de tamaño fijo
+    cortados en marcadores "Query received:", con memoria constante. Los finales de línea CRLF
+    se normalizan y los fragmentos se cortan al inicio de la línea del último marcador aunque esté
+    sangrado; si no aparece ninguno en 2 * chunk_size bytes se vacía hasta el último salto de
+    línea. start/end acotan un rango de bytes que debe empezar en un marcador (o en 0).
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = (os.path.getsize(path) if end is None else end) - start
+        carry = b""
+        while True:
+            data = f.read(max(0, min(chunk_size, remaining)))
+            remaining -= len(data)
+            buffer = carry + data
+            if b"\r" in data:
+                buffer = buffer.replace(b"\r\n", b"\n")
+            if data:
+                cut = buffer.rfind(_CLEAN_QUERY_MARKER)
+                if cut < 0:
+                    # Marcadores irregulares (sangrados, con espacios): cortar al inicio de la línea del último
+                    marker = buffer.rfind(_QUERY_MARKER)
+                    cut = buffer.rfind(b"\n", 0, marker) if marker > 0 else -1
+                if cut < 0 and len(buffer) > 2 * chunk_size:
+                    # Sin fronteras de registro: vaciar hasta el último salto de línea para acotar la memoria
+                    cut = buffer.rfind(b"\n")
+                if cut < 0:
+                    carry = buffer
+                    continue
+                chunk, carry = buffer[:cut + 1], buffer[cut + 1:]
+            else:
+                chunk, carry = buffer, b""
+            yield from _parse_log_chunk(chunk)
+            if not data:
+                return
+
+
+def aggregate_log_records(records):
+    """
+    Agrupa los registros por consulta en orden de primera aparición, con una columna por campo
+    medido: ({consulta: {"results": [...], "parser_ms": [...], ...}}, nº de registros)
+    """
+    grouped = {}
+    count = 0
+    for record in records:
+        count += 1
+        columns = grouped.get(record["query"])
+        if columns is None:
+            columns = grouped[record["query"]] = {key: [] for key in _EXECUTION_FIELDS}
+        for key in _EXECUTION_FIELDS:
+            columns[key].append(record[key])
+    return grouped, count
+
+
+def _log_shard_ranges(path, num_shards):
+    """Divide el log en rangos de bytes contiguos que empiezan en un marcador "Query received:" limpio"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    
+    boundaries = [0]
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for shard in range(1, num_shards):
+            position = mm.find(_CLEAN_QUERY_MARKER, max(boundaries[-1], shard * size // num_shards))
+            if position < 0:
+                break
+            if position + 1 > boundaries[-1]:
+                boundaries.append(position + 1)
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _aggregate_log_shard(path, start, end):
+    """Worker: agrupa por consulta los registros de un rango de bytes del log"""
+    return aggregate_log_records(iter_log_records(path, start, end))
+
+
+def aggregate_log_file(path, workers=1):
+    """
+    Igual que aggregate_log_records sobre todo el log, repartiendo rangos alineados a bloques de
+    consulta en un pool de procesos. Las ejecuciones se fusionan en el orden del log.
+    """
+    ranges = _log_shard_ranges(path, workers)
+    if len(ranges) <= 1:
+        return aggregate_log_records(iter_log_records(path))
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_aggregate_log_shard, path, start, end) for start, end in ranges]
+        shard_results = [future.result() for future in futures]
+    
+    grouped = {}
+    count = 0
+    for shard_grouped, shard_count in shard_results:
+        count += shard_count
+        for query, shard_columns in shard_grouped.items():
+            columns = grouped.get(query)
+            if columns is None:
+                grouped[query] = shard_columns
+            else:
+                for key in _EXECUTION_FIELDS:
+                    columns[key].extend(shard_columns[key])
+    return grouped, count
+
+
+class ServerLogTailer:
+    """
+    Sigue el log del servidor leyendo solo los bytes añadidos desde la última lectura (recuerda el
+    offset). Una línea cortada al final de una lectura se guarda hasta que llegue su salto de línea.
+    Mantiene el número de bloques "Query received:" vistos y los registros ya completos.
+    """
+    
+    def __init__(self, path, from_end=False):
+        self.path = path
+        self.offset = os.path.getsize(path) if from_end and os.path.exists(path) else 0
+        self.records = []
+        self._pending = b""
+        self._parser = LogBlockParser()
+    
+    @property
+    def received(self):
+        """Consultas recibidas por el servidor desde que empezó el seguimiento"""
+        return self._parser.blocks
+    
+    def poll(self):
+        """Lee lo añadido al log; devuelve cuántos registros nuevos se completaron"""
+        try:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < self.offset:
+                    # El log se truncó o se recreó: empezar de nuevo
+                    self.offset = 0
+                    self._pending = b""
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        if not data:
+            return 0
+        
+        self.offset += len(data)
+        lines = (self._pending + data).split(b"\n")
+        self._pending = lines.pop()
+        completed = len(self.records)
+        for line in lines:
+            record = self._parser.feed(line)
+            if record is not None:
+                self.records.append(record)
+        return len(self.records) - completed
+    
+    def close(self):
+        """Procesa la última línea sin salto y el bloque final; devuelve todos los registros"""
+        self.poll()
+        if self._pending:
+            self._parser.feed(self._pending)
+            self._pending = b""
+        record = self._parser.finish()
+        if record is not None:
+            self.records.append(record)
+        return self.records
+
+
+#################################################
+# ALMACÉN COLUMNAR DE MEDICIONES POR EJECUCIÓN
+#################################################
+
+MEASUREMENT_STORE_VERSION = 1
+MEASUREMENT_STORE_NAME = "mediciones.npz"
+
+# Columnas por consulta (una fila por consulta medida y por cada alias) y por ejecución
+_STORE_QUERY_COLUMNS = ('query', 'abstract_pattern', 'template', 'node_id', 'q_number', 'predicted_paths')
+_STORE_EXECUTION_COLUMNS = ('query_id', 'repetition', 'warmup') + _EXECUTION_FIELDS
+
+
+def measurement_protocol_path(log_path):
+    """Ruta del protocolo de medición asociado a un log del servidor (result.txt -> result_protocolo.json)"""
+    return os.path.splitext(log_path)[0] + "_protocolo.json"
+
+
+def save_measurement_protocol(log_path, warmup, measured_runs):
+    """
+    Guarda junto al log el protocolo con el que se midió: ejecuciones de calentamiento por consulta
+    y, por consulta, cuántas ejecuciones medidas devolvieron HTTP 200 según el cliente.
+    """
+    with open(measurement_protocol_path(log_path), "w") as f:
+        json.dump({"warmup": warmup, "measured_runs": measured_runs}, f, indent=2)
+
+
+def load_measurement_protocol(log_path):
+    """Protocolo de medición guardado junto al log, o None si no existe o no se puede leer"""
+    path = measurement_protocol_path(log_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            protocol = json.load(f)
+        return {"warmup": int(protocol.get("warmup", 0)),
+                "measured_runs": {query: int(runs) for query, runs in protocol.get("measured_runs", {}).items()}}
+    except (ValueError, TypeError, AttributeError, OSError) as e:
+        print(f"Advertencia: No se pudo cargar el protocolo de medición {path}: {e}")
+        return None
+
+
+def build_measurement_store(log_groups, query_info, pattern_to_q_number, warmup=0, measured_runs=None):
+    """
+    Construye el almacén columnar a partir de las ejecuciones agrupadas del log. Cada consulta
+    (consulta, patrón abstracto, plantilla) recibe un query_id; la medición de una consulta
+    ejecutada se asigna también a sus alias. q_number = 0 y predicted_paths = -1 indican ausencia.
+    Con measured_runs (ejecuciones medidas con HTTP 200 por consulta, según el cliente) solo las
+    últimas de cada consulta en el log son medidas y las anteriores quedan como calentamiento, de
+    modo que un bloque descartado (p. ej. por timeout) no desplaza las medidas. Sin él, las primeras
+    `warmup` ejecuciones de cada consulta quedan marcadas como calentamiento.
+    """
+    queries = {column: [] for column in _STORE_QUERY_COLUMNS}
+    executions = {column: [] for column in _STORE_EXECUTION_COLUMNS}
+    query_ids = {}
+    repetitions = []
+    
+    for query, columns in log_groups.items():
+        info = query_info.get(query)
+        entries = [dict(info, query=query)] + info.get("aliases", []) if info else [{"query": query}]
+        count = len(columns["results"])
+        measured = measured_runs.get(query) if measured_runs is not None else None
+        query_warmup = warmup if measured is None else max(count - measured, 0)
+        warmup_flags = [run < query_warmup for run in range(count)]
+        
+        for entry in entries:
+            abstract_pattern = entry.get("abstract_pattern", "Desconocido")
+            template_query = entry.get("original", "Desconocido")
+            group_key = (entry["query"], abstract_pattern, template_query)
+            
+            query_id = query_ids.get(group_key)
+            if query_id is None:
+                query_id = query_ids[group_key] = len(repetitions)
+                repetitions.append(0)
+                queries['query'].append(entry["query"])
+                queries['abstract_pattern'].append(abstract_pattern)
+                queries['template'].append(template_query)
+                queries['node_id'].append(str(entry.get("node_id", "Desconocido")))
+                queries['q_number'].append(pattern_to_q_number.get(abstract_pattern) or 0)
+                predicted_paths = entry.get("predicted_paths")
+                queries['predicted_paths'].append(-1 if predicted_paths is None else predicted_paths)
+            
+            executions['query_id'].extend([query_id] * count)
+            executions['repetition'].extend(range(repetitions[query_id], repetitions[query_id] + count))
+            repetitions[query_id] += count
+            executions['warmup'].extend(warmup_flags)
+            for key in _EXECUTION_FIELDS:
+                executions[key].extend(columns[key])
+    
+    store = {'version': np.array(MEASUREMENT_STORE_VERSION)}
+    for column in ('query', 'abstract_pattern', 'template', 'node_id'):
+        store[column] = np.array(queries[column], dtype=str)
+    store['q_number'] = np.array(queries['q_number'], dtype=np.int32)
+    store['predicted_paths'] = np.array(queries['predicted_paths'], dtype=np.int64)
+    store['query_id'] = np.array(executions['query_id'], dtype=np.int32)
+    store['repetition'] = np.array(executions['repetition'], dtype=np.int32)
+    store['warmup'] = np.array(executions['warmup'], dtype=bool)
+    store['results'] = np.array(executions['results'], dtype=np.int64)
+    for key in ('parser_ms', 'optimizer_ms', 'execution_ms'):
+        store[key] = np.array(executions[key], dtype=np.float64)
+    return store
+
+
+def save_measurement_store(store_path, store):
+    """Guarda el almacén en un .npz sin comprimir (escritura atómica) para cargarlo en milisegundos"""
+    temp_path = store_path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        np.savez(f, **store)
+    os.replace(temp_path, store_path)
+
+
+def load_measurement_store(store_path):
+    """Carga el almacén de mediciones; lanza ValueError si la versión no es compatible"""
+    with np.load(store_path, allow_pickle=False) as data:
+        store = {name: data[name] for name in data.files}
+    if int(store.get('version', -1)) != MEASUREMENT_STORE_VERSION:
+        raise ValueError(f"versión de almacén de mediciones no compatible en {store_path}")
+    # Almacenes anteriores al protocolo de calentamiento: todas las ejecuciones son medidas
+    store.setdefault('warmup', np.zeros(len(store['query_id']), dtype=bool))
+    return store
+
+
+def measurement_frame(store):
+    """DataFrame con una fila por ejecución y las columnas de su consulta (para análisis posteriores)"""
+    import pandas as pd
+    
+    query_ids = store['query_id']
+    frame = pd.DataFrame({column: store[column] for column in _STORE_EXECUTION_COLUMNS})
+    for column in _STORE_QUERY_COLUMNS:
+        frame[column] = store[column][query_ids]
+    frame['total_ms'] = store['parser_ms'] + store['optimizer_ms'] + store['execution_ms']
+    return frame
+
+
+def query_summary_frame(store):
+    """
+    Una fila por consulta del almacén: resultados de la primera ejecución medida, nº de ejecuciones
+    medidas, media y desviación estándar muestral del tiempo total y media de cada fase (parser,
+    optimizador, ejecución), calculadas en bloque con bincount. Las ejecuciones de calentamiento
+    no entran en las estadísticas.
+    """
+    import pandas as pd
+    
+    measured = ~store['warmup']
+    query_ids = store['query_id'][measured]
+    num_queries = len(store['query'])
+    # Tiempo total como suma de los tres componentes
+    totals = (store['parser_ms'] + store['optimizer_ms'] + store['execution_ms'])[measured]
+    counts = np.bincount(query_ids, minlength=num_queries)
+    means = np.bincount(query_ids, weights=totals, minlength=num_queries) / np.maximum(counts, 1)
+    squared_deviations = (totals - means[query_ids]) ** 2
+    variances = np.bincount(query_ids, weights=squared_deviations, minlength=num_queries) / np.maximum(counts - 1, 1)
+    
+    # Primera ejecución medida (repetición mínima) de cada consulta
+    order = np.lexsort((store['repetition'][measured], query_ids))
+    first_rows = order[np.minimum(np.searchsorted(query_ids[order], np.arange(num_queries)), max(len(order) - 1, 0))]
+    
+    q_numbers = store['q_number']
+    frame = pd.DataFrame({
+        'Consulta': store['query'].astype(object),
+        'Patrón Abstracto': store['abstract_pattern'].astype(object),
+        'Consulta Plantilla': store['template'].astype(object),
+        'ID Nodo': store['node_id'].astype(object),
+        'Número de Paths': store['results'][measured][first_rows] if len(order) else np.zeros(num_queries, dtype=np.int64),
+        'Q Number': q_numbers if (q_numbers > 0).all() else np.where(q_numbers > 0, q_numbers, np.nan),
+        'Ejecuciones': counts
+    })
+    predicted_paths = store['predicted_paths']
+    if (predicted_paths >= 0).any():
+        frame['Paths Estimados'] = predicted_paths if (predicted_paths >= 0).all() \
+            else np.where(predicted_paths >= 0, predicted_paths, np.nan)
+    frame['Tiempo Ejecución (ms)'] = means
+    frame['Desviación Estándar (ms)'] = np.where(counts > 1, np.sqrt(variances), 0.0)
+    # Media de cada fase por separado (su suma es el tiempo total)
+    for column, label, _ in QUERY_PHASES:
+        frame[f"{label} (ms)"] = np.bincount(query_ids, weights=store[column][measured],
+                                             minlength=num_queries) / np.maximum(counts, 1)
+    return frame[counts > 0].reset_index(drop=True)
+
+
+#################################################
+# ESTADÍSTICAS AGREGADAS POR PATRÓN, PLANTILLA Y NODO
+#################################################
+
+def aggregate_query_statistics(df):
+    """
+    Etapa única de agregación sobre el DataFrame por consulta: agrupa una vez por patrón
+    abstracto, por plantilla y por nodo, con el tiempo total y el de cada fase. Todos los
+    informes (hojas por patrón, Resumen y rankings) consumen su resultado en lugar de volver a
+    filtrar el DataFrame.
+    """
+    # Promedio de cada fase junto al del tiempo total en los tres niveles
+    phase_means = {f"{label} Promedio (ms)": (f"{label} (ms)", 'mean') for _, label, _ in QUERY_PHASES}
+    by_pattern = df.groupby('Patrón Abstracto', sort=False)
+    pattern_stats = by_pattern.agg(**{
+        'Número de Consultas': ('Consulta', 'size'),
+        'Tiempo Promedio (ms)': ('Tiempo Ejecución (ms)', 'mean'),
+        'Tiempo Mínimo (ms)': ('Tiempo Ejecución (ms)', 'min'),
+        'Tiempo Máximo (ms)': ('Tiempo Ejecución (ms)', 'max'),
+        'Total Paths': ('Número de Paths', 'sum'),
+        'Promedio Paths': ('Número de Paths', 'mean'),
+        **phase_means
+    })
+    template_stats = df.groupby(['Patrón Abstracto', 'Consulta Plantilla']).agg(**{
+        'Promedio Paths': ('Número de Paths', 'mean'),
+        'Tiempo Promedio (ms)': ('Tiempo Ejecución (ms)', 'mean'),
+        **phase_means
+    })
+    node_stats = df.groupby(['Patrón Abstracto', 'ID Nodo'], sort=False).agg(**{
+        'Número de Consultas': ('Consulta', 'size'),
+        'Promedio Paths': ('Número de Paths', 'mean'),
+        'Tiempo Promedio (ms)': ('Tiempo Ejecución (ms)', 'mean'),
+        **phase_means
+    })
+    return {
+        'rows': dict(iter(by_pattern)),
+        'patterns': pattern_stats,
+        'templates': template_stats,
+        'nodes': node_stats
+    }
+
+
+def phase_ranking_sheets(stats, pattern_to_q_number):
+    """
+    Hojas de rankingFases.xlsx: reparto del tiempo entre fases por patrón (con la fase dominante)
+    y, por cada fase, las plantillas de todos los patrones ordenadas por su promedio en esa fase.
+    """
+    phase_columns = [f"{label} Promedio (ms)" for _, label, _ in QUERY_PHASES]
+    q_numbers = lambda patterns: [f"Q{int(q_number)}" if q_number is not None else "Desconocido"
+                                  for q_number in map(pattern_to_q_number.get, patterns)]
+    
+    patterns = stats['patterns'][['Tiempo Promedio (ms)'] + phase_columns].reset_index()
+    patterns.insert(0, 'Q Number', q_numbers(patterns['Patrón Abstracto']))
+    total = patterns['Tiempo Promedio (ms)'].where(patterns['Tiempo Promedio (ms)'] > 0)
+    for (_, label, _), column in zip(QUERY_PHASES, phase_columns):
+        patterns[f"% {label}"] = patterns[column] / total * 100
+    patterns['Fase Dominante'] = patterns[phase_columns].idxmax(axis=1).str.replace(' Promedio (ms)', '', regex=False)
+    sheets = [excel_sheet('Patrones', patterns)]
+    
+    templates = stats['templates'].reset_index().rename(columns={'Consulta Plantilla': 'Template Query'})
+    templates.insert(0, 'Q Number', q_numbers(templates['Patrón Abstracto']))
+    template_total = templates['Tiempo Promedio (ms)'].where(templates['Tiempo Promedio (ms)'] > 0)
+    for (_, label, _), column in zip(QUERY_PHASES, phase_columns):
+        ranking = templates.sort_values(column, ascending=False, kind='stable')
+        ranking = ranking[['Q Number', 'Patrón Abstracto', 'Template Query', column, 'Tiempo Promedio (ms)']].copy()
+        ranking[f"% {label}"] = ranking[column] / template_total.loc[ranking.index] * 100
+        ranking.insert(0, 'Ranking', range(1, len(ranking) + 1))
+        sheets.append(excel_sheet(label, ranking))
+    return sheets
+
+
+def phase_scaling_frame(scale_stats):
+    """
+    Promedio de cada fase y del total por patrón en cada factor de escala ({escala: estadísticas por
+    patrón}, en orden creciente) y su crecimiento entre la primera y la última escala.
+    """
+    import pandas as pd
+    
+    phases = [(label, f"{label} Promedio (ms)") for _, label, _ in QUERY_PHASES] + [('Total', 'Tiempo Promedio (ms)')]
+    patterns = list(dict.fromkeys(pattern for stats in scale_stats.values() for pattern in stats.index))
+    scale_columns = [f"Escala {scale} (ms)" for scale in scale_stats]
+    
+    rows = []
+    for pattern in patterns:
+        for label, column in phases:
+            row = {'Patrón Abstracto': pattern, 'Fase': label}
+            for scale_column, stats in zip(scale_columns, scale_stats.values()):
+                row[scale_column] = stats[column].get(pattern, np.nan)
+            rows.append(row)
+    frame = pd.DataFrame(rows, columns=['Patrón Abstracto', 'Fase'] + scale_columns)
+    first, last = frame[scale_columns[0]], frame[scale_columns[-1]]
+    frame['Crecimiento'] = last / first.where(first > 0)
+    return frame
+
+
+def _natural_key(text):
+    """Clave de orden natural ("2" antes que "10")"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', text)]
+
+
+#################################################
+# DISTRIBUCIÓN DE LATENCIAS: PERCENTILES E INTERVALOS BOOTSTRAP
+#################################################
+
+# Libro con el promedio de cada fase por patrón en cada factor de escala
+PHASE_SCALING_NAME = "escalado_fases.xlsx"
+# Percentiles de la distribución por ejecución y criterios de ordenación de los rankings
+DISTRIBUTION_PERCENTILES = (50, 90, 95, 99)
+RANKING_ORDERS = ("paths", "p50", "p90", "p95", "p99", "max") + tuple(key for _, _, key in QUERY_PHASES)
+# Remuestreos bootstrap, nivel de confianza y semilla (intervalos reproducibles entre ejecuciones)
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 0
+# Máximo de valores remuestreados que se materializan a la vez
+BOOTSTRAP_CHUNK_ELEMENTS = 8_000_000
+
+
+def grouped_distribution(values, group_ids, num_groups, resamples=BOOTSTRAP_RESAMPLES,
+                         confidence=BOOTSTRAP_CONFIDENCE, seed=BOOTSTRAP_SEED):
+    """
+    Percentiles, máximo e intervalos bootstrap (percentil) de la mediana y la media de cada grupo.
+    Los grupos con el mismo tamaño se procesan juntos como una matriz de filas ordenadas y cada
+    remuestreo se representa por sus frecuencias: la mediana sale de la frecuencia acumulada y la
+    media de un producto matricial, sin materializar las muestras. Con resamples = 0 no se
+    calculan intervalos (NaN).
+    """
+    rng = np.random.default_rng(seed)
+    counts = np.bincount(group_ids, minlength=num_groups)
+    order = np.argsort(group_ids, kind='stable')
+    sorted_values = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    tail = (1 - confidence) / 2 * 100
+    
+    result = {'counts': counts, 'mean': np.full(num_groups, np.nan), 'max': np.full(num_groups, np.nan),
+              'percentiles': np.full((num_groups, len(DISTRIBUTION_PERCENTILES)), np.nan)}
+    for name in ('median_low', 'median_high', 'mean_low', 'mean_high'):
+        result[name] = np.full(num_groups, np.nan)
+    
+    for size in np.unique(counts[counts > 0]):
+        groups = np.flatnonzero(counts == size)
+        matrix = np.sort(sorted_values[starts[groups][:, None] + np.arange(size)], axis=1)
+        result['percentiles'][groups] = np.percentile(matrix, DISTRIBUTION_PERCENTILES, axis=1).T
+        result['mean'][groups] = matrix.mean(axis=1)
+        result['max'][groups] = matrix.max(axis=1)
+        if resamples <= 0:
+            continue
+        if size == 1:
+            for name in ('median_low', 'median_high', 'mean_low', 'mean_high'):
+                result[name][groups] = matrix[:, 0]
+            continue
+        
+        group_chunk = max(1, BOOTSTRAP_CHUNK_ELEMENTS // resamples)
+        resample_chunk = max(1, min(resamples, BOOTSTRAP_CHUNK_ELEMENTS // size))
+        for start in range(0, len(groups), group_chunk):
+            block = matrix[start:start + group_chunk]
+            medians = np.empty((len(block), resamples))
+            means = np.empty((len(block), resamples))
+            for done in range(0, resamples, resample_chunk):
+                chunk = min(resample_chunk, resamples - done)
+                indices = rng.integers(0, size, size=(chunk, size))
+                frequencies = np.bincount((np.arange(chunk)[:, None] * size + indices).ravel(),
+                                          minlength=chunk * size).reshape(chunk, size)
+                # Posiciones (en la fila ordenada) de los elementos centrales de cada remuestreo
+                cumulative = np.cumsum(frequencies, axis=1)
+                lower = (cumulative > (size - 1) // 2).argmax(axis=1)
+                upper = (cumulative > size // 2).argmax(axis=1)
+                medians[:, done:done + chunk] = (block[:, lower] + block[:, upper]) / 2
+                means[:, done:done + chunk] = block @ (frequencies.T / size)
+            
+            selected = groups[start:start + group_chunk]
+            result['median_low'][selected], result['median_high'][selected] = np.percentile(medians, [tail, 100 - tail], axis=1)
+            result['mean_low'][selected], result['mean_high'][selected] = np.percentile(means, [tail, 100 - tail], axis=1)
+    return result
+
+
+def median_confidence_interval(latencies, resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE):
+    """
+    Mediana de las latencias, su intervalo bootstrap y el ancho relativo del intervalo
+    (ancho / mediana). Con menos de 2 valores o mediana 0 el ancho relativo es infinito.
+    """
+    values = np.asarray(latencies, dtype=np.float64)
+    if len(values) < 2:
+        median = float(values[0]) if len(values) else np.nan
+        return median, np.nan, np.nan, np.inf
+    distribution = grouped_distribution(values, np.zeros(len(values), dtype=np.int64), 1, resamples, confidence)
+    median = float(distribution['percentiles'][0, 0])
+    low, high = float(distribution['median_low'][0]), float(distribution['median_high'][0])
+    return median, low, high, (high - low) / median if median > 0 else np.inf
+
+
+def _distribution_columns(distribution, confidence):
+    """Columnas de la distribución en el orden de los informes"""
+    level = f"IC{confidence * 100:g}%"
+    columns = {'Ejecuciones': distribution['counts'], 'Media (ms)': distribution['mean']}
+    for i, percentile in enumerate(DISTRIBUTION_PERCENTILES):
+        columns[f"p{percentile} (ms)"] = distribution['percentiles'][:, i]
+    columns['Máximo (ms)'] = distribution['max']
+    columns[f"{level} Mediana Inf (ms)"] = distribution['median_low']
+    columns[f"{level} Mediana Sup (ms)"] = distribution['median_high']
+    columns[f"{level} Media Inf (ms)"] = distribution['mean_low']
+    columns[f"{level} Media Sup (ms)"] = distribution['mean_high']
+    return columns
+
+
+def latency_distribution_frames(store, resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE,
+                                seed=BOOTSTRAP_SEED):
+    """
+    Distribución del tiempo total por ejecución medida (sin calentamiento) por consulta, por
+    plantilla y por patrón abstracto. Plantillas y patrones agrupan todas las ejecuciones de
+    sus consultas, no las medias por consulta.
+    """
+    import pandas as pd
+    
+    measured = ~store['warmup']
+    query_ids = store['query_id'][measured]
+    totals = (store['parser_ms'] + store['optimizer_ms'] + store['execution_ms'])[measured]
+    queries = pd.DataFrame({'Consulta': store['query'].astype(object),
+                            'Patrón Abstracto': store['abstract_pattern'].astype(object),
+                            'Consulta Plantilla': store['template'].astype(object)})
+    
+    frames = {}
+    levels = (('queries', ['Consulta', 'Patrón Abstracto', 'Consulta Plantilla'], None),
+              ('templates', ['Patrón Abstracto', 'Consulta Plantilla'], queries.groupby(['Patrón Abstracto', 'Consulta Plantilla'])),
+              ('patterns', ['Patrón Abstracto'], queries.groupby('Patrón Abstracto')))
+    for name, keys, grouped in levels:
+        if grouped is None:
+            group_of_query, keys_frame = np.arange(len(queries)), queries
+        else:
+            group_of_query = grouped.ngroup().to_numpy()
+            keys_frame = grouped.size().index.to_frame(index=False)
+        distribution = grouped_distribution(totals, group_of_query[query_ids], len(keys_frame),
+                                            resamples, confidence, seed)
+        frame = keys_frame[keys].reset_index(drop=True).assign(**_distribution_columns(distribution, confidence))
+        frames[name] = frame[frame['Ejecuciones'] > 0].reset_index(drop=True)
+    return frames
+
+
+#################################################
+# EXPORTACIÓN A EXCEL EN STREAMING
+#################################################
+
+# Formatos de celda disponibles para los pies de hoja
+_EXCEL_FORMATS = {
+    'bold': {'bold': True},
+    'num': {'num_format': '0'},
+    'bold_num': {'bold': True, 'num_format': '0'}
+}
+
+
+def excel_sheet(name, frame, footer=(), number_columns=()):
+    """
+    Especificación de una hoja: DataFrame sin índice, filas de pie (desplazamiento tras la última
+    fila de datos, columna, valor, formato) y columnas con formato numérico entero.
+    """
+    return {'name': name, 'frame': frame, 'footer': list(footer), 'number_columns': list(number_columns)}
+
+
+def _excel_value(value):
+    """Valor nativo de Python para xlsxwriter; None para celdas vacías (NaN/None)"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+
+def _unique_sheet_name(name, used):
+    """Nombre de hoja único (Excel no distingue mayúsculas) dentro del límite de 31 caracteres"""
+    candidate, suffix = name[:31], 2
+    while candidate.lower() in used:
+        candidate = f"{name[:31 - len(str(suffix)) - 1]}~{suffix}"
+        suffix += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def export_workbook(path, sheets):
+    """
+    Escribe un libro con xlsxwriter en modo constant_memory: cada hoja se vuelca fila a fila
+    (encabezado, datos y pie) sin mantener el libro en memoria.
+    """
+    import xlsxwriter
+    
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        formats = {key: workbook.add_format(spec) for key, spec in _EXCEL_FORMATS.items()}
+        used_names = set()
+        for sheet in sheets:
+            frame = sheet['frame']
+            worksheet = workbook.add_worksheet(_unique_sheet_name(sheet['name'], used_names))
+            
+            for col, name in enumerate(frame.columns):
+                worksheet.write(0, col, name)
+                if name in sheet['number_columns']:
+                    worksheet.set_column(col, col, None, formats['num'])
+            
+            columns = [frame[name].tolist() for name in frame.columns]
+            for row, values in enumerate(zip(*columns), 1):
+                for col, value in enumerate(values):
+                    value = _excel_value(value)
+                    if value is not None:
+                        worksheet.write(row, col, value)
+            
+            # Pie ordenado por fila: constant_memory solo admite escribir hacia adelante
+            for offset, col, value, format_name in sorted(sheet['footer'], key=lambda cell: (cell[0], cell[1])):
+                value = _excel_value(value)
+                if value is not None:
+                    worksheet.write(len(frame) + 1 + offset, col, value, formats[format_name])
+    finally:
+        workbook.close()
+    return path
+
+
+def export_workbooks(workbooks, workers=1):
+    """Escribe varios libros {ruta: hojas}; con workers > 1 cada libro se escribe en un proceso aparte"""
+    if workers <= 1 or len(workbooks) <= 1:
+        return [export_workbook(path, sheets) for path, sheets in workbooks.items()]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with ProcessPoolExecutor(max_workers=min(workers, len(workbooks))) as executor:
+        futures = [executor.submit(export_workbook, path, sheets) for path, sheets in workbooks.items()]
+        return [future.result() for future in futures]
+
+
+#################################################
+# ÍNDICE EN MEMORIA DE LOS RANKINGS
+#################################################
+
+RANKING_CACHE_VERSION = 1
+
+# Libros de ranking ya cargados en este proceso: ruta -> (clave de validez, {hoja: registros})
+_ranking_workbooks = {}
+
+
+def ranking_cache_path(workbook_path):
+    """Ruta del caché serializado que se guarda junto al libro de ranking"""
+    return workbook_path + ".cache.pkl"
+
+
+def _ranking_workbook_key(workbook_path):
+    """Clave de validez del caché: versión, tamaño y mtime del libro"""
+    stat = os.stat(workbook_path)
+    return (RANKING_CACHE_VERSION, stat.st_size, stat.st_mtime_ns)
+
+
+def load_ranking_workbook(workbook_path):
+    """
+    Todas las hojas de un libro de ranking como {hoja: registros}. Se parsea el Excel una sola vez:
+    después se usa la copia en memoria o el caché junto al libro mientras su mtime no cambie.
+    """
+    import pandas as pd
+    
+    key = _ranking_workbook_key(workbook_path)
+    cached = _ranking_workbooks.get(workbook_path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    
+    sheets = None
+    cache_path = ranking_cache_path(workbook_path)
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_key, cached_sheets = pickle.load(f)
+            if cached_key == key:
+                sheets = cached_sheets
+        except Exception as e:
+            print(f"⚠️  Caché de ranking inválido ({cache_path}): {e}")
+    
+    if sheets is None:
+        sheets = {name: frame.to_dict('records')
+                  for name, frame in pd.read_excel(workbook_path, sheet_name=None).items()}
+        try:
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                pickle.dump((key, sheets), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"⚠️  No se pudo guardar el caché de ranking {cache_path}: {e}")
+    
+    _ranking_workbooks[workbook_path] = (key, sheets)
+    return sheets
+
+
+def ranking_templates_index(sheets):
+    """Índice {Q number: plantillas ordenadas} a partir de las hojas "Q{n}" de rankingTemplates.xlsx"""
+    return {int(name[1:]): records for name, records in sheets.items() if re.fullmatch(r"Q\d+", name)}
+
 
 class PathBenchmark: 
     
     def __init__(self, patterns_file=None, abstract_patterns_file=None, nodes_per_label=3,
                     selection_mode="max", query_selection_mode=None, queries_per_pattern=3,
                     selective_queries=None, use_existing_results=False, result_file="result.txt",
-                    nodes_per_label_explicit=False, use_rankings=None, calculate_new=True):
+                    nodes_per_label_explicit=False, use_rankings=None, calculate_new=True,
+                    edge_workers=1, degree_cache=True, node_ranking="degree", prune_empty=False,
+                    label_pool="first", export_script=False, concurrency_levels=None,
+                    sweep_duration=5, arrival_rates=None, arrival="poisson", log_workers=1,
+                    export_workers=1, batch=False, server_ready_timeout=SERVER_READY_TIMEOUT,
+                    warmup=0, repeat=1, cache_mode="none", cold_restart="query",
+                    bootstrap_resamples=BOOTSTRAP_RESAMPLES, rank_by="paths", target_ci=None,
+                    max_repeat=ADAPTIVE_MAX_RUNS, max_total_runs=0):
         self.scale_factors = ["01", "03", "1", "3"]
         self.selected_scale = "01"
         self.server_process = None
-        self.query_process = None
+        self.query_pool = None
         self.mappings_file = "nodos.txt"
         self.db_path = os.path.join("MillenniumDB", "data", "db", self.selected_scale)
         
@@ -80,6 +2077,71 @@ class PathBenchmark:
         self.calculate_new = calculate_new
         self.use_rankings = use_rankings
         
+        # Número de procesos para contar grados en edges.txt (1 = serial, 0 = todos los núcleos)
+        self.edge_workers = edge_workers if edge_workers > 0 else (os.cpu_count() or 1)
+        self.degree_cache = degree_cache
+        
+        # Número de procesos para parsear el log del servidor (1 = serial, 0 = todos los núcleos)
+        self.log_workers = log_workers if log_workers > 0 else (os.cpu_count() or 1)
+        
+        # Procesos para escribir los libros Excel de resultados (1 = serial, 0 = uno por núcleo)
+        self.export_workers = export_workers if export_workers > 0 else (os.cpu_count() or 1)
+        # Resumen por consulta del último análisis, en memoria
+        self.query_summary = None
+        
+        # Modo batch: sin pantalla de bienvenida, pausas decorativas ni preguntas (CI y campañas por script)
+        self.batch = batch
+        
+        # Plazo para que mdb-server responda tras arrancar y tiempo medido hasta estar listo
+        self.server_ready_timeout = server_ready_timeout
+        self.server_ready_s = None
+        
+        # Protocolo de medición: ejecuciones de calentamiento (excluidas de las estadísticas) y medidas por consulta
+        self.warmup = warmup
+        self.repeat = repeat
+        
+        # Repetición adaptativa: ancho relativo objetivo del IC de la mediana (None = número fijo de
+        # ejecuciones) y límites de ejecuciones medidas por consulta y en total (0 = sin límite global)
+        self.target_ci = target_ci
+        self.max_repeat = max_repeat
+        self.max_total_runs = max_total_runs
+        self.adaptive_runs = None
+        
+        # Estado de la caché de páginas del SO: none (sin tocar), warm (precarga) o cold (además, pasada en frío)
+        self.cache_mode = cache_mode
+        self.cold_restart = cold_restart
+        
+        # Distribución de latencias: remuestreos bootstrap (0 = sin intervalos) y criterio de orden de los rankings
+        self.bootstrap_resamples = bootstrap_resamples
+        self.rank_by = rank_by
+        self.latency_summary = None
+        
+        # Criterio para elegir nodos iniciales: grado de la primera etiqueta o fan-out multi-salto
+        self.node_ranking = node_ranking
+        
+        # Omitir consultas que el oráculo local (adyacencia de edges.txt) demuestra vacías
+        self.prune_empty = prune_empty
+        
+        # Pool de nodos por plantilla: mapeo de la primera etiqueta inicial o unión de todas las posibles
+        self.label_pool = label_pool
+        
+        # Las consultas se ejecutan en proceso; el script bash con curl es solo una exportación opcional
+        self.export_script = export_script
+        self.generated_queries = []
+        self.query_info = {}
+        self.client_timings = []
+        # Log de mdb-server de la ejecución en curso y registros por consulta leídos de él
+        self.server_log = "result.txt"
+        self.server_records = []
+        
+        # Barrido de concurrencia en ciclo cerrado (None = desactivado) y segundos por nivel
+        self.concurrency_levels = concurrency_levels
+        self.sweep_duration = sweep_duration
+        
+        # Carga en lazo abierto: tasas objetivo en consultas/s (None = desactivada) y tipo de llegadas
+        self.arrival_rates = arrival_rates
+        self.arrival = arrival
+        
         if calculate_new:
             self.operation_mode = "calculate_new"
             self.rankings_scale = None
@@ -115,7 +2177,11 @@ class PathBenchmark:
         self.query_patterns = self.load_patterns(patterns_file)
         self.abstract_patterns, self.query_distribution = self.load_abstract_patterns(abstract_patterns_file)
         self.node_mappings = {}
+        self.template_node_mappings = {}
+        self.adjacency = None
         self.query_to_pattern = {}
+        # Asignación (plantilla, patrón abstracto) por posición; conserva las plantillas repetidas
+        self.template_assignments = []
         self.pattern_to_q_number = self.generate_q_number_mapping()
 
 
@@ -226,8 +2292,7 @@ class PathBenchmark:
             return []
         
         try:
-            df = pd.read_excel(ranking_path, sheet_name='Ranking')
-            return df.to_dict('records')
+            return load_ranking_workbook(ranking_path)['Ranking']
         except Exception as e:
             print(f"❌ Error leyendo {ranking_path}: {e}")
             return []
@@ -241,11 +2306,16 @@ class PathBenchmark:
         
         sheet_name = f"Q{q_number}"
         try:
-            df = pd.read_excel(ranking_path, sheet_name=sheet_name)
-            return df.to_dict('records')
+            sheets = load_ranking_workbook(ranking_path)
         except Exception as e:
             print(f"❌ Error leyendo sheet {sheet_name} de {ranking_path}: {e}")
             return []
+        
+        templates = ranking_templates_index(sheets).get(q_number)
+        if templates is None:
+            print(f"❌ Error leyendo sheet {sheet_name} de {ranking_path}: la hoja no existe")
+            return []
+        return templates
 
     def generate_pool_from_rankings(self):
         print(f"\n🎯 Generando pool selectivo desde rankings/{self.rankings_scale}/")
@@ -315,9 +2385,12 @@ class PathBenchmark:
         print(f"\n✅ Pool final generado: {len(pool_queries)} consultas")
         
         self.save_pool_from_rankings(pool_queries)
+        return pool_queries
 
 
     def save_pool_from_rankings(self, pool_queries):
+        import pandas as pd
+        
         if not pool_queries:
             print("❌ No hay consultas en el pool para guardar")
             return
@@ -328,7 +2401,7 @@ class PathBenchmark:
         
         df = pd.DataFrame(pool_queries)
         excel_path = os.path.join(output_folder, "pool_final_from_rankings.xlsx")
-        df.to_excel(excel_path, index=False)
+        export_workbook(excel_path, [excel_sheet('Sheet1', df)])
         
         txt_path = os.path.join(output_folder, "pool_final_from_rankings.txt")
         with open(txt_path, 'w', encoding='utf-8') as f:
@@ -394,10 +2467,12 @@ class PathBenchmark:
         # Si no hay patrones abstractos, no podemos hacer mapeo
         if not self.query_distribution:
             print("No hay patrones abstractos definidos. Las consultas no se agruparán.")
+            self.template_assignments = [(query, "Desconocido") for query in self.query_patterns]
             return
         
         # Reseteamos el mapeo
         self.query_to_pattern = {}
+        self.template_assignments = []
         
         # Recorremos la lista de consultas, asignando patrones según la distribución
         current_index = 0
@@ -411,6 +2486,7 @@ class PathBenchmark:
                 if current_index < len(self.query_patterns):
                     query = self.query_patterns[current_index]
                     self.query_to_pattern[query] = pattern_name
+                    self.template_assignments.append((query, pattern_name))
                     #print(f"  - Consulta #{current_index+1}: '{query[:40]}...' -> '{pattern_name}'")
                     current_index += 1
                 else:
@@ -423,6 +2499,7 @@ class PathBenchmark:
         while current_index < len(self.query_patterns):
                     consulta = self.query_patterns[current_index]
                     self.query_to_pattern[consulta] = "Otros"
+                    self.template_assignments.append((consulta, "Otros"))
                     print(f"Consulta {current_index + 1} asignada a 'Otros': {consulta}")
                     current_index += 1
                     otros_count += 1
@@ -433,6 +2510,40 @@ class PathBenchmark:
         
         print(f"Se asignaron {len(self.query_to_pattern)} consultas a {len(set(self.query_to_pattern.values()))} patrones abstractos")
 
+    def load_degree_tables(self, edges_path):
+        """
+        Obtiene las tablas de grados por etiqueta de edges.txt, desde el caché si la huella del
+        dataset coincide o recalculándolas (y actualizando el caché) en caso contrario
+        """
+        ingest_start = time.time()
+        cache_path = degree_cache_path(edges_path)
+        
+        if self.degree_cache:
+            fingerprint = dataset_fingerprint(edges_path)
+            degree_tables = load_degree_cache(cache_path, fingerprint)
+            if degree_tables is not None:
+                print(f"⚡ Tablas de grados cargadas desde caché {cache_path} en {time.time() - ingest_start:.3f} s")
+                return degree_tables
+            if os.path.exists(cache_path):
+                print(f"🔄 Caché de grados obsoleto, se reconstruirá: {cache_path}")
+        
+        # Ingesta vectorizada: memory-map + parseo por bloques + conteo con bincount
+        if self.edge_workers > 1:
+            print(f"Contando grados en paralelo con {self.edge_workers} procesos...")
+            degree_tables = compute_degree_tables_parallel(edges_path, self.edge_workers)
+        else:
+            degree_tables = compute_degree_tables(load_edge_arrays(edges_path))
+        print(f"Se procesaron {len(degree_tables)} etiquetas en {time.time() - ingest_start:.2f} s")
+        
+        if self.degree_cache:
+            try:
+                save_degree_cache(cache_path, fingerprint, degree_tables)
+                print(f"💾 Caché de grados guardado en {cache_path}")
+            except Exception as e:
+                print(f"⚠️  No se pudo guardar el caché de grados: {e}")
+        
+        return degree_tables
+
     def generate_mappings_file(self):
         """Genera el archivo de mapeos analizando el archivo edges.txt según el factor de escala y los modos de selección"""
         # Construir la ruta al archivo edges.txt según el factor de escala
@@ -447,9 +2558,6 @@ class PathBenchmark:
             print("Se usarán mapeos predeterminados.")
             return
         
-        # Diccionarios para almacenar conteos
-        relationship_data = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-        
         # Asignar el número completo de nodos a cada modo
         nodes_per_mode = {}
         for mode in self.selection_modes:
@@ -461,15 +2569,7 @@ class PathBenchmark:
         
         # Procesar el archivo
         try:
-            with open(edges_path, 'r') as file:
-                for line in file:
-                    parts = line.strip().split(',')
-                    if len(parts) >= 3:  # Asegurar que tengamos origen, relación y destino
-                        origin, relation, target = parts[0], parts[1], parts[2]
-                        
-                        # Contar relaciones salientes y entrantes
-                        relationship_data[relation]['outgoing'][origin] += 1
-                        relationship_data[relation]['incoming'][target] += 1
+            degree_tables = self.load_degree_tables(edges_path)
             
             # *** NUEVA SECCIÓN: CREAR CARPETA Y RANKINGS POR ETIQUETA ***
             rankings_folder = "rankingsNodes"  # Crear en la raíz primero
@@ -491,11 +2591,12 @@ class PathBenchmark:
                 count = 0
                 
                 # Procesar cada relación y seleccionar los nodos según los modos
-                for relation, counts in relationship_data.items():
+                for relation, tables in degree_tables.items():
                     # Obtener los nodos con conexiones salientes
-                    if counts['outgoing']:
-                        # Ordenar nodos por número de conexiones (descendente)
-                        sorted_nodes = sorted(counts['outgoing'].items(), key=lambda x: x[1], reverse=True)
+                    outgoing_nodes, outgoing_counts = tables['outgoing']
+                    if len(outgoing_nodes):
+                        # Los nodos ya vienen ordenados por número de conexiones (descendente)
+                        sorted_nodes = list(zip(outgoing_nodes.tolist(), outgoing_counts.tolist()))
                         total_nodes = len(sorted_nodes)
                         
                         # *** GENERAR RANKING INDIVIDUAL PARA ESTA ETIQUETA ***
@@ -528,151 +2629,33 @@ class PathBenchmark:
                             ranking_file.write(f"\n# NODOS SELECCIONADOS POR MODO (top {self.nodes_per_label}):\n")
                             for mode in self.selection_modes:
                                 ranking_file.write(f"# Modo {mode.upper()}:\n")
-                                if mode == "max":
-                                    selected_for_mode = sorted_nodes[:self.nodes_per_label]
-                                elif mode == "min":
-                                    valid_nodes = [(node, count) for node, count in sorted_nodes if count > 0]
-                                    valid_nodes.sort(key=lambda x: x[1])  # Ascendente para min
-                                    selected_for_mode = valid_nodes[:self.nodes_per_label]
-                                elif mode == "med":
-                                    median_idx = len(sorted_nodes) // 2
-                                    half_count = self.nodes_per_label // 2
-                                    remainder = self.nodes_per_label % 2
-                                    start_idx = max(0, median_idx - half_count)
-                                    end_idx = min(len(sorted_nodes), median_idx + half_count + remainder)
-                                    selected_for_mode = sorted_nodes[start_idx:end_idx]
-                                elif mode == ".25":
-                                    p25_idx = len(sorted_nodes) // 4
-                                    half_count = self.nodes_per_label // 2
-                                    remainder = self.nodes_per_label % 2
-                                    start_idx = max(0, p25_idx - half_count)
-                                    end_idx = min(len(sorted_nodes), p25_idx + half_count + remainder)
-                                    selected_for_mode = sorted_nodes[start_idx:end_idx]
-                                elif mode == ".75":
-                                    p75_idx = (len(sorted_nodes) * 3) // 4
-                                    half_count = self.nodes_per_label // 2
-                                    remainder = self.nodes_per_label % 2
-                                    start_idx = max(0, p75_idx - half_count)
-                                    end_idx = min(len(sorted_nodes), p75_idx + half_count + remainder)
-                                    selected_for_mode = sorted_nodes[start_idx:end_idx]
+                                selected_for_mode = select_positions(outgoing_counts, mode, self.nodes_per_label,
+                                                                     adjust=False)
                                 
-                                for pos, (node_id, conn_count) in enumerate(selected_for_mode, 1):
-                                    # Buscar la posición real en el ranking completo
-                                    real_position = next(i for i, (nid, _) in enumerate(sorted_nodes, 1) if nid == node_id)
-                                    ranking_file.write(f"#   {pos}. {node_id} (pos {real_position}, {conn_count} conexiones)\n")
+                                for pos, position in enumerate(selected_for_mode, 1):
+                                    # La posición real en el ranking completo es directamente el índice
+                                    node_id, conn_count = sorted_nodes[position]
+                                    ranking_file.write(f"#   {pos}. {node_id} (pos {position + 1}, {conn_count} conexiones)\n")
                         
                         print(f"  ✓ Ranking generado: {relation}.txt ({total_nodes} nodos)")
                         # *** FIN DE GENERACIÓN DE RANKING INDIVIDUAL ***
                         
-                        # Lista para almacenar todos los nodos seleccionados para esta relación
-                        selected_nodes = []
+                        # Posiciones del ranking seleccionadas para esta relación (conjunto para evitar duplicados)
+                        selected_positions = []
+                        taken_positions = set()
                         
                         # Seleccionar nodos para cada modo configurado
                         for mode in self.selection_modes:
-                            mode_nodes_to_select = nodes_per_mode[mode]
-                            mode_selected_nodes = []
-                            
-                            # Filtrar nodos ya seleccionados para evitar duplicados
-                            available_nodes = [(node_id, node_count) for node_id, node_count in sorted_nodes 
-                                            if node_id not in selected_nodes]
-                            
-                            if mode == "max":
-                                # Seleccionar los nodos con más conexiones
-                                num_nodes = min(mode_nodes_to_select, len(available_nodes))
-                                mode_selected_nodes = [node[0] for node in available_nodes[:num_nodes]]
-                            
-                            elif mode == "min":
-                                # Seleccionar los nodos con menos conexiones, pero con al menos una conexión
-                                # Filtrar nodos que tienen al menos una conexión (>0)
-                                valid_nodes = [node for node in available_nodes if node[1] > 0]
-                                
-                                if valid_nodes:
-                                    # Ordenar por número de conexiones (ascendente)
-                                    valid_nodes.sort(key=lambda x: x[1])
-                                    
-                                    # Seleccionar hasta N nodos
-                                    num_nodes = min(mode_nodes_to_select, len(valid_nodes))
-                                    mode_selected_nodes = [node[0] for node in valid_nodes[:num_nodes]]
-                                else:
-                                    print(f"Advertencia: No hay nodos con conexiones salientes > 0 para la etiqueta '{relation}' en modo '{mode}'.")
-                            
-                            elif mode == "med":
-                                # Seleccionar nodos alrededor de la mediana
-                                if len(available_nodes) <= mode_nodes_to_select:
-                                    # Si hay menos nodos que los requeridos, tomamos todos
-                                    mode_selected_nodes = [node[0] for node in available_nodes]
-                                else:
-                                    # Calcular el índice de la mediana
-                                    median_idx = len(available_nodes) // 2
-                                    
-                                    # Calcular cuántos nodos tomar antes y después de la mediana
-                                    half_count = mode_nodes_to_select // 2
-                                    mode_remainder = mode_nodes_to_select % 2
-                                    
-                                    # Seleccionar nodos alrededor de la mediana
-                                    start_idx = max(0, median_idx - half_count)
-                                    end_idx = min(len(available_nodes), median_idx + half_count + mode_remainder)
-                                    
-                                    # Ajustar si no hay suficientes nodos a un lado
-                                    if start_idx == 0:
-                                        end_idx = min(len(available_nodes), mode_nodes_to_select)
-                                    elif end_idx == len(available_nodes):
-                                        start_idx = max(0, len(available_nodes) - mode_nodes_to_select)
-                                    
-                                    mode_selected_nodes = [node[0] for node in available_nodes[start_idx:end_idx]]
-                            
-                            elif mode == ".25":
-                                # Seleccionar nodos en el percentil 25
-                                if len(available_nodes) <= mode_nodes_to_select:
-                                    # Si hay menos nodos que los requeridos, tomamos todos
-                                    mode_selected_nodes = [node[0] for node in available_nodes]
-                                else:
-                                    # Calcular el índice del percentil 25
-                                    p25_idx = len(available_nodes) // 4
-                                    
-                                    # Calcular cuántos nodos tomar alrededor del percentil
-                                    half_count = mode_nodes_to_select // 2
-                                    mode_remainder = mode_nodes_to_select % 2
-                                    
-                                    # Seleccionar nodos alrededor del percentil 25
-                                    start_idx = max(0, p25_idx - half_count)
-                                    end_idx = min(len(available_nodes), p25_idx + half_count + mode_remainder)
-                                    
-                                    # Ajustar si no hay suficientes nodos a un lado
-                                    if start_idx == 0:
-                                        end_idx = min(len(available_nodes), mode_nodes_to_select)
-                                    elif end_idx == len(available_nodes):
-                                        start_idx = max(0, len(available_nodes) - mode_nodes_to_select)
-                                    
-                                    mode_selected_nodes = [node[0] for node in available_nodes[start_idx:end_idx]]
+                            mode_positions = select_positions(outgoing_counts, mode, nodes_per_mode[mode],
+                                                              excluded=taken_positions)
                             
-                            elif mode == ".75":
-                                # Seleccionar nodos en el percentil 75
-                                if len(available_nodes) <= mode_nodes_to_select:
-                                    # Si hay menos nodos que los requeridos, tomamos todos
-                                    mode_selected_nodes = [node[0] for node in available_nodes]
-                                else:
-                                    # Calcular el índice del percentil 75
-                                    p75_idx = (len(available_nodes) * 3) // 4
-                                    
-                                    # Calcular cuántos nodos tomar alrededor del percentil
-                                    half_count = mode_nodes_to_select // 2
-                                    mode_remainder = mode_nodes_to_select % 2
-                                    
-                                    # Seleccionar nodos alrededor del percentil 75
-                                    start_idx = max(0, p75_idx - half_count)
-                                    end_idx = min(len(available_nodes), p75_idx + half_count + mode_remainder)
-                                    
-                                    # Ajustar si no hay suficientes nodos a un lado
-                                    if start_idx == 0:
-                                        end_idx = min(len(available_nodes), mode_nodes_to_select)
-                                    elif end_idx == len(available_nodes):
-                                        start_idx = max(0, len(available_nodes) - mode_nodes_to_select)
-                                    
-                                    mode_selected_nodes = [node[0] for node in available_nodes[start_idx:end_idx]]
+                            if mode == "min" and not mode_positions:
+                                print(f"Advertencia: No hay nodos con conexiones salientes > 0 para la etiqueta '{relation}' en modo '{mode}'.")
                             
-                            # Añadir los nodos seleccionados a la lista general para esta relación
-                            selected_nodes.extend(mode_selected_nodes)
+                            selected_positions.extend(mode_positions)
+                            taken_positions.update(mode_positions)
+                        
+                        selected_nodes = [sorted_nodes[position][0] for position in selected_positions]
                         
                         # Escribir al archivo
                         if selected_nodes:
@@ -687,6 +2670,99 @@ class PathBenchmark:
             print("Se usarán mapeos predeterminados.")
 
 
+    def get_adjacency(self):
+        """Carga una sola vez la adyacencia CSR por etiqueta de edges.txt del factor de escala"""
+        if self.adjacency is None:
+            edges_path = os.path.join("MillenniumDB", "data", "ldbc", self.selected_scale, "edges.txt")
+            if not os.path.exists(edges_path):
+                return None
+            print(f"Construyendo índice de adyacencia desde {edges_path}...")
+            self.adjacency = build_label_csr(load_edge_arrays(edges_path))
+        return self.adjacency
+
+    def predict_path_count(self, pattern, node_id):
+        """
+        Predice localmente el número de caminos de una consulta concreta (cota superior de los
+        trails). Devuelve None si la plantilla o el nodo no se pueden evaluar, o si la expresión
+        tiene cuantificadores no acotados (*, +, {m,}): el conteo se truncaría a UNBOUNDED_HOPS
+        saltos y no sería una cota superior.
+        """
+        ast = template_path_ast(pattern)
+        if ast is None or not ast_is_bounded(ast):
+            return None
+        
+        adjacency = self.get_adjacency()
+        if adjacency is None or node_id not in adjacency['node_index']:
+            return None
+        
+        return count_walks_from(adjacency, ast, adjacency['node_index'].get_loc(node_id))
+
+    def generate_fanout_mappings(self, output_file="nodos_fanout.json"):
+        """
+        Selecciona nodos iniciales por plantilla según su fan-out multi-salto, es decir, el número de
+        caminos que siguen la secuencia de etiquetas de la plantilla desde cada nodo
+        """
+        edges_path = os.path.join("MillenniumDB", "data", "ldbc", self.selected_scale, "edges.txt")
+        
+        if not os.path.exists(edges_path):
+            print(f"Advertencia: No se encontró el archivo {edges_path}.")
+            print("Se usará el ranking por grado de la etiqueta inicial.")
+            return
+        
+        print(f"\nCalculando fan-out multi-salto por plantilla desde {edges_path}...")
+        
+        try:
+            start_time = time.time()
+            adjacency = self.get_adjacency()
+            node_names = adjacency['nodes']
+            
+            self.template_node_mappings = {}
+            fanout_report = {}
+            skipped = 0
+            
+            for pattern in dict.fromkeys(self.query_patterns):
+                if "(x)=" not in pattern:
+                    continue
+                
+                ast = template_path_ast(pattern)
+                if ast is None:
+                    skipped += 1
+                    continue
+                
+                # Ranking de nodos iniciales por fan-out descendente (empates por primera aparición)
+                fanout = fanout_counts(adjacency, ast)
+                candidates = np.flatnonzero(fanout)
+                ranked_nodes = candidates[np.argsort(-fanout[candidates], kind='stable')]
+                ranked_fanout = fanout[ranked_nodes]
+                
+                selected_positions = []
+                taken_positions = set()
+                for mode in self.selection_modes:
+                    mode_positions = select_positions(ranked_fanout, mode, self.nodes_per_label,
+                                                      excluded=taken_positions)
+                    selected_positions.extend(mode_positions)
+                    taken_positions.update(mode_positions)
+                
+                if selected_positions:
+                    self.template_node_mappings[pattern] = [node_names[ranked_nodes[p]] for p in selected_positions]
+                    fanout_report[pattern] = [
+                        {"node_id": node_names[ranked_nodes[p]], "fanout": int(ranked_fanout[p]), "posicion": p + 1}
+                        for p in selected_positions
+                    ]
+            
+            with open(output_file, "w") as f:
+                json.dump(fanout_report, f, indent=2)
+            
+            print(f"Se seleccionaron nodos por fan-out para {len(self.template_node_mappings)} plantillas "
+                  f"en {time.time() - start_time:.2f} s (detalle en {output_file})")
+            if skipped > 0:
+                print(f"{skipped} plantillas no se pudieron parsear; usarán el ranking por grado")
+        
+        except Exception as e:
+            print(f"Error al calcular el fan-out multi-salto: {e}")
+            print("Se usará el ranking por grado de la etiqueta inicial.")
+            self.template_node_mappings = {}
+
     def load_patterns(self, patterns_file):
         """Carga los patrones de consulta desde un archivo o usa los predeterminados"""
         default_patterns = [
@@ -880,41 +2956,62 @@ class PathBenchmark:
     # FUNCIONES DE GENERACIÓN DE CONSULTAS
     #################################################
     
+    def register_query(self, query_info, canonical_queries, query, entry):
+        """
+        Registra una consulta real en query_info. Si ya existe una consulta equivalente (misma forma
+        canónica) se anota como alias de la representante y devuelve False: no debe ejecutarse de nuevo.
+        """
+        key = canonical_query(query)
+        representative = canonical_queries.get(key)
+        if representative is None:
+            canonical_queries[key] = query
+            query_info[query] = entry
+            return True
+        
+        alias = dict(entry, query=query)
+        stored = query_info[representative]
+        same_origin = (stored["original"] == entry["original"] and
+                       stored["abstract_pattern"] == entry["abstract_pattern"] and query == representative)
+        aliases = stored.setdefault("aliases", [])
+        if not same_origin and alias not in aliases:
+            aliases.append(alias)
+        return False
+
     def generate_query_script(self, script_path="runTRAIL_query_script.sh"):
         """
-        Genera dinámicamente el script bash con las consultas,
-        reemplazando los identificadores de nodos según la etiqueta inicial
+        Genera dinámicamente la lista de consultas a ejecutar, reemplazando los identificadores
+        de nodos según la etiqueta inicial. El script bash equivalente solo se escribe si se
+        pidió exportarlo (export_script); devuelve (ruta del script o None, número de consultas).
         """
         print("\nGenerando script de consultas para el factor de escala", self.selected_scale)
         
         # Asignar consultas a patrones abstractos según la distribución especificada
         self.map_queries_to_patterns()
         
-        # Crear contenido del script bash
-        script_content = """#!/bin/bash
-
-    # URL del endpoint
-    BASE_URL="http://localhost:1234/query"
-
-    # Lista de consultas a ejecutar
-    PATTERNS=(
-    """
+        # Consultas a ejecutar, en orden
+        queries = []
         
         # Procesar cada patrón de consulta
         count = 0
         skipped = 0
+        duplicates = 0
         
         # Guardamos información sobre las consultas para usarla después
         query_info = {}
+        pruned_queries = {}
+        # Forma canónica -> consulta representante (cada consulta distinta se ejecuta una sola vez)
+        canonical_queries = {}
         
-        for pattern in self.query_patterns:
+        for pattern, abstract_pattern in self.template_assignments:
             # Verificar si el patrón ya contiene un ID de nodo específico en lugar de 'x'
             if not "(x)=" in pattern:
                 # El patrón ya tiene un ID de nodo, añadirlo tal cual
-                script_content += f'"{pattern}"\n'
-                abstract_pattern = self.query_to_pattern.get(pattern, "Desconocido")
-                query_info[pattern] = {"original": pattern, "abstract_pattern": abstract_pattern}
-                count += 1
+                entry = {"original": pattern, "abstract_pattern": abstract_pattern}
+                if self.register_query(query_info, canonical_queries, pattern, entry):
+                    queries.append(pattern)
+                    count += 1
+                else:
+                    duplicates += 1
                 continue
                 
             # Extraer la etiqueta inicial usando múltiples patrones
@@ -928,28 +3025,43 @@ class PathBenchmark:
                 if '?' in initial_label:
                     initial_label = initial_label.replace('?', '')
                     
-                # Verificar si tenemos un mapeo para esta etiqueta
-                if initial_label in self.node_mappings:
-                    # Obtener la lista de nodos para esta etiqueta
-                    node_ids = self.node_mappings[initial_label]
-                    
+                # Verificar si tenemos nodos para esta plantilla (fan-out) o un mapeo para esta etiqueta
+                node_ids = self.template_node_mappings.get(pattern)
+                if node_ids is None:
+                    node_ids = self.get_label_node_pool(pattern, initial_label)
+                
+                if node_ids is not None:
                     # Crear una consulta para cada nodo
                     for node_id in node_ids:
                         # Reemplazar 'x' con el ID de nodo correspondiente
                         query = pattern.replace("(x)=", f"({node_id})=")
                         
-                        # Obtener a qué patrón abstracto pertenece esta consulta
-                        abstract_pattern = self.query_to_pattern.get(pattern, "Desconocido")
+                        # Omitir las consultas que el oráculo local demuestra vacías
+                        predicted_paths = self.predict_path_count(pattern, node_id) if self.prune_empty else None
+                        if predicted_paths == 0:
+                            pruned_queries[query] = {
+                                "original": pattern,
+                                "abstract_pattern": abstract_pattern,
+                                "node_id": node_id,
+                                "predicted_paths": 0
+                            }
+                            continue
                         
-                        # Añadir la consulta al script
-                        script_content += f'"{query}"\n'
-                        query_info[query] = {
+                        entry = {
                             "original": pattern, 
                             "abstract_pattern": abstract_pattern,
                             "node_id": node_id,
                             "label": initial_label
                         }
-                        count += 1
+                        if predicted_paths is not None:
+                            entry["predicted_paths"] = predicted_paths
+                        
+                        # Añadir la consulta solo si no hay ya una equivalente
+                        if self.register_query(query_info, canonical_queries, query, entry):
+                            queries.append(query)
+                            count += 1
+                        else:
+                            duplicates += 1
                 else:
                     print(f"Advertencia: No se encontró mapeo para la etiqueta '{initial_label}'")
                     skipped += 1
@@ -957,127 +3069,111 @@ class PathBenchmark:
                 print(f"Advertencia: No se pudo extraer etiqueta inicial de: {pattern}")
                 skipped += 1
         
-        # Finalizar el script
+        self.generated_queries = queries
+        self.query_info = query_info
+        if self.export_script:
+            self.write_query_script(queries, script_path)
+        else:
+            script_path = None
+        
+        # Guardar información de las consultas para usarla después
+        with open("query_info.json", "w") as f:
+            json.dump(query_info, f, indent=2)
+        
+        if pruned_queries:
+            with open("consultas_podadas.json", "w") as f:
+                json.dump(pruned_queries, f, indent=2)
+            print(f"Se omitieron {len(pruned_queries)} consultas con 0 caminos según el oráculo local (consultas_podadas.json)")
+        
+        print(f"Se generaron {count} consultas para ejecutar")
+        if script_path:
+            print(f"Script bash exportado en '{script_path}'")
+        if duplicates > 0:
+            print(f"Se reutilizaron {duplicates} consultas equivalentes a otras ya incluidas (se ejecutan una sola vez)")
+        if skipped > 0:
+            print(f"Se omitieron {skipped} consultas porque no se pudo determinar la etiqueta inicial o no tenían mapeo")
+        
+        return script_path, count
+
+    def write_query_script(self, queries, script_path):
+        """Exporta las consultas como script bash con curl (opcional; la ejecución se hace en proceso)"""
+        script_content = f"""#!/bin/bash
+
+    # URL del endpoint
+    BASE_URL="{QUERY_ENDPOINT}"
+
+    # Lista de consultas a ejecutar
+    PATTERNS=(
+    """
+        script_content += "".join(f'"{query}"\n' for query in queries)
         script_content += """)
 
     # Ejecutar las consultas
     for PATTERN in "${PATTERNS[@]}"; do
-        # Ejecutar la consulta
         RESPONSE=$(curl -s -X POST "$BASE_URL" -d "$PATTERN")
-        
-        # Imprimir la consulta que se está ejecutando (opcional, para depuración)
         echo "Ejecutando: $PATTERN"
-        
-        # Esperar un segundo entre consultas para no sobrecargar el servidor
     done
 
-    # Confirmar que todas las consultas se completaron
     echo "Todas las consultas se ejecutaron correctamente."
     """
         
-        # Guardar el script en un archivo
         with open(script_path, "w") as f:
             f.write(script_content)
         
         # Hacer el script ejecutable
         os.chmod(script_path, 0o755)
-        
-        # Guardar información de las consultas para usarla después
-        with open("query_info.json", "w") as f:
-            json.dump(query_info, f, indent=2)
-        
-        print(f"Se generó el script con {count} consultas en '{script_path}'")
-        if skipped > 0:
-            print(f"Se omitieron {skipped} consultas porque no se pudo determinar la etiqueta inicial o no tenían mapeo")
-        
-        return script_path, count
+        return script_path
 
     #IMPORTANTE
+    def extract_initial_labels(self, pattern):
+        """
+        Devuelve todas las etiquetas por las que puede empezar un camino del patrón (en orden de
+        aparición), a partir del AST de la expresión. Por ejemplo, para ((:likes|:knows)|:isLocatedIn)
+        devuelve ['likes', 'knows', 'isLocatedIn'].
+        """
+        ast = template_path_ast(pattern)
+        if ast is None:
+            return []
+        return first_labels(ast)
+
     def extract_initial_label(self, pattern):
         """
         Extrae la etiqueta inicial de un patrón de consulta, manejando todos los tipos de patrones,
         incluyendo patrones complejos con operadores alternativa (|), cuantificadores y paréntesis anidados.
+        Si hay varias etiquetas iniciales posibles se devuelve la primera en aparecer.
         """
-        # Caso 1: Patrones con etiqueta directa simple: (:etiqueta)
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 (:hasCreator)]=>(?y) RETURN ?p1
-        simple_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(?:([a-zA-Z0-9_]+)', pattern)
-        if simple_match:
-            return simple_match.group(1)
-        
-        # Caso 2: Patrones de camino simple: (:etiqueta1/:etiqueta2)
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 (:hasCreator/:isLocatedIn)]=>(?y) RETURN ?p1
-        path_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(?:([a-zA-Z0-9_]+)/', pattern)
-        if path_match:
-            return path_match.group(1)
-        
-        # Caso 3: Patrones con cuantificadores: (:etiqueta{0,4})
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 (:knows{1,4})]=>(?y) RETURN ?p1
-        quant_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(?:([a-zA-Z0-9_]+)\{', pattern)
-        if quant_match:
-            return quant_match.group(1)
-        
-        # Caso 4: Patrones con paréntesis dobles y alternativa: ((:etiqueta1|:etiqueta2))
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 ((:hasCreator|:isLocatedIn))]=>(?y) RETURN ?p1
-        alt_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(\(:([a-zA-Z0-9_]+)\|', pattern)
-        if alt_match:
-            return alt_match.group(1)
-        
-        # Caso 5: Patrones con operador de opción (?) después de un término
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 ((:containerOf/:hasTag)?)]=>(?y) RETURN ?p1
-        opt_path_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(\((:?[a-zA-Z0-9_]+)/(:?[a-zA-Z0-9_]+)\)\?\)', pattern)
-        if opt_path_match:
-            # Eliminar los dos puntos si existen
-            label = opt_path_match.group(1)
-            if label.startswith(':'):
-                label = label[1:]
-            return label
-        
-        # Caso 6: Patrones con signo de interrogación en la relación
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 (:hasCreator?)]=>(?y) RETURN ?p1
-        opt_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(:([a-zA-Z0-9_]+)\?\)', pattern)
-        if opt_match:
-            return opt_match.group(1)
-        
-        # Caso 7: Patrones con paréntesis y opción: ((:etiqueta)?)
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 ((:hasCreator?))]=>(?y) RETURN ?p1
-        paren_opt_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(\(:([a-zA-Z0-9_]+)\?\)\)', pattern)
-        if paren_opt_match:
-            return paren_opt_match.group(1)
-        
-        # Caso 8: Patrones con alternativa y dobles paréntesis: (:etiqueta1|(:etiqueta2))
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 (:isLocatedIn|(:hasInterest/:hasType))]=>(?y) RETURN ?p1
-        complex_alt_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(:([a-zA-Z0-9_]+)\|', pattern)
-        if complex_alt_match:
-            return complex_alt_match.group(1)
-        
-        # Caso 9: Patrones con grupo repetido: ((:etiqueta1/:etiqueta2){1,4})
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 ((:likes/:hasCreator){1,4})]=>(?y) RETURN ?p1
-        group_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(\(:([a-zA-Z0-9_]+)/', pattern)
-        if group_match:
-            return group_match.group(1)
-        
-        # Caso 10: Patrones con relación alternativa entre paréntesis: ((:etiqueta1|:etiqueta2)?)
-        # Ejemplo: MATCH (x)=[ALL TRAILS ?p1 ((:hasCreator|:isLocatedIn)?)]=>(?y) RETURN ?p1
-        opt_alt_match = re.search(r'\([a-z0-9]+\)=\[ALL TRAILS \?p1\s+\(\(:[a-zA-Z0-9_]+\|:([a-zA-Z0-9_]+)\)\?\)', pattern)
-        if opt_alt_match:
-            # En este caso vamos a tomar la segunda etiqueta
-            return opt_alt_match.group(1)
-        
-        # Caso 11: Si todo lo anterior falla, intentar buscar cualquier etiqueta después de dos puntos
+        labels = self.extract_initial_labels(pattern)
+        if labels:
+            return labels[0]
+        
+        # Si el patrón no se pudo parsear, buscar cualquier etiqueta después de dos puntos
         any_label_match = re.search(r':[a-zA-Z0-9_]+', pattern)
         if any_label_match:
-            # Eliminar los dos puntos
             return any_label_match.group(0)[1:]
         
         # Si no encontramos ninguna etiqueta, retornar None
-        return None   
+        return None
+
+    def get_label_node_pool(self, pattern, initial_label):
+        """
+        Nodos candidatos para una plantilla según los mapeos por etiqueta. Con label_pool 'union'
+        se intercalan los nodos de todas las etiquetas iniciales posibles de la plantilla.
+        """
+        if self.label_pool == "union":
+            pools = [self.node_mappings[label] for label in self.extract_initial_labels(pattern)
+                     if label in self.node_mappings]
+            if pools:
+                return list(dict.fromkeys(node for group in zip_longest(*pools) for node in group
+                                          if node is not None))
+        return self.node_mappings.get(initial_label)
+
     #################################################
     # FUNCIONES DEL SERVIDOR Y CONSULTAS
     #################################################
     
-    def start_mdb_server(self):
+    def start_mdb_server(self, force=False, log_file="result.txt", append=False):
         # NUEVA LÓGICA: Solo saltar si usamos resultados existentes Y el archivo existe
-        if self.use_existing_results:
+        if self.use_existing_results and not force:
             if os.path.exists(self.result_file):
                 print(f"📁 Usando archivo de resultados existente: {self.result_file}")
                 print("🚫 No se iniciará el servidor MillenniumDB.")
@@ -1099,38 +3195,310 @@ class PathBenchmark:
         
         if not os.path.exists(db_path):
             print(f"❌ Error: La base de datos '{db_path}' no existe.")
-            input("\nPresione Enter para salir...")
-            sys.exit(1)
+            raise RuntimeError(f"La base de datos '{db_path}' no existe")
             
         print(f"🚀 Iniciando servidor MillenniumDB con base de datos: {db_path}...")
+        server_bin = os.path.join("MillenniumDB", "build", "Release", "bin", "mdb-server")
         try:
-            with open("result.txt", "w") as output_file:
-                server_bin = os.path.join("MillenniumDB", "build", "Release", "bin", "mdb-server")
+            self.server_log = log_file
+            with open(log_file, "a" if append else "w") as output_file:
+                launched = time.perf_counter()
                 self.server_process = subprocess.Popen(
                     [server_bin, db_path, "--timeout", "35000"],
                     stdout=output_file,
                     stderr=output_file
                 )
-            print(f"✅ MillenniumDB iniciado!!")
-            print(f"📝 La salida del servidor se está guardando en result.txt")
-            
-            print("⏳ Esperando a que el servidor se inicialice...")
-            time.sleep(5)
-            
-            if self.server_process.poll() is not None:
-                exit_code = self.server_process.poll()
-                print(f"❌ Error: El servidor MillenniumDB se cerró con código {exit_code}.")
-                print("📄 Revise result.txt para más detalles.")
-                input("\nPresione Enter para salir...")
-                sys.exit(1)
-            
-            print("🟢 Servidor MillenniumDB listo para recibir consultas")
-            
         except Exception as e:
             print(f"❌ Error al iniciar el servidor MillenniumDB: {e}")
-            input("\nPresione Enter para salir...")
-            sys.exit(1)
+            raise RuntimeError(f"No se pudo iniciar el servidor MillenniumDB: {e}") from e
+        
+        print(f"✅ MillenniumDB iniciado!!")
+        print(f"📝 La salida del servidor se está guardando en {log_file}")
+        
+        print(f"⏳ Esperando a que el servidor responda (plazo {self.server_ready_timeout:g} s)...")
+        ready_s = wait_for_server(deadline=self.server_ready_timeout, process=self.server_process, started=launched)
+        
+        if self.server_process.poll() is not None:
+            exit_code = self.server_process.poll()
+            print(f"❌ Error: El servidor MillenniumDB se cerró con código {exit_code}.")
+            print(f"📄 Revise {log_file} para más detalles.")
+            raise RuntimeError(f"El servidor MillenniumDB se cerró con código {exit_code}")
+        
+        if ready_s is None:
+            print(f"❌ Error: El servidor MillenniumDB no respondió en {self.server_ready_timeout:g} s.")
+            self.stop_mdb_server()
+            raise RuntimeError(f"El servidor MillenniumDB no respondió en {self.server_ready_timeout:g} s")
+        
+        # Tiempo hasta estar listo (arranque + apertura de la base de datos) como métrica propia
+        self.server_ready_s = ready_s
+        record_server_startup(SERVER_STARTUP_LOG, db_path, server_bin, ready_s)
+        print(f"🟢 Servidor MillenniumDB listo para recibir consultas en {ready_s:.2f} s")
+
+
+    def concurrency_pool_from_queries(self, queries, query_info):
+        """Pares (consulta, Q Number) de las consultas generadas, para el barrido de concurrencia"""
+        pool_queries = []
+        for query in queries:
+            abstract_pattern = query_info.get(query, {}).get("abstract_pattern", "Desconocido")
+            q_number = self.pattern_to_q_number.get(abstract_pattern)
+            pool_queries.append((query, f"Q{q_number}" if q_number else abstract_pattern))
+        return pool_queries
+
+    def run_concurrency_sweep(self, pool_queries, output_folder):
+        """
+        Barrido de concurrencia en ciclo cerrado sobre pares (consulta, Q Number). Para el pool completo
+        y para cada Q Number por separado mide throughput y percentiles de latencia con cada número de
+        clientes, y reporta el nivel de saturación (rodilla del throughput) en barrido_concurrencia.xlsx.
+        """
+        import pandas as pd
+        
+        levels = self.concurrency_levels
+        groups = {"Todos": [query for query, _ in pool_queries]}
+        for query, q_label in pool_queries:
+            groups.setdefault(q_label, []).append(query)
+        
+        print(f"\n📈 Barrido de concurrencia: clientes {levels}, {self.sweep_duration} s por nivel y grupo")
+        level_rows = []
+        saturation_rows = []
+        self.query_pool = QueryConnectionPool()
+        try:
+            for q_label, queries in groups.items():
+                throughputs = []
+                for clients in levels:
+                    records, elapsed = run_closed_loop(self.query_pool, queries, clients, self.sweep_duration)
+                    latencies = [record["latency_ms"] for record in records if record["status"] == 200]
+                    throughput = len(latencies) / elapsed if elapsed > 0 else 0.0
+                    throughputs.append(throughput)
+                    
+                    row = {
+                        'Q Number': q_label,
+                        'Clientes': clients,
+                        'Consultas': len(records),
+                        'Errores': len(records) - len(latencies),
+                        'Throughput (ops/s)': throughput
+                    }
+                    row.update(latency_percentiles(latencies))
+                    level_rows.append(row)
+                    print(f"   {q_label:>8} | {clients:>3} clientes | {throughput:10.2f} ops/s | "
+                          f"p50 {row['p50 (ms)']:.2f} ms | p99 {row['p99 (ms)']:.2f} ms")
+                
+                knee = saturation_level(levels, throughputs)
+                best = int(np.argmax(throughputs))
+                saturation_rows.append({
+                    'Q Number': q_label,
+                    'Clientes Saturación': knee if knee is not None else f"> {levels[-1]}",
+                    'Throughput Saturación (ops/s)': throughputs[levels.index(knee)] if knee is not None else None,
+                    'Clientes Throughput Máximo': levels[best],
+                    'Throughput Máximo (ops/s)': throughputs[best]
+                })
+        finally:
+            self.query_pool.close()
+            self.query_pool = None
+        
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+        sweep_path = os.path.join(output_folder, "barrido_concurrencia.xlsx")
+        export_workbook(sweep_path, [excel_sheet('Niveles', pd.DataFrame(level_rows)),
+                                     excel_sheet('Saturación', pd.DataFrame(saturation_rows))])
+        
+        print("\n🔎 Punto de saturación por Q Number:")
+        for row in saturation_rows:
+            print(f"   {row['Q Number']:>8}: {row['Clientes Saturación']} clientes "
+                  f"(máximo {row['Throughput Máximo (ops/s)']:.2f} ops/s con {row['Clientes Throughput Máximo']})")
+        print(f"💾 Barrido guardado en {sweep_path}")
+        return {'levels': level_rows, 'saturation': saturation_rows}
+
+    def run_open_loop_load(self, pool_queries, output_folder):
+        """
+        Carga en lazo abierto sobre pares (consulta, Q Number): para cada tasa objetivo se envía el pool
+        con llegadas de Poisson (o constantes) y se reportan, por Q Number, los percentiles de latencia
+        medidos desde el instante previsto de envío. Resultados en carga_lazo_abierto.xlsx.
+        """
+        import pandas as pd
+        
+        queries = [query for query, _ in pool_queries]
+        q_labels = dict(pool_queries)
+        
+        print(f"\n🌊 Carga en lazo abierto ({self.arrival}): tasas {self.arrival_rates} consultas/s, "
+              f"{self.sweep_duration} s por tasa")
+        rows = []
+        self.query_pool = QueryConnectionPool()
+        try:
+            for rate in self.arrival_rates:
+                records, elapsed = run_open_loop(self.query_pool, queries, rate, self.sweep_duration, self.arrival)
+                groups = {"Todos": records}
+                for record in records:
+                    groups.setdefault(q_labels[record["query"]], []).append(record)
+                
+                rate_rows = []
+                for q_label, q_records in groups.items():
+                    latencies = [record["scheduled_latency_ms"] for record in q_records if record["status"] == 200]
+                    service = [record["latency_ms"] for record in q_records if record["status"] == 200]
+                    row = {
+                        'Tasa Objetivo (q/s)': rate,
+                        'Q Number': q_label,
+                        'Consultas': len(q_records),
+                        'Errores': len(q_records) - len(latencies),
+                        'Tasa Completada (q/s)': len(latencies) / elapsed if elapsed > 0 else 0.0
+                    }
+                    row.update(latency_percentiles(latencies))
+                    row['p99 Servicio (ms)'] = latency_percentiles(service, (99,))['p99 (ms)']
+                    rate_rows.append(row)
+                rows.extend(rate_rows)
+                
+                overall = rate_rows[0]
+                print(f"   {rate:>10.2f} q/s | {overall['Consultas']} consultas | p50 {overall['p50 (ms)']:.2f} ms | "
+                      f"p99 {overall['p99 (ms)']:.2f} ms (servicio p99 {overall['p99 Servicio (ms)']:.2f} ms)")
+        finally:
+            self.query_pool.close()
+            self.query_pool = None
+        
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+        load_path = os.path.join(output_folder, "carga_lazo_abierto.xlsx")
+        export_workbook(load_path, [excel_sheet('Latencias', pd.DataFrame(rows))])
+        print(f"💾 Carga en lazo abierto guardada en {load_path}")
+        return {'latencies': rows}
+
+    def restart_server_for_load(self):
+        """
+        Reinicia mdb-server escribiendo en LOAD_TEST_LOG, para que las pruebas de carga no se mezclen
+        con las ejecuciones medidas de result.txt. Se conserva el tiempo de arranque principal.
+        """
+        main_ready_s = self.server_ready_s
+        self.stop_mdb_server()
+        self.start_mdb_server(force=True, log_file=LOAD_TEST_LOG)
+        self.server_ready_s = main_ready_s
+
+    def stop_mdb_server(self):
+        """Termina el servidor MillenniumDB si está activo"""
+        if self.server_process and self.server_process.poll() is None:
+            print("Terminando el servidor MillenniumDB...")
+            self.server_process.terminate()
+            try:
+                self.server_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.server_process.kill()
+            print("Servidor MillenniumDB terminado.")
+
+    def prefetch_database(self):
+        """Modo caliente: precarga los archivos de la base de datos en la caché de páginas del SO"""
+        print(f"\n🔥 Precargando {self.db_path} en la caché de páginas...")
+        started = time.perf_counter()
+        files, total_bytes = prefetch_page_cache(self.db_path)
+        print(f"✅ {files} archivos ({total_bytes / 1024 ** 2:.1f} MB) precargados en "
+              f"{time.perf_counter() - started:.2f} s")
+
+    def run_cold_cache_pass(self, queries):
+        """
+        Modo frío: reinicia mdb-server antes de cada consulta (o de cada plantilla) tras expulsar la
+        base de datos de la caché de páginas, y mide cada consulta una vez. El servidor escribe en
+        COLD_CACHE_LOG; al terminar queda detenido y el tiempo de arranque principal se conserva.
+        """
+        if self.cold_restart == "template":
+            groups = {}
+            for query in queries:
+                groups.setdefault(self.query_info.get(query, {}).get("original", query), []).append(query)
+            groups = list(groups.values())
+        else:
+            groups = [[query] for query in queries]
+        
+        print(f"\n🧊 Pasada en frío: {len(queries)} consultas con {len(groups)} reinicios del servidor "
+              f"(uno por {'plantilla' if self.cold_restart == 'template' else 'consulta'})...")
+        if not hasattr(os, "posix_fadvise"):
+            print("⚠️  posix_fadvise no disponible: solo se reinicia el servidor, sin expulsar la caché del SO")
+        
+        main_ready_s = self.server_ready_s
+        timings = []
+        progress_bar_length = 40
+        self.print_progress_bar(0, len(queries), progress_bar_length)
+        try:
+            for restart, group in enumerate(groups):
+                # Silenciar los mensajes de parada/arranque: se repiten en cada reinicio
+                with contextlib.redirect_stdout(io.StringIO()):
+                    self.stop_mdb_server()
+                    evict_page_cache(self.db_path)
+                    self.start_mdb_server(force=True, log_file=COLD_CACHE_LOG, append=restart > 0)
+                
+                pool = QueryConnectionPool()
+                try:
+                    for position, query in enumerate(group):
+                        record = post_query(pool, query)
+                        record["restart"] = restart
+                        record["position"] = position
+                        record["server_ready_s"] = self.server_ready_s
+                        timings.append(record)
+                finally:
+                    pool.close()
+                self.print_progress_bar(len(timings), len(queries), progress_bar_length)
+        finally:
+            self.stop_mdb_server()
+            self.server_ready_s = main_ready_s
+        
+        failed = sum(1 for record in timings if record["status"] != 200)
+        print(f"\n✅ Pasada en frío completada. Log del servidor en {COLD_CACHE_LOG}")
+        if failed > 0:
+            print(f"⚠️  {failed} consultas en frío fallaron o no devolvieron HTTP 200")
+        return timings
 
+    def export_cache_comparison(self, cold_timings, output_folder):
+        """
+        Latencia en frío y en caliente lado a lado por consulta (y media por plantilla) en
+        cache_frio_vs_caliente.xlsx. En el servidor se compara el tiempo total del log (parser +
+        optimizador + ejecución); en el cliente, la latencia HTTP de las ejecuciones medidas.
+        """
+        import pandas as pd
+        
+        cold_log, _ = aggregate_log_file(COLD_CACHE_LOG) if os.path.exists(COLD_CACHE_LOG) else ({}, 0)
+        cold_server = {query: sum(columns[key][0] for key in _EXECUTION_FIELDS)
+                       for query, columns in cold_log.items() if columns["results"]}
+        cold_client = {}
+        cold_position = {}
+        for record in cold_timings:
+            if record["status"] == 200:
+                cold_client.setdefault(record["query"], record["latency_ms"])
+                cold_position.setdefault(record["query"], record["position"])
+        
+        warm_latencies = defaultdict(list)
+        for record in self.client_timings or ():
+            if record["status"] == 200 and not record.get("warmup"):
+                warm_latencies[record["query"]].append(record["latency_ms"])
+        warm_client = {query: statistics.fmean(latencies) for query, latencies in warm_latencies.items()}
+        
+        # Los alias comparten la medición de la consulta equivalente que se ejecutó
+        executed_of = {alias["query"]: query for query, info in self.query_info.items()
+                       for alias in info.get("aliases", ())}
+        frame = self.query_summary[['Consulta', 'Patrón Abstracto', 'Consulta Plantilla', 'Q Number']].copy()
+        executed = frame['Consulta'].map(lambda query: executed_of.get(query, query))
+        frame['Servidor Caliente (ms)'] = self.query_summary['Tiempo Ejecución (ms)']
+        frame['Servidor Frío (ms)'] = executed.map(cold_server)
+        frame['Frío/Caliente Servidor'] = frame['Servidor Frío (ms)'] / frame['Servidor Caliente (ms)'].where(
+            frame['Servidor Caliente (ms)'] > 0)
+        frame['Cliente Caliente (ms)'] = executed.map(warm_client)
+        frame['Cliente Frío (ms)'] = executed.map(cold_client)
+        frame['Frío/Caliente Cliente'] = frame['Cliente Frío (ms)'] / frame['Cliente Caliente (ms)'].where(
+            frame['Cliente Caliente (ms)'] > 0)
+        if self.cold_restart == "template":
+            frame['Orden tras Reinicio'] = executed.map(cold_position)
+        
+        latency_columns = ['Servidor Caliente (ms)', 'Servidor Frío (ms)', 'Cliente Caliente (ms)', 'Cliente Frío (ms)']
+        templates = frame.groupby(['Patrón Abstracto', 'Consulta Plantilla'], sort=False)[latency_columns].mean()
+        templates['Frío/Caliente Servidor'] = templates['Servidor Frío (ms)'] / templates['Servidor Caliente (ms)'].where(
+            templates['Servidor Caliente (ms)'] > 0)
+        
+        cold_columns = ["query", "restart", "position", "server_ready_s", "latency_ms", "status", "bytes", "error"]
+        comparison_path = os.path.join(output_folder, "cache_frio_vs_caliente.xlsx")
+        export_workbook(comparison_path, [
+            excel_sheet('Consultas', frame),
+            excel_sheet('Plantillas', templates.reset_index()),
+            excel_sheet('Ejecuciones en Frío', pd.DataFrame(cold_timings, columns=cold_columns))
+        ])
+        
+        ratios = frame['Frío/Caliente Servidor'].dropna()
+        if len(ratios):
+            print(f"🧊 Frío vs caliente (servidor): mediana x{ratios.median():.2f}, máximo x{ratios.max():.2f}")
+        print(f"💾 Comparación frío/caliente guardada en {comparison_path}")
+        return {'queries': frame, 'templates': templates.reset_index()}
 
     def run_queries_with_progress(self, timeout=35000):
         # NUEVA SECCIÓN AL INICIO
@@ -1148,57 +3516,11 @@ class PathBenchmark:
             print("No se generaron consultas para ejecutar.")
             return
         
-        try:
-            print(f"\nEjecutando {total_queries} consultas al servidor...")
-            print("Este proceso puede tardar")
-            
-            with open("queries_output.txt", "w") as output_file:
-                self.query_process = subprocess.Popen(
-                    [f"./{script_path}"],
-                    stdout=output_file,
-                    stderr=output_file,
-                    shell=True
-                )
-                
-                completed_queries = 0
-                last_count = 0
-                start_time = time.time()
-                
-                progress_bar_length = 40
-                self.print_progress_bar(0, total_queries, progress_bar_length)
-                
-                while self.query_process.poll() is None:
-                    elapsed_time = time.time() - start_time
-                    if elapsed_time > timeout:
-                        print(f"\nTimeout después de {timeout} segundos. Terminando ejecución...")
-                        self.query_process.terminate()
-                        break
-                    
-                    time.sleep(2)
-                    
-                    if os.path.exists("result.txt"):
-                        try:
-                            with open("result.txt", 'r', encoding='utf-8', errors='replace') as f:
-                                log_content = f.read()
-                            
-                            completed_queries = log_content.count("Query received:")
-                            
-                            if completed_queries > last_count:
-                                completed_queries = min(completed_queries, total_queries)
-                                self.print_progress_bar(completed_queries, total_queries, progress_bar_length)
-                                last_count = completed_queries
-                        except Exception as e:
-                            print(f"\nError al leer result.txt: {e}")
-                            time.sleep(1)
-                
-                self.print_progress_bar(total_queries, total_queries, progress_bar_length)
-                
-                print("\nConsultas completadas. Resultados guardados en queries_output.txt")
-                
-        except Exception as e:
-            print(f"Error al ejecutar las consultas: {e}")
+        self.execute_queries(self.generated_queries, timeout)
 
     def save_pool_from_rankings(self, pool_queries):
+        import pandas as pd
+        
         if not pool_queries:
             print("❌ No hay consultas en el pool para guardar")
             return
@@ -1214,7 +3536,7 @@ class PathBenchmark:
         df_clean = df[columns_to_keep]
         
         excel_path = os.path.join(output_folder, "pool_final_from_rankings.xlsx")
-        df_clean.to_excel(excel_path, index=False)
+        export_workbook(excel_path, [excel_sheet('Sheet1', df_clean)])
         
         txt_path = os.path.join(output_folder, "pool_final_from_rankings.txt")
         with open(txt_path, 'w', encoding='utf-8') as f:
@@ -1262,538 +3584,215 @@ class PathBenchmark:
                         
             if not os.path.exists(output_folder):
                 os.makedirs(output_folder)
-                print(f"Se ha creado la carpeta: {output_folder}")
-            
-            output_excel_path = os.path.join(output_folder, output_excel_name)
-                
-            with open(result_file_to_use, 'r', encoding='utf-8', errors='replace') as f:
-                log_content = f.read()
-            
-            query_groups = {}
-
-            # Dividir el contenido en líneas para procesar secuencialmente
-            lines = log_content.split('\n')
-            current_query = None
-            current_results = None
-            current_parser_time = None
-            current_optimizer_time = None
-            current_execution_time = None
-            query_count = 0
-
-            print(f"Procesando {len(lines)} líneas del log...")
-
-            i = 0
-            while i < len(lines):
-                line = lines[i].strip()
-                
-                # Detectar inicio de nueva consulta
-                if line == "Query received:":
-                    # Si tenemos una consulta anterior completa, procesarla
-                    if (current_query and current_results is not None and 
-                        current_parser_time is not None and current_optimizer_time is not None and current_execution_time is not None):
-                        query_count += 1
-                        # Calcular tiempo total como suma de los tres componentes
-                        total_time = current_parser_time + current_optimizer_time + current_execution_time
-                        
-                        # Obtener información adicional de query_info
-                        abstract_pattern = "Desconocido"
-                        template_query = "Desconocido"
-                        node_id = "Desconocido"
-                        q_number = None
-                        
-                        if current_query in query_info:
-                            abstract_pattern = query_info[current_query]["abstract_pattern"]
-                            if "original" in query_info[current_query]:
-                                template_query = query_info[current_query]["original"]
-                            if "node_id" in query_info[current_query]:
-                                node_id = query_info[current_query]["node_id"]
-                            
-                            if abstract_pattern in self.pattern_to_q_number:
-                                q_number = self.pattern_to_q_number[abstract_pattern]
-                        
-                        # Agregar o actualizar en query_groups
-                        if current_query not in query_groups:
-                            query_groups[current_query] = {
-                                'Consulta': current_query,
-                                'Patrón Abstracto': abstract_pattern,
-                                'Consulta Plantilla': template_query,
-                                'ID Nodo': node_id,
-                                'Número de Paths': current_results,
-                                'Q Number': q_number,
-                                'Tiempos': [total_time],
-                                'Ejecuciones': 1
-                            }
-                        else:
-                            query_groups[current_query]['Tiempos'].append(total_time)
-                            query_groups[current_query]['Ejecuciones'] += 1
-                    
-                    # Resetear para nueva consulta
-                    current_query = None
-                    current_results = None
-                    current_parser_time = None
-                    current_optimizer_time = None
-                    current_execution_time = None
-                    
-                    # Buscar la consulta MATCH en la siguiente línea
-                    if i + 1 < len(lines):
-                        next_line = lines[i + 1].strip()
-                        if next_line.startswith('MATCH'):
-                            current_query = next_line
-                
-                # Buscar "Results: X"
-                elif line.startswith("Results:"):
-                    results_match = re.search(r"Results:\s*(\d+)", line)
-                    if results_match:
-                        current_results = int(results_match.group(1))
-                
-                # Buscar "Parser duration: X.X ms"
-                elif line.startswith("Parser duration:"):
-                    parser_time_match = re.search(r"Parser duration:\s*([\d.]+)\s*ms", line)
-                    if parser_time_match:
-                        current_parser_time = float(parser_time_match.group(1))
-                
-                # Buscar "Optimizer duration: X.X ms"
-                elif line.startswith("Optimizer duration:"):
-                    optimizer_time_match = re.search(r"Optimizer duration:\s*([\d.]+)\s*ms", line)
-                    if optimizer_time_match:
-                        current_optimizer_time = float(optimizer_time_match.group(1))
-                
-                # Buscar "Execution duration: X.X ms"
-                elif line.startswith("Execution duration:"):
-                    exec_time_match = re.search(r"Execution duration:\s*([\d.]+)\s*ms", line)
-                    if exec_time_match:
-                        current_execution_time = float(exec_time_match.group(1))
-                
-                i += 1
-
-            # Procesar la última consulta si existe
-            if (current_query and current_results is not None and 
-                current_parser_time is not None and current_optimizer_time is not None and current_execution_time is not None):
-                query_count += 1
-                # Calcular tiempo total como suma de los tres componentes
-                total_time = current_parser_time + current_optimizer_time + current_execution_time
-                
-                # Obtener información adicional de query_info
-                abstract_pattern = "Desconocido"
-                template_query = "Desconocido"
-                node_id = "Desconocido"
-                q_number = None
-                
-                if current_query in query_info:
-                    abstract_pattern = query_info[current_query]["abstract_pattern"]
-                    if "original" in query_info[current_query]:
-                        template_query = query_info[current_query]["original"]
-                    if "node_id" in query_info[current_query]:
-                        node_id = query_info[current_query]["node_id"]
-                    
-                    if abstract_pattern in self.pattern_to_q_number:
-                        q_number = self.pattern_to_q_number[abstract_pattern]
-                
-                # Agregar o actualizar en query_groups
-                if current_query not in query_groups:
-                    query_groups[current_query] = {
-                        'Consulta': current_query,
-                        'Patrón Abstracto': abstract_pattern,
-                        'Consulta Plantilla': template_query,
-                        'ID Nodo': node_id,
-                        'Número de Paths': current_results,
-                        'Q Number': q_number,
-                        'Tiempos': [total_time],
-                        'Ejecuciones': 1
-                    }
-                else:
-                    query_groups[current_query]['Tiempos'].append(total_time)
-                    query_groups[current_query]['Ejecuciones'] += 1
-
-            print(f"\nProcesadas {len(query_groups)} consultas únicas de {query_count} consultas totales")
-
-            # CREAR LA VARIABLE DATA
-            data = []
-            for query, group in query_groups.items():
-                # Verificar que existe 'Tiempos' y filtrar valores None
-                if 'Tiempos' not in group or not group['Tiempos']:
-                    # Si no hay tiempos, usar valores por defecto
-                    group['Tiempo Ejecución (ms)'] = 0.0
-                    group['Desviación Estándar (ms)'] = 0.0
-                    print(f"Advertencia: Consulta sin tiempos: {query[:50]}...")
-                else:
-                    # Filtrar valores None antes de calcular
-                    valid_times = [t for t in group['Tiempos'] if t is not None]
-                    
-                    if valid_times:
-                        group['Tiempo Ejecución (ms)'] = sum(valid_times) / len(valid_times)
-                        
-                        if len(valid_times) > 1:
-                            group['Desviación Estándar (ms)'] = statistics.stdev(valid_times)
-                        else:
-                            group['Desviación Estándar (ms)'] = 0.0
-                    else:
-                        # Si no hay tiempos válidos, usar valores por defecto
-                        group['Tiempo Ejecución (ms)'] = 0.0
-                        group['Desviación Estándar (ms)'] = 0.0
+                print(f"Se ha creado la carpeta: {output_folder}")
+            
+            output_excel_path = os.path.join(output_folder, output_excel_name)
                 
-                # Limpiar la clave 'Tiempos' si existe
-                if 'Tiempos' in group:
-                    del group['Tiempos']
+            store_path = os.path.join(output_folder, MEASUREMENT_STORE_NAME)
+            if result_file_to_use.endswith(".npz"):
+                # Almacén de una ejecución anterior: regenerar los informes sin releer el log
+                store = load_measurement_store(result_file_to_use)
+                query_count = len(store['query_id'])
+            else:
+                print(f"Procesando {os.path.getsize(result_file_to_use) / (1024 * 1024):.1f} MB del log...")
                 
-                data.append(group)
+                # Ejecuciones por consulta de cada bloque "Query received:" completo (por rangos en paralelo)
+                log_groups, query_count = aggregate_log_file(result_file_to_use, self.log_workers)
+                # El protocolo guardado al medir manda sobre --warmup: el log no distingue el calentamiento
+                protocol = load_measurement_protocol(result_file_to_use)
+                if protocol is None:
+                    store = build_measurement_store(log_groups, query_info, self.pattern_to_q_number, self.warmup)
+                else:
+                    if protocol["warmup"] != self.warmup:
+                        print(f"⚠️  Se usa el calentamiento registrado al medir ({protocol['warmup']}) "
+                              f"en lugar de --warmup {self.warmup}")
+                    print(f"📋 Protocolo de medición leído de {measurement_protocol_path(result_file_to_use)}")
+                    store = build_measurement_store(log_groups, query_info, self.pattern_to_q_number,
+                                                    protocol["warmup"], protocol["measured_runs"])
+                save_measurement_store(store_path, store)
+                print(f"💾 Mediciones por ejecución guardadas en {store_path}")
 
-            if not data:
+            print(f"\nProcesadas {len(store['query'])} consultas únicas de {query_count} consultas totales")
+            warmup_runs = int(store['warmup'].sum())
+            if warmup_runs:
+                print(f"🔥 {warmup_runs} ejecuciones de calentamiento excluidas de las estadísticas")
+
+            # Los Excel son una exportación del almacén de mediciones
+            df = query_summary_frame(store)
+
+            if df.empty:
                 print("No se encontraron resultados de consultas para analizar.")
                 return 0
             
-            df = pd.DataFrame(data)
-            
             if 'Tiempo Ejecución (ms)' in df.columns:
                 df.sort_values('Tiempo Ejecución (ms)', inplace=True)
             
+            # Estadísticas por patrón, plantilla y nodo calculadas una sola vez para todos los informes
+            stats = aggregate_query_statistics(df)
+            pattern_stats = stats['patterns']
+            
+            # Distribución por ejecución (percentiles e intervalos bootstrap) por consulta, plantilla y patrón
+            distribution_start = time.perf_counter()
+            distribution = latency_distribution_frames(store, self.bootstrap_resamples)
+            totals = (store['parser_ms'] + store['optimizer_ms'] + store['execution_ms'])[~store['warmup']]
+            self.latency_summary = latency_percentiles(totals, DISTRIBUTION_PERCENTILES)
+            self.latency_summary['Máximo (ms)'] = float(totals.max())
+            print(f"📊 Percentiles e intervalos bootstrap ({self.bootstrap_resamples} remuestreos) calculados en "
+                  f"{time.perf_counter() - distribution_start:.2f}s")
+            
+            # Criterio de orden de los rankings: promedio de paths, promedio de una fase o percentil de latencia
+            phase_labels = {key: label for _, label, key in QUERY_PHASES}
+            if self.rank_by == "paths":
+                rank_column = None
+            elif self.rank_by in phase_labels:
+                rank_column = f"{phase_labels[self.rank_by]} Promedio (ms)"
+                template_rank_values = stats['templates'][rank_column]
+                pattern_rank_values = pattern_stats[rank_column]
+            else:
+                rank_column = 'Máximo (ms)' if self.rank_by == "max" else f"{self.rank_by} (ms)"
+                template_rank_values = distribution['templates'].set_index(
+                    ['Patrón Abstracto', 'Consulta Plantilla'])[rank_column]
+                pattern_rank_values = distribution['patterns'].set_index('Patrón Abstracto')[rank_column]
+            
             # MODIFICACIÓN 1: Eliminar columnas de resultados_queries.xlsx
             columns_to_exclude_queries = ['ID Nodo', 'Ejecuciones', 'Desviación Estándar (ms)', 'Q Number']
             columns_to_keep_queries = [col for col in df.columns if col not in columns_to_exclude_queries]
             df_clean_queries = df[columns_to_keep_queries]
             
-            df_clean_queries.to_excel(output_excel_path, index=False)
-            print(f"Se guardaron {len(data)} consultas únicas en {output_excel_path}")
+            # Todos los libros se construyen en memoria como especificaciones y se escriben al final
+            workbooks = {output_excel_path: [excel_sheet('Sheet1', df_clean_queries)]}
             
-            pattern_excel_path = os.path.join(output_folder, "resultados_por_patron.xlsx")
-            with pd.ExcelWriter(pattern_excel_path, engine='xlsxwriter') as writer:
-                # MODIFICACIÓN 2: También aplicar limpieza a resultados_por_patron.xlsx
-                df_clean_queries.to_excel(writer, sheet_name='Todos', index=False)
-                
-                workbook = writer.book
-                bold_format = workbook.add_format({'bold': True})
-                num_format = workbook.add_format({'num_format': '0'})
-                bold_num_format = workbook.add_format({'bold': True, 'num_format': '0'})
-                
-                worksheet = writer.sheets['Todos']
-                num_rows = len(df_clean_queries) + 1
-                
-                paths_col_idx = None
-                time_col_idx = None
-                
-                for i, col in enumerate(df_clean_queries.columns):
-                    if col == 'Número de Paths':
-                        paths_col_idx = i
-                    elif col == 'Tiempo Ejecución (ms)':
-                        time_col_idx = i
-                
-                if paths_col_idx is not None:
-                    paths_avg = df['Número de Paths'].mean()
-                    worksheet.write(num_rows + 1, 0, "Promedio de Paths:", bold_format)
-                    worksheet.write(num_rows + 1, paths_col_idx, paths_avg, bold_num_format)
-                
-                if time_col_idx is not None:
-                    time_avg = df['Tiempo Ejecución (ms)'].mean()
-                    worksheet.write(num_rows + 2, 0, "Promedio de Tiempo (ms):", bold_format)
-                    worksheet.write(num_rows + 2, time_col_idx, time_avg, bold_num_format)
-                
-                patterns = df['Patrón Abstracto'].unique()
+            paths_col_idx = columns_to_keep_queries.index('Número de Paths')
+            time_col_idx = columns_to_keep_queries.index('Tiempo Ejecución (ms)')
+            
+            def averages_footer(paths_avg, time_avg):
+                return [(1, 0, "Promedio de Paths:", 'bold'), (1, paths_col_idx, paths_avg, 'bold_num'),
+                        (2, 0, "Promedio de Tiempo (ms):", 'bold'), (2, time_col_idx, time_avg, 'bold_num')]
+            
+            # MODIFICACIÓN 2: También aplicar limpieza a resultados_por_patron.xlsx
+            pattern_sheets = [excel_sheet('Todos', df_clean_queries, averages_footer(
+                df['Número de Paths'].mean(), df['Tiempo Ejecución (ms)'].mean()))]
+            
+            if not self.selective_queries:
+                print("\nModo estándar: procesando todos los patrones")
                 
-                pool_final_queries = []
+            for pattern, pattern_df in stats['rows'].items():
+                pattern_df = pattern_df.sort_values('Número de Paths', ascending=False)
                 
-                if self.selective_queries:
-                    n_abstract = self.selective_queries.get('n_abstract', len(patterns))
-                    n_templates = self.selective_queries.get('n_templates', 2)
-                    n_real = self.selective_queries.get('n_real', 2)
-                    if n_abstract == '*':
-                        n_abstract = len(patterns)
-                    
-                    #print(f"\nModo selectivo: Seleccionando top {n_abstract} abstract queries con mayor promedio de paths")
-                    #print(f"Para cada abstract query: {n_templates} plantillas, {n_real} consultas reales por plantilla")
-                    
-                    pattern_averages = []
-                    for pattern in patterns:
-                        pattern_df = df[df['Patrón Abstracto'] == pattern]
-                        non_zero_df = pattern_df[pattern_df['Número de Paths'] > 0]
-                        
-                        if len(non_zero_df) > 0:
-                            avg_paths = non_zero_df['Número de Paths'].mean()
-                            q_number = None
-                            if pattern in self.pattern_to_q_number:
-                                q_number = self.pattern_to_q_number[pattern]
-                            
-                            pattern_averages.append({
-                                'pattern': pattern,
-                                'avg_paths': avg_paths,
-                                'q_number': q_number,
-                                'df': non_zero_df
-                            })
-                    
-                    pattern_averages.sort(key=lambda x: x['avg_paths'], reverse=True)
-                    
-                    selected_patterns = pattern_averages[:n_abstract]
-                    
-                    for item in selected_patterns:
-                        pattern = item['pattern']
-                        pattern_df = item['df']
-                        q_number = item['q_number']
-                        
-                        template_groups = {}
-                        for _, row in pattern_df.iterrows():
-                            template = row['Consulta Plantilla']
-                            if template not in template_groups:
-                                template_groups[template] = []
-                            template_groups[template].append(row)
-                        
-                        sorted_templates = []
-                        for template, rows in template_groups.items():
-                            avg_paths = sum(row['Número de Paths'] for row in rows) / len(rows)
-                            sorted_templates.append((template, avg_paths, rows))
-                        
-                        sorted_templates.sort(key=lambda x: x[1], reverse=True)
-                        
-                        # Si n_templates es '*', usar todas las plantillas
-                        if n_templates == '*':
-                            selected_templates = sorted_templates
-                        else:
-                            selected_templates = sorted_templates[:n_templates]
-                        
-                        #print(f"  - Patrón '{pattern}': {len(selected_templates)} plantillas seleccionadas")
-                        
-                        for template, avg_paths, rows in selected_templates:
-                            sorted_rows = sorted(rows, key=lambda row: row['Número de Paths'], reverse=True)
-                            selected_queries = sorted_rows[:n_real]
-                            
-                            for row in selected_queries:
-                                pool_final_queries.append({
-                                    'Consulta': row['Consulta'],
-                                    'Patrón Abstracto': pattern,
-                                    'Consulta Plantilla': row['Consulta Plantilla'],
-                                    'ID Nodo': row.get('ID Nodo', ''),
-                                    'Número de Paths': row['Número de Paths'],
-                                    'Tiempo Ejecución (ms)': row['Tiempo Ejecución (ms)'],
-                                    'Ejecuciones': row.get('Ejecuciones', 1),
-                                    'Desviación Estándar (ms)': row.get('Desviación Estándar (ms)', 0),
-                                    'Tipo': 'Selective',
-                                    'Q Number': q_number
-                                })
-                    
-                    #print(f"\nTotal de consultas seleccionadas: {len(pool_final_queries)}")
+                # Aplicar limpieza también a cada patrón
+                pattern_sheets.append(excel_sheet(self.sanitize_sheet_name(pattern), pattern_df[columns_to_keep_queries],
+                                                  averages_footer(pattern_stats.at[pattern, 'Promedio Paths'],
+                                                                  pattern_stats.at[pattern, 'Tiempo Promedio (ms)'])))
+            
+            summary_df = pattern_stats.reset_index()
+            summary_df.insert(1, 'Q Number', [self.pattern_to_q_number.get(pattern)
+                                              for pattern in summary_df['Patrón Abstracto']])
+            summary_footer = [(1, 0, "TOTAL / PROMEDIO GENERAL:", 'bold')]
+            for i, col in enumerate(summary_df.columns):
+                if col in ('Número de Consultas', 'Total Paths'):
+                    summary_footer.append((1, i, summary_df[col].sum(), 'bold'))
+                elif col in ('Tiempo Promedio (ms)', 'Promedio Paths') or col.endswith(' Promedio (ms)'):
+                    summary_footer.append((1, i, summary_df[col].mean(), 'bold_num'))
+            pattern_sheets.append(excel_sheet('Resumen', summary_df, summary_footer))
+            
+            # Estadísticas por nodo de inicio dentro de cada patrón
+            pattern_sheets.append(excel_sheet('Nodos', stats['nodes'].reset_index()))
+            
+            pattern_excel_path = os.path.join(output_folder, "resultados_por_patron.xlsx")
+            workbooks[pattern_excel_path] = pattern_sheets
+
+            # GENERAR RANKING DE TEMPLATES POR ABSTRACT QUERY
+            template_stats = stats['templates']
+            template_sheets = []
+            
+            for pattern in pattern_stats.index:
+                q_number = self.pattern_to_q_number.get(pattern)
                 
+                # Plantillas del patrón ordenadas por promedio de paths (descendente)
+                template_ranking_df = template_stats.loc[pattern].reset_index()
+                template_ranking_df.rename(columns={'Consulta Plantilla': 'Template Query'}, inplace=True)
+                if rank_column is None:
+                    template_ranking_df.sort_values('Promedio Paths', ascending=False, kind='stable', inplace=True)
                 else:
-                    print("\nModo estándar: procesando todos los patrones")
-                    
-                for pattern in patterns:
-                    pattern_df = df[df['Patrón Abstracto'] == pattern]
-                    
-                    q_number = None
-                    if pattern in self.pattern_to_q_number:
-                        q_number = self.pattern_to_q_number[pattern]
-                    
-                    pattern_df = pattern_df.sort_values('Número de Paths', ascending=False)
-                    
-                    # Aplicar limpieza también a cada patrón
-                    pattern_df_clean = pattern_df[columns_to_keep_queries]
-                    
-                    sheet_name = self.sanitize_sheet_name(pattern)
-                    
-                    pattern_df_clean.to_excel(writer, sheet_name=sheet_name, index=False)
-                    
-                    worksheet = writer.sheets[sheet_name]
-                    num_rows = len(pattern_df_clean) + 1
-                    
-                    paths_col_idx = None
-                    time_col_idx = None
-                    
-                    for i, col in enumerate(pattern_df_clean.columns):
-                        if col == 'Número de Paths':
-                            paths_col_idx = i
-                        elif col == 'Tiempo Ejecución (ms)':
-                            time_col_idx = i
-                    
-                    if paths_col_idx is not None:
-                        paths_avg = pattern_df['Número de Paths'].mean()
-                        worksheet.write(num_rows + 1, 0, "Promedio de Paths:", bold_format)
-                        worksheet.write(num_rows + 1, paths_col_idx, paths_avg, bold_num_format)
-                    
-                    if time_col_idx is not None:
-                        time_avg = pattern_df['Tiempo Ejecución (ms)'].mean()
-                        worksheet.write(num_rows + 2, 0, "Promedio de Tiempo (ms):", bold_format)
-                        worksheet.write(num_rows + 2, time_col_idx, time_avg, bold_num_format)
-                    
-                    non_zero_df = pattern_df[pattern_df['Número de Paths'] > 0]
-                    
-                    if len(non_zero_df) > 0:
-                        n_queries = len(non_zero_df)
-                        
-                        template_groups = {}
-                        for _, row in non_zero_df.iterrows():
-                            template = row['Consulta Plantilla']
-                            if template not in template_groups:
-                                template_groups[template] = []
-                            template_groups[template].append(row)
+                    # Orden por fase o percentil de latencia (las plantillas más lentas primero)
+                    template_ranking_df[rank_column] = template_ranking_df['Template Query'].map(
+                        template_rank_values.loc[pattern])
+                    template_ranking_df.sort_values(rank_column, ascending=False, kind='stable', inplace=True)
                 
-                summary_data = []
-                for pattern in patterns:
-                    pattern_df = df[df['Patrón Abstracto'] == pattern]
-                    
-                    q_number = None
-                    if pattern in self.pattern_to_q_number:
-                        q_number = self.pattern_to_q_number[pattern]
-                    
-                    summary_data.append({
-                        'Patrón Abstracto': pattern,
-                        'Q Number': q_number,
-                        'Número de Consultas': len(pattern_df),
-                        'Tiempo Promedio (ms)': pattern_df['Tiempo Ejecución (ms)'].mean(),
-                        'Tiempo Mínimo (ms)': pattern_df['Tiempo Ejecución (ms)'].min(),
-                        'Tiempo Máximo (ms)': pattern_df['Tiempo Ejecución (ms)'].max(),
-                        'Total Paths': pattern_df['Número de Paths'].sum(),
-                        'Promedio Paths': pattern_df['Número de Paths'].mean()
-                    })
+                # Agregar ranking
+                template_ranking_df.insert(0, 'Ranking', range(1, len(template_ranking_df) + 1))
                 
-                summary_df = pd.DataFrame(summary_data)
-                summary_df.to_excel(writer, sheet_name='Resumen', index=False)
+                # MODIFICACIÓN 4: Solo mantener las columnas especificadas para rankingTemplates.xlsx
+                column_order = ['Ranking', 'Template Query', 'Promedio Paths', 'Tiempo Promedio (ms)']
+                if rank_column is not None:
+                    column_order.append(rank_column)
+                template_ranking_df = template_ranking_df[column_order]
                 
-                worksheet = writer.sheets['Resumen']
-                num_rows = len(summary_df) + 1
+                # Crear nombre de hoja
+                if q_number is not None:
+                    sheet_name = f"Q{int(q_number)}"
+                else:
+                    sheet_name = self.sanitize_sheet_name(pattern)[:31]
                 
-                worksheet.write(num_rows + 1, 0, "TOTAL / PROMEDIO GENERAL:", bold_format)
+                # Promedio general de todos los templates al final
+                template_footer = []
+                if template_ranking_df['Promedio Paths'].notna().any():
+                    template_footer += [(1, 0, "Promedio General Paths:", 'bold'),
+                                        (1, 2, template_ranking_df['Promedio Paths'].mean(), 'bold_num')]
+                if template_ranking_df['Tiempo Promedio (ms)'].notna().any():
+                    template_footer += [(2, 0, "Promedio General Tiempo:", 'bold'),
+                                        (2, 3, template_ranking_df['Tiempo Promedio (ms)'].mean(), 'bold_num')]
                 
-                for i, col in enumerate(summary_df.columns):
-                    if col == 'Número de Consultas':
-                        total = summary_df['Número de Consultas'].sum()
-                        worksheet.write(num_rows + 1, i, total, bold_format)
-                    elif col == 'Total Paths':
-                        total = summary_df['Total Paths'].sum()
-                        worksheet.write(num_rows + 1, i, total, bold_format)
-                    elif col == 'Tiempo Promedio (ms)':
-                        avg = summary_df['Tiempo Promedio (ms)'].mean()
-                        worksheet.write(num_rows + 1, i, avg, bold_num_format)
-                    elif col == 'Promedio Paths':
-                        avg = summary_df['Promedio Paths'].mean()
-                        worksheet.write(num_rows + 1, i, avg, bold_num_format)
+                template_sheets.append(excel_sheet(sheet_name, template_ranking_df, template_footer,
+                                                   column_order[2:]))
             
-            print(f"Se guardaron resultados organizados por patrón abstracto en {pattern_excel_path}")
-
-            # GENERAR RANKING DE TEMPLATES POR ABSTRACT QUERY
-            print("\nGenerando rankingTemplates.xlsx...")
             ranking_templates_path = os.path.join(output_folder, "rankingTemplates.xlsx")
+            workbooks[ranking_templates_path] = template_sheets
             
-            with pd.ExcelWriter(ranking_templates_path, engine='xlsxwriter') as writer:
-                workbook = writer.book
-                bold_format = workbook.add_format({'bold': True})
-                num_format = workbook.add_format({'num_format': '0'})
-                bold_num_format = workbook.add_format({'bold': True, 'num_format': '0'})
-                
-                # Procesar cada patrón abstracto
-                for pattern in patterns:
-                    pattern_df = df[df['Patrón Abstracto'] == pattern]
-                    
-                    if pattern_df.empty:
-                        continue
-                    
-                    q_number = None
-                    if pattern in self.pattern_to_q_number:
-                        q_number = self.pattern_to_q_number[pattern]
-                    
-                    # Agrupar por Template Query y calcular estadísticas
-                    template_stats = []
-                    template_groups = pattern_df.groupby('Consulta Plantilla')
-                    
-                    for template, template_group in template_groups:
-                        promedio_paths = template_group['Número de Paths'].mean()
-                        promedio_tiempo = template_group['Tiempo Ejecución (ms)'].mean()
-                        
-                        template_stats.append({
-                            'Template Query': template,
-                            'Promedio Paths': promedio_paths,
-                            'Tiempo Promedio (ms)': promedio_tiempo
-                        })
-                    
-                    # Ordenar por promedio de paths (descendente)
-                    template_stats.sort(key=lambda x: x['Promedio Paths'], reverse=True)
-                    
-                    # Agregar ranking
-                    for i, stats in enumerate(template_stats, 1):
-                        stats['Ranking'] = i
-                    
-                    # Crear DataFrame para este patrón
-                    template_ranking_df = pd.DataFrame(template_stats)
-                    
-                    # MODIFICACIÓN 4: Solo mantener las columnas especificadas para rankingTemplates.xlsx
-                    column_order = ['Ranking', 'Template Query', 'Promedio Paths', 'Tiempo Promedio (ms)']
-                    template_ranking_df = template_ranking_df[column_order]
-                    
-                    # Crear nombre de hoja
-                    if q_number is not None:
-                        sheet_name = f"Q{int(q_number)}"
-                    else:
-                        sheet_name = self.sanitize_sheet_name(pattern)[:31]
-                    
-                    # Escribir a Excel
-                    template_ranking_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                    
-                    # Formatear la hoja
-                    worksheet = writer.sheets[sheet_name]
-                    
-                    # Aplicar formato numérico a columnas de números
-                    for col_num, col_name in enumerate(template_ranking_df.columns):
-                        if col_name in ['Promedio Paths', 'Tiempo Promedio (ms)']:
-                            col_letter = chr(65 + col_num)
-                            worksheet.set_column(f'{col_letter}2:{col_letter}{len(template_ranking_df)+1}', None, num_format)
-                    
-                    # Agregar estadísticas al final
-                    num_rows = len(template_ranking_df) + 1
-                    
-                    # Promedio general de todos los templates
-                    if template_ranking_df['Promedio Paths'].notna().any():
-                        promedio_general_paths = template_ranking_df['Promedio Paths'].mean()
-                        worksheet.write(num_rows + 1, 0, "Promedio General Paths:", bold_format)
-                        worksheet.write(num_rows + 1, 2, promedio_general_paths, bold_num_format)
-                    
-                    if template_ranking_df['Tiempo Promedio (ms)'].notna().any():
-                        promedio_general_tiempo = template_ranking_df['Tiempo Promedio (ms)'].mean()
-                        worksheet.write(num_rows + 2, 0, "Promedio General Tiempo:", bold_format)
-                        worksheet.write(num_rows + 2, 3, promedio_general_tiempo, bold_num_format)
+            ranking_df = pattern_stats[['Promedio Paths', 'Tiempo Promedio (ms)']].reset_index()
+            ranking_df.insert(0, 'Q Number', [f"Q{int(q_number)}" if q_number is not None else "Desconocido"
+                                              for q_number in map(self.pattern_to_q_number.get, ranking_df['Patrón Abstracto'])])
+            ranking_columns = ['Ranking', 'Q Number', 'Patrón Abstracto', 'Promedio Paths', 'Tiempo Promedio (ms)']
+            if rank_column is None:
+                ranking_df.sort_values('Promedio Paths', ascending=False, inplace=True)
+            else:
+                ranking_df[rank_column] = ranking_df['Patrón Abstracto'].map(pattern_rank_values)
+                ranking_df.sort_values(rank_column, ascending=False, kind='stable', inplace=True)
+                ranking_columns.append(rank_column)
+            ranking_df.insert(0, 'Ranking', range(1, len(ranking_df) + 1))
+            ranking_df = ranking_df[ranking_columns]
+            
+            ranking_path = os.path.join(output_folder, "rankingAbstract.xlsx")
+            workbooks[ranking_path] = [excel_sheet('Ranking', ranking_df, number_columns=ranking_columns[3:])]
+            
+            # Rankings por fase y escalado de cada fase entre factores de escala
+            phases_path = os.path.join(output_folder, "rankingFases.xlsx")
+            workbooks[phases_path] = phase_ranking_sheets(stats, self.pattern_to_q_number)
+            scale_stats = self.collect_scale_statistics(output_folder, pattern_stats)
+            scaling_path = os.path.join(output_folder, PHASE_SCALING_NAME)
+            if len(scale_stats) > 1:
+                workbooks[scaling_path] = [excel_sheet('Escalado', phase_scaling_frame(scale_stats))]
+            
+            distribution_path = os.path.join(output_folder, "distribucion_latencias.xlsx")
+            workbooks[distribution_path] = [excel_sheet('Consultas', distribution['queries']),
+                                            excel_sheet('Plantillas', distribution['templates']),
+                                            excel_sheet('Patrones', distribution['patterns'])]
             
+            export_start = time.perf_counter()
+            export_workbooks(workbooks, self.export_workers)
+            print(f"Se guardaron {len(df)} consultas únicas en {output_excel_path}")
+            print(f"Se guardaron resultados organizados por patrón abstracto en {pattern_excel_path}")
             print(f"Se creó el archivo rankingTemplates.xlsx con rankings de templates por abstract query")
+            print(f"Se creó el archivo rankingAbstract.xlsx con el ranking de {len(ranking_df)} patrones abstractos"
+                  + (f" (ordenado por {rank_column})" if rank_column else ""))
+            print(f"Se guardaron percentiles e intervalos de confianza por consulta, plantilla y patrón en {distribution_path}")
+            print(f"Se creó el archivo rankingFases.xlsx con rankings por fase (parser, optimizador, ejecución)")
+            if len(scale_stats) > 1:
+                print(f"📈 Escalado por fase entre las escalas {', '.join(scale_stats)} guardado en {scaling_path}")
+            print(f"📄 {len(workbooks)} libros Excel exportados en {time.perf_counter() - export_start:.2f}s")
             
-            print("\nGenerando rankingAbstract.xlsx...")
-            abstract_stats = []
-
-            for pattern in patterns:
-                pattern_df = df[df['Patrón Abstracto'] == pattern]
-                if not pattern_df.empty:
-                    q_number = None
-                    if pattern in self.pattern_to_q_number:
-                        q_number = self.pattern_to_q_number[pattern]
-                    
-                    paths_promedio = pattern_df['Número de Paths'].mean()
-                    tiempo_promedio = pattern_df['Tiempo Ejecución (ms)'].mean()
-                    
-                    abstract_stats.append({
-                        'Q Number': f"Q{int(q_number)}" if q_number is not None else "Desconocido",
-                        'Patrón Abstracto': pattern,
-                        'Promedio Paths': paths_promedio,
-                        'Tiempo Promedio (ms)': tiempo_promedio
-                    })
-
-            ranking_df = pd.DataFrame(abstract_stats)
-            if not ranking_df.empty:
-                ranking_df.sort_values('Promedio Paths', ascending=False, inplace=True)
-                
-                ranking_df.insert(0, 'Ranking', range(1, len(ranking_df) + 1))
-                
-                ranking_df = ranking_df[['Ranking', 'Q Number', 'Patrón Abstracto', 'Promedio Paths', 'Tiempo Promedio (ms)']]
-                
-                ranking_path = os.path.join(output_folder, "rankingAbstract.xlsx")
-                
-                with pd.ExcelWriter(ranking_path, engine='xlsxwriter') as writer:
-                    ranking_df.to_excel(writer, sheet_name='Ranking', index=False)
-                    
-                    workbook = writer.book
-                    worksheet = writer.sheets['Ranking']
-                    num_format = workbook.add_format({'num_format': '0'})
-                    
-                    for i, col in enumerate(ranking_df.columns):
-                        if col in ['Promedio Paths', 'Tiempo Promedio (ms)']:
-                            col_letter = chr(65 + i)
-                            worksheet.set_column(f'{col_letter}2:{col_letter}{len(ranking_df)+1}', None, num_format)
-                
-                print(f"Se creó el archivo rankingAbstract.xlsx con el ranking de {len(ranking_df)} patrones abstractos")
-            else:
-                print("No se pudo crear rankingAbstract.xlsx porque no hay datos suficientes")
+            # Resumen en memoria para run_benchmark (evita releer los Excel)
+            self.query_summary = df
 
             # Copiar rankings a la carpeta rankings/
             self.copy_rankings_to_folder(output_folder)
@@ -1808,22 +3807,7 @@ class PathBenchmark:
             print(f"   - rankings/rankingsNodes/")
             print(f"\n✅ Proceso completado. Los rankings están listos para usar.")
 
-            # Terminar el servidor si está activo
-            if hasattr(self, 'server_process') and self.server_process and self.server_process.poll() is None:
-                print("\nTerminando el servidor MillenniumDB...")
-                self.server_process.terminate()
-                try:
-                    self.server_process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self.server_process.kill()
-                print("Servidor terminado.")
-
-            print("\nPresione Enter para salir...")
-            input()
-            sys.exit(0)
-
-            # Esta línea nunca se ejecutará
-            return len(data)
+            return len(df)
             
         except Exception as e:
             print(f"Error crítico al analizar los resultados: {e}")
@@ -1831,6 +3815,36 @@ class PathBenchmark:
             traceback.print_exc()
             return 0
     
+    def collect_scale_statistics(self, output_folder, pattern_stats):
+        """
+        Estadísticas por patrón de cada factor de escala: las del análisis actual y las de los
+        almacenes de mediciones de las demás carpetas resultados_benchmark_*, en orden natural.
+        """
+        prefix = "resultados_benchmark_"
+        current = os.path.normpath(output_folder)
+        folders = {name: name for name in os.listdir('.') if name.startswith(prefix) and os.path.isdir(name)}
+        folders.setdefault(current, current)
+        
+        scale_stats = {}
+        for folder in sorted(folders, key=lambda name: _natural_key(name[len(prefix):] if name.startswith(prefix) else name)):
+            scale = os.path.basename(folder)
+            scale = scale[len(prefix):] if scale.startswith(prefix) else scale
+            if os.path.normpath(folder) == current:
+                scale_stats[scale] = pattern_stats
+                continue
+            store_path = os.path.join(folder, MEASUREMENT_STORE_NAME)
+            if not os.path.exists(store_path):
+                continue
+            try:
+                store = load_measurement_store(store_path)
+            except ValueError as e:
+                print(f"Advertencia: se omite {store_path} en el escalado por fase: {e}")
+                continue
+            summary = query_summary_frame(store)
+            if not summary.empty:
+                scale_stats[scale] = aggregate_query_statistics(summary)['patterns']
+        return scale_stats
+
     def copy_rankings_to_folder(self, output_folder):
         """Copia los archivos de ranking a la carpeta rankings/"""
         try:
@@ -1855,6 +3869,14 @@ class PathBenchmark:
                 shutil.copy2(source_templates, dest_templates)
                 print(f"✅ Copiado rankingTemplates.xlsx a {dest_templates}")
             
+            # Copiar rankingFases.xlsx
+            source_phases = os.path.join(output_folder, "rankingFases.xlsx")
+            if os.path.exists(source_phases):
+                import shutil
+                dest_phases = os.path.join(rankings_dest, "rankingFases.xlsx")
+                shutil.copy2(source_phases, dest_phases)
+                print(f"✅ Copiado rankingFases.xlsx a {dest_phases}")
+            
             # Copiar la carpeta rankingsNodes si existe
             source_nodes = "rankingsNodes"
             if os.path.exists(source_nodes):
@@ -1882,6 +3904,9 @@ class PathBenchmark:
 
             print(f"\nEjecutando benchmark...")
             print("Preparando pruebas...")
+            load_results = {}
+            cold_timings = None
+            cache_results = None
             
             # FLUJO CORREGIDO PARA --calculate-new
             if not self.use_existing_results:
@@ -1897,15 +3922,31 @@ class PathBenchmark:
                 print("📝 Generando script con TODAS las consultas templates...")
                 script_path, total_queries = self.generate_query_script()
                 
-                if script_path and total_queries > 0:
+                if total_queries > 0:
                     print(f"🚀 EJECUTANDO {total_queries} consultas al servidor...")
-                    print(f"Script a ejecutar: {script_path}")
                     
-                    # Ejecutar las consultas usando el script generado
-                    self.execute_query_script(script_path, total_queries)
+                    # El modo frío compara contra una pasada principal con la base de datos en caché
+                    if self.cache_mode in ("warm", "cold"):
+                        self.prefetch_database()
+                    
+                    # Ejecutar las consultas en proceso sobre conexiones persistentes
+                    self.execute_queries(self.generated_queries)
+                    
+                    load_pool = self.concurrency_pool_from_queries(self.generated_queries, self.query_info)
+                    if self.concurrency_levels or self.arrival_rates:
+                        # La carga va a un log propio: result.txt solo debe contener la pasada medida
+                        self.restart_server_for_load()
+                    if self.concurrency_levels:
+                        load_results['concurrency_sweep'] = self.run_concurrency_sweep(load_pool, output_folder)
+                    if self.arrival_rates:
+                        load_results['open_loop'] = self.run_open_loop_load(load_pool, output_folder)
+                    
+                    if self.cache_mode == "cold":
+                        cold_timings = self.run_cold_cache_pass(self.generated_queries)
                 else:
-                    print("❌ ERROR: No se pudo generar el script de consultas")
-                    return
+                    print("❌ ERROR: No se generaron consultas para ejecutar")
+                    return {'mode': self.operation_mode, 'status': 'error',
+                            'error': "No se generaron consultas para ejecutar", 'output_folder': output_folder}
                 
                 print("\n✅ Todas las consultas ejecutadas. Procediendo al análisis selectivo...")
             else:
@@ -1920,11 +3961,15 @@ class PathBenchmark:
                 selection_modes=self.query_selection_modes
             )
             
+            if cold_timings is not None and num_queries > 0:
+                cache_results = self.export_cache_comparison(cold_timings, output_folder)
+            
             # Resto del código igual...
-            for i in range(5):
-                sys.stdout.write(".")
-                sys.stdout.flush()
-                time.sleep(0.5)
+            if not self.batch:
+                for i in range(5):
+                    sys.stdout.write(".")
+                    sys.stdout.flush()
+                    time.sleep(0.5)
 
             print("\n" + "=" * 60)
             print(f"Benchmark completado")
@@ -1937,6 +3982,8 @@ class PathBenchmark:
             else:
                 print(f"- Base de datos utilizada: {self.db_path}")
             
+            if self.server_ready_s is not None:
+                print(f"- Servidor listo en: {self.server_ready_s:.2f} segundos")
             print(f"- Consultas analizadas: {num_queries}")
             print(f"- Modos selección nodos: {', '.join(self.selection_modes)} ({self.nodes_per_label} nodos por etiqueta)")
             print(f"- Modos selección consultas: {', '.join(self.query_selection_modes)} ({self.queries_per_pattern} consultas por patrón/modo)")
@@ -1948,114 +3995,201 @@ class PathBenchmark:
                 print(f"- Templates por abstract: {self.selective_queries.get('n_templates', '*')}")
                 print(f"- Consultas reales por template: {self.selective_queries.get('n_real', 3)}")
             
-            total_time = 0
-            if num_queries > 0:
-                try:
-                    df = pd.read_excel(output_excel_path)
-                    if 'Tiempo Ejecución (ms)' in df.columns:
-                        total_time = df['Tiempo Ejecución (ms)'].sum() / 1000
-                        
-                        if 'Patrón Abstracto' in df.columns:
-                            pattern_stats = df.groupby('Patrón Abstracto').agg({
-                                'Tiempo Ejecución (ms)': ['mean', 'min', 'max', 'count'],
-                                'Número de Paths': ['sum']
-                            })
-                            
-                except Exception as e:
-                    print(f"Aviso: No se pudo leer el archivo Excel para cálculos: {e}")
-                    total_time = random.uniform(2, 10)
-            else:
-                total_time = random.uniform(2, 10)
-                    
-            print(f"- Tiempo total: {total_time:.2f} segundos")
-            
-            if num_queries > 0:
+            if num_queries > 0 and self.query_summary is not None:
+                # Resumen calculado en el análisis, sin releer resultados_queries.xlsx
+                total_time = self.query_summary['Tiempo Ejecución (ms)'].sum() / 1000
+                print(f"- Tiempo total: {total_time:.2f} segundos")
                 rendimiento = num_queries / total_time if total_time > 0 else 0
                 print(f"- Rendimiento medio: {rendimiento:.2f} ops/sec")
+                if self.latency_summary:
+                    print("- Latencia por ejecución: " + " | ".join(
+                        f"{name.replace(' (ms)', '')} {value:.2f} ms" for name, value in self.latency_summary.items()))
             else:
-                print(f"- Rendimiento medio: {random.uniform(800, 2000):.2f} ops/sec")
+                # Sin mediciones no hay tiempos que mostrar
+                print("- Tiempo total: no disponible (no se analizaron consultas)")
+                print("- Rendimiento medio: no disponible")
                     
             print(f"- Resultados guardados en: {output_excel_path}")
             print(f"- Resultados por patrón abstracto: {os.path.join(output_folder, 'resultados_por_patron.xlsx')}")
             print(f"- Pool final de consultas: {os.path.join(output_folder, 'pool_final.xlsx')}")
-
-            input("\nPresione Enter para salir...")
             
-            if self.server_process and self.server_process.poll() is None:
-                print("Terminando el servidor MillenniumDB...")
-                self.server_process.terminate()
-                try:
-                    self.server_process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self.server_process.kill()
-                print("Servidor MillenniumDB terminado.")
-
-
-
-
+            self.stop_mdb_server()
+            
+            files = {
+                'measurements': os.path.join(output_folder, MEASUREMENT_STORE_NAME),
+                'queries': output_excel_path,
+                'patterns': os.path.join(output_folder, 'resultados_por_patron.xlsx'),
+                'ranking_abstract': os.path.join(output_folder, 'rankingAbstract.xlsx'),
+                'ranking_templates': os.path.join(output_folder, 'rankingTemplates.xlsx'),
+                'client_timings': 'tiempos_cliente.csv',
+                'server_startup': SERVER_STARTUP_LOG,
+                'adaptive_runs': ADAPTIVE_RUNS_LOG,
+                'concurrency_sweep': os.path.join(output_folder, 'barrido_concurrencia.xlsx'),
+                'open_loop': os.path.join(output_folder, 'carga_lazo_abierto.xlsx'),
+                'latency_distribution': os.path.join(output_folder, 'distribucion_latencias.xlsx'),
+                'ranking_phases': os.path.join(output_folder, 'rankingFases.xlsx'),
+                'phase_scaling': os.path.join(output_folder, PHASE_SCALING_NAME),
+                'cache_comparison': os.path.join(output_folder, 'cache_frio_vs_caliente.xlsx'),
+                'cold_server_log': COLD_CACHE_LOG
+            }
+            summary = self.query_summary if num_queries > 0 else None
+            return {
+                'mode': self.operation_mode,
+                'status': 'ok' if num_queries > 0 else 'error',
+                'output_folder': output_folder,
+                'queries': num_queries,
+                'executions': int(summary['Ejecuciones'].sum()) if summary is not None else 0,
+                'total_time_s': float(summary['Tiempo Ejecución (ms)'].sum() / 1000) if summary is not None else 0.0,
+                'summary': summary,
+                'server_ready_s': self.server_ready_s,
+                'latency': self.latency_summary if summary is not None else None,
+                'adaptive_runs': self.adaptive_runs,
+                'load': load_results,
+                'cache': cache_results,
+                'files': {name: path for name, path in files.items() if os.path.exists(path)}
+            }
 
-    def execute_query_script(self, script_path, total_queries, timeout=35000):
+    def execute_queries(self, queries, timeout=35000):
         """
-        Nueva función específica para ejecutar el script de consultas
+        Ejecuta las consultas en proceso sobre conexiones HTTP keep-alive, midiendo cada petición
+        con reloj monotónico. Cada consulta se envía self.warmup veces de calentamiento y luego
+        self.repeat veces medidas, seguidas. Con self.target_ci, las ejecuciones medidas continúan
+        hasta que el intervalo bootstrap de la mediana de la latencia del cliente sea más estrecho
+        que esa fracción de la mediana, hasta el máximo por consulta o hasta la primera ejecución
+        medida fallida. El máximo global es estricto: agotado, no se envían más ejecuciones y las
+        consultas restantes quedan sin medir. Las ejecuciones necesarias se guardan en
+        repeticiones_adaptativas.csv. Los tiempos del cliente (con la fase
+        y la repetición) se guardan en tiempos_cliente.csv. El log del servidor se sigue de forma
+        incremental para contrastar cuántas consultas registró.
         """
+        import pandas as pd
+        
+        adaptive = self.target_ci is not None
+        min_runs = max(self.repeat, ADAPTIVE_MIN_RUNS) if adaptive else self.repeat
+        max_runs = max(self.max_repeat, min_runs) if adaptive else self.repeat
+        if adaptive:
+            print(f"\n⚡ Ejecutando {len(queries)} consultas al servidor ({self.warmup} de calentamiento + "
+                  f"entre {min_runs} y {max_runs} medidas cada una, hasta IC de la mediana < "
+                  f"{self.target_ci * 100:g}%)...")
+        else:
+            print(f"\n⚡ Ejecutando {len(queries)} consultas al servidor "
+                  f"({self.warmup} de calentamiento + {self.repeat} medidas cada una)...")
+        print("Este proceso puede tardar varios minutos...")
+        
+        self.query_pool = QueryConnectionPool()
+        server_log = ServerLogTailer(self.server_log, from_end=True)
+        timings = []
+        adaptive_rows = []
+        measured_total = 0
+        failed = 0
+        timed_out = False
+        progress_bar_length = 40
+        self.print_progress_bar(0, len(queries), progress_bar_length)
+        
+        run_start = last_update = time.perf_counter()
         try:
-            print(f"\n⚡ Ejecutando {total_queries} consultas al servidor...")
-            print("Este proceso puede tardar varios minutos...")
-            
-            with open("queries_output.txt", "w") as output_file:
-                self.query_process = subprocess.Popen(
-                    [f"./{script_path}"],
-                    stdout=output_file,
-                    stderr=output_file,
-                    shell=True
-                )
-                
-                completed_queries = 0
-                last_count = 0
-                start_time = time.time()
-                
-                progress_bar_length = 40
-                self.print_progress_bar(0, total_queries, progress_bar_length)
-                
-                while self.query_process.poll() is None:
-                    elapsed_time = time.time() - start_time
-                    if elapsed_time > timeout:
-                        print(f"\nTimeout después de {timeout} segundos. Terminando ejecución...")
-                        self.query_process.terminate()
+            for completed_queries, query in enumerate(queries, 1):
+                latencies = []
+                run = 0
+                stop_reason = None
+                while stop_reason is None:
+                    if time.perf_counter() - run_start > timeout:
+                        timed_out = True
+                        break
+                    # Límite global estricto: agotado el presupuesto no se envía ninguna ejecución más
+                    if adaptive and self.max_total_runs and measured_total + max(run - self.warmup, 0) >= self.max_total_runs:
+                        stop_reason = "máximo global"
                         break
                     
-                    time.sleep(2)
+                    record = post_query(self.query_pool, query)
+                    record["start"] -= run_start
+                    record["warmup"] = run < self.warmup
+                    record["repetition"] = run
+                    timings.append(record)
+                    if record["status"] != 200:
+                        failed += 1
+                    elif not record["warmup"]:
+                        latencies.append(record["latency_ms"])
+                    run += 1
                     
-                    if os.path.exists("result.txt"):
-                        try:
-                            with open("result.txt", 'r', encoding='utf-8', errors='replace') as f:
-                                log_content = f.read()
-                            
-                            completed_queries = log_content.count("Query received:")
-                            
-                            if completed_queries > last_count:
-                                completed_queries = min(completed_queries, total_queries)
-                                self.print_progress_bar(completed_queries, total_queries, progress_bar_length)
-                                last_count = completed_queries
-                        except Exception as e:
-                            print(f"\nError al leer result.txt: {e}")
-                            time.sleep(1)
+                    measured_runs = run - self.warmup
+                    if adaptive and not record["warmup"] and record["status"] != 200:
+                        # Una ejecución medida fallida no aporta latencia: repetirla solo gasta tiempo
+                        stop_reason = "error"
+                    elif measured_runs < min_runs:
+                        continue
+                    elif not adaptive:
+                        stop_reason = "fijo"
+                    elif median_confidence_interval(latencies, self.bootstrap_resamples or BOOTSTRAP_RESAMPLES)[3] <= self.target_ci:
+                        stop_reason = "convergencia"
+                    elif measured_runs >= max_runs:
+                        stop_reason = "máximo por consulta"
                 
-                self.print_progress_bar(total_queries, total_queries, progress_bar_length)
-                print("\n✅ Consultas completadas. Resultados guardados en result.txt")
+                measured_total += max(run - self.warmup, 0)
+                if adaptive and stop_reason is not None:
+                    median, low, high, width = median_confidence_interval(
+                        latencies, self.bootstrap_resamples or BOOTSTRAP_RESAMPLES)
+                    adaptive_rows.append({"query": query, "runs": max(run - self.warmup, 0), "valid_runs": len(latencies),
+                                          "converged": stop_reason == "convergencia", "reason": stop_reason,
+                                          "median_ms": median, "ci_low_ms": low, "ci_high_ms": high,
+                                          "relative_width": width})
                 
-        except Exception as e:
-            print(f"❌ Error al ejecutar las consultas: {e}")
-            import traceback
-            traceback.print_exc()        
+                # Refrescar la barra (y leer lo nuevo del log) como mucho 10 veces por segundo
+                now = time.perf_counter()
+                if now - last_update >= 0.1 or completed_queries == len(queries):
+                    server_log.poll()
+                    self.print_progress_bar(completed_queries, len(queries), progress_bar_length)
+                    last_update = now
+                
+                if timed_out:
+                    print(f"\nTimeout después de {timeout} segundos. Terminando ejecución...")
+                    break
+        finally:
+            self.query_pool.close()
+            self.query_pool = None
+        
+        elapsed = time.perf_counter() - run_start
+        self.client_timings = timings
+        pd.DataFrame(timings, columns=["query", "repetition", "warmup", "start", "latency_ms", "status",
+                                       "bytes", "error"]).to_csv("tiempos_cliente.csv", index=False)
+        measured_runs = {}
+        for record in timings:
+            if record["status"] == 200 and not record["warmup"]:
+                measured_runs[record["query"]] = measured_runs.get(record["query"], 0) + 1
+        save_measurement_protocol(self.server_log, self.warmup, measured_runs)
+        
+        print(f"\n✅ {len(timings)} consultas completadas en {elapsed:.2f} s. Tiempos del cliente en tiempos_cliente.csv")
+        if failed > 0:
+            print(f"⚠️  {failed} consultas fallaron o no devolvieron HTTP 200")
+        
+        if adaptive:
+            self.adaptive_runs = pd.DataFrame(adaptive_rows, columns=[
+                "query", "runs", "valid_runs", "converged", "reason", "median_ms", "ci_low_ms", "ci_high_ms",
+                "relative_width"])
+            self.adaptive_runs.to_csv(ADAPTIVE_RUNS_LOG, index=False)
+            converged = int(self.adaptive_runs["converged"].sum())
+            unmeasured = int((self.adaptive_runs["runs"] == 0).sum())
+            errors = int((self.adaptive_runs["reason"] == "error").sum())
+            if errors:
+                print(f"⚠️  {errors} consultas se detuvieron tras una ejecución medida fallida")
+            if unmeasured:
+                print(f"⚠️  {unmeasured} consultas quedaron sin medir al agotarse el máximo global de ejecuciones")
+            print(f"🎯 {converged} de {len(adaptive_rows)} consultas convergieron; "
+                  f"{measured_total} ejecuciones medidas (media {measured_total / max(len(adaptive_rows), 1):.1f} "
+                  f"por consulta). Detalle en {ADAPTIVE_RUNS_LOG}")
+        
+        self.server_records = server_log.close()
+        print(f"🖥️  El servidor registró {server_log.received} consultas en {self.server_log} "
+              f"({len(self.server_records)} con tiempos completos)")
+        return timings
+
     def read_ranking_abstract(self, ranking_folder="rankings"):
         ranking_path = os.path.join(ranking_folder, self.selected_scale, "rankingAbstract.xlsx")
         if not os.path.exists(ranking_path):
             print(f"Error: No se encontró {ranking_path}")
             return []
         
-        df = pd.read_excel(ranking_path, sheet_name='Ranking')
-        return df.to_dict('records')
+        return load_ranking_workbook(ranking_path)['Ranking']
 
     def read_ranking_templates(self, ranking_folder="rankings", q_number=None):
         ranking_path = os.path.join(ranking_folder, self.selected_scale, "rankingTemplates.xlsx")
@@ -2065,11 +4199,15 @@ class PathBenchmark:
         
         sheet_name = f"Q{q_number}" if q_number else 'Q1'
         try:
-            df = pd.read_excel(ranking_path, sheet_name=sheet_name)
-            return df.to_dict('records')
+            sheets = load_ranking_workbook(ranking_path)
         except Exception as e:
             print(f"Error leyendo sheet {sheet_name}: {e}")
             return []
+        
+        if sheet_name not in sheets:
+            print(f"Error leyendo sheet {sheet_name}: la hoja no existe")
+            return []
+        return sheets[sheet_name]
 
     def select_abstract_queries(self, n_abstract):
         abstract_ranking = self.read_ranking_abstract()
@@ -2109,11 +4247,12 @@ class PathBenchmark:
             print("No hay mapeos de nodos cargados. Cargando mapeos...")
             self.node_mappings = self.load_mappings(self.mappings_file)
         
-        if initial_label not in self.node_mappings:
+        node_pool = self.get_label_node_pool(template, initial_label)
+        if node_pool is None:
             print(f"No se encontró mapeo para etiqueta: {initial_label}")
             return []
         
-        node_ids = self.node_mappings[initial_label][:n_real]
+        node_ids = node_pool[:n_real]
         real_queries = []
         
         for node_id in node_ids:
@@ -2175,6 +4314,8 @@ class PathBenchmark:
         return pool_queries
 
     def save_selective_pool(self, pool_queries, output_folder="resultados_benchmark"):
+        import pandas as pd
+        
         if not pool_queries:
             print("No hay consultas en el pool selectivo")
             return
@@ -2185,7 +4326,7 @@ class PathBenchmark:
         df = pd.DataFrame(pool_queries)
         
         excel_path = os.path.join(output_folder, "pool_selectivo_final.xlsx")
-        df.to_excel(excel_path, index=False)
+        export_workbook(excel_path, [excel_sheet('Sheet1', df)])
         
         txt_path = os.path.join(output_folder, "pool_selectivo_final.txt")
         with open(txt_path, 'w', encoding='utf-8') as f:
@@ -2201,45 +4342,31 @@ class PathBenchmark:
             print("No hay consultas en el pool para generar script")
             return None, 0
         
-        script_content = """#!/bin/bash
-
-    BASE_URL="http://localhost:1234/query"
-
-    PATTERNS=(
-    """
-        
+        queries = []
+        query_info = {}
+        canonical_queries = {}
         for query_item in pool_queries:
             real_query = query_item['Real_Query']
-            script_content += f'"{real_query}"\n'
-        
-        script_content += """)
-
-    for PATTERN in "${PATTERNS[@]}"; do
-        RESPONSE=$(curl -s -X POST "$BASE_URL" -d "$PATTERN")
-        echo "Ejecutando: $PATTERN"
-    done
-
-    echo "Todas las consultas se ejecutaron correctamente."
-    """
-        
-        with open(script_path, "w") as f:
-            f.write(script_content)
-        
-        os.chmod(script_path, 0o755)
-        
-        query_info = {}
-        for i, query_item in enumerate(pool_queries):
-            query_info[query_item['Real_Query']] = {
+            entry = {
                 "original": query_item['Template_Query'],
                 "abstract_pattern": query_item['Abstract_Pattern'],
-                "node_id": self.extract_node_from_query(query_item['Real_Query']),
+                "node_id": self.extract_node_from_query(real_query),
                 "label": query_item['Initial_Label']
             }
+            if self.register_query(query_info, canonical_queries, real_query, entry):
+                queries.append(real_query)
+        
+        self.generated_queries = queries
+        self.query_info = query_info
+        if self.export_script:
+            self.write_query_script(queries, script_path)
+        else:
+            script_path = None
         
         with open("selective_query_info.json", "w") as f:
             json.dump(query_info, f, indent=2)
         
-        return script_path, len(pool_queries)
+        return script_path, len(queries)
 
     def extract_node_from_query(self, query):
         match = re.search(r'MATCH \(([^)]+)\)=', query)
@@ -2317,78 +4444,113 @@ class PathBenchmark:
             except:
                 self.server_process.kill()
             
-        if self.query_process and self.query_process.poll() is None:
-            print("Terminando el proceso de consultas...")
-            try:
-                self.query_process.terminate()
-                self.query_process.wait(timeout=5)
-            except:
-                self.query_process.kill()
+        if self.query_pool is not None:
+            print("Cerrando las conexiones de consultas...")
+            self.query_pool.close()
             
         print("Procesos terminados. Saliendo.")
-        sys.exit(0)  
+        raise KeyboardInterrupt
 
-    def start(self):
-        signal.signal(signal.SIGINT, self.handle_interrupt)
-        
-        self.show_welcome_screen()
-        
+    def run(self):
+        """
+        Ejecuta el benchmark completo sin preguntas (y sin pausas decorativas en modo batch) y devuelve
+        un resumen estructurado: modo, estado, carpeta de salida, consultas, tiempos y archivos generados.
+        """
         if self.operation_mode == "use_rankings":
             # Solo usar rankings si se especificó explícitamente --use-rankings
             print(f"📊 Usando rankings existentes desde: rankings/{self.rankings_scale}/")
-            time.sleep(3.2)
+            if not self.batch:
+                time.sleep(3.2)
             
+            output_folder = f"resultados_benchmark_{self.rankings_scale}"
             if not self.validate_rankings_exist():
                 print(f"❌ ERROR: No se encontraron rankings válidos en rankings/{self.rankings_scale}/")
                 print("💡 Ejecute con --calculate-new para generar rankings desde cero.")
-                input("\nPresione Enter para salir...")
-                return
+                return {'mode': self.operation_mode, 'status': 'error', 'output_folder': output_folder,
+                        'error': f"No se encontraron rankings válidos en rankings/{self.rankings_scale}/"}
             
-            self.generate_pool_from_rankings()
+            pool_queries = self.generate_pool_from_rankings() or []
             
             print("\n🎉 ¡Pool generado exitosamente desde rankings existentes!")
-            input("\nPresione Enter para salir...")
+            
+            load_results = {}
+            if (self.concurrency_levels or self.arrival_rates) and pool_queries:
+                self.start_mdb_server(force=True, log_file=LOAD_TEST_LOG)
+                try:
+                    load_pool = [(item['Real_Query'], item['Q_Number']) for item in pool_queries]
+                    if self.concurrency_levels:
+                        load_results['concurrency_sweep'] = self.run_concurrency_sweep(load_pool, output_folder)
+                    if self.arrival_rates:
+                        load_results['open_loop'] = self.run_open_loop_load(load_pool, output_folder)
+                finally:
+                    self.stop_mdb_server()
+            
+            return {'mode': self.operation_mode, 'status': 'ok' if pool_queries else 'error',
+                    'output_folder': output_folder, 'queries': len(pool_queries), 'pool': pool_queries,
+                    'server_ready_s': self.server_ready_s, 'load': load_results}
+        
+        # POR DEFECTO: SIEMPRE usar calculate_new (aunque operation_mode sea "default_rankings" o "calculate_new")
+        default_path = os.path.join("MillenniumDB", "data", "db", "01")
         
+        if hasattr(self, 'db_path') and self.db_path and self.db_path != default_path:
+            self.selected_scale = os.path.basename(os.path.normpath(self.db_path))
+            print(f"\n\033[1;92m▶\033[0m \033[1mUsando base de datos personalizada: {self.db_path}\033[0m")
+            #print(f"Factor de escala detectado de la ruta: {self.selected_scale}")
         else:
-            # POR DEFECTO: SIEMPRE usar calculate_new (aunque operation_mode sea "default_rankings" o "calculate_new")
-            default_path = os.path.join("MillenniumDB", "data", "db", "01")
-            
-            if hasattr(self, 'db_path') and self.db_path and self.db_path != default_path:
-                self.selected_scale = os.path.basename(os.path.normpath(self.db_path))
-                print(f"\n\033[1;92m▶\033[0m \033[1mUsando base de datos personalizada: {self.db_path}\033[0m")
-                #print(f"Factor de escala detectado de la ruta: {self.selected_scale}")
-            else:
-                print(f"\nUsando base de datos por defecto: {self.db_path}")
+            print(f"\nUsando base de datos por defecto: {self.db_path}")
+            if not self.batch:
                 time.sleep(2)
-                #self.selected_scale = self.get_scale_factor()
-                self.db_path = os.path.join("MillenniumDB", "data", "db", "01")
-            
-            print(f"\n📋 CONFIGURACIÓN FINAL:")
-            print(f"   🎯 Abstract queries: {self.selective_queries.get('n_abstract', '*')}")
-            print(f"   📝 Templates por abstract: {self.selective_queries.get('n_templates', '*')}")
-            print(f"   🔍 Consultas reales por template: {self.selective_queries.get('n_real', 3)}")
-            print(f"   🔗 Nodos por etiqueta: {self.nodes_per_label}")
-            print(f"   ⚙️  Modo selección nodos: {', '.join(self.selection_modes)}")
-            print(f"   ✅ SINCRONIZADO: nodes_per_label = rq = {self.nodes_per_label}")
-            
-            if self.selected_scale and not self.use_existing_results:
-                self.generate_mappings_file()
+            #self.selected_scale = self.get_scale_factor()
+            self.db_path = os.path.join("MillenniumDB", "data", "db", "01")
+        
+        print(f"\n📋 CONFIGURACIÓN FINAL:")
+        print(f"   🎯 Abstract queries: {self.selective_queries.get('n_abstract', '*')}")
+        print(f"   📝 Templates por abstract: {self.selective_queries.get('n_templates', '*')}")
+        print(f"   🔍 Consultas reales por template: {self.selective_queries.get('n_real', 3)}")
+        print(f"   🔗 Nodos por etiqueta: {self.nodes_per_label}")
+        print(f"   ⚙️  Modo selección nodos: {', '.join(self.selection_modes)}")
+        print(f"   ✅ SINCRONIZADO: nodes_per_label = rq = {self.nodes_per_label}")
+        
+        if self.selected_scale and not self.use_existing_results:
+            self.generate_mappings_file()
+        else:
+            if self.use_existing_results:
+                print("Usando archivo de resultados existente. Se omite la generación de mapeos.")
             else:
-                if self.use_existing_results:
-                    print("Usando archivo de resultados existente. Se omite la generación de mapeos.")
-                else:
-                    print("No se puede generar archivo de mapeos sin factor de escala.")
-                    print("Se usarán mapeos predeterminados.")
+                print("No se puede generar archivo de mapeos sin factor de escala.")
+                print("Se usarán mapeos predeterminados.")
+        
+        if not self.use_existing_results:
+            self.node_mappings = self.load_mappings(self.mappings_file)
             
-            if not self.use_existing_results:
-                self.node_mappings = self.load_mappings(self.mappings_file)
-                
-                num_etiquetas = len(self.node_mappings)
-                total_nodos = sum(len(nodos) for nodos in self.node_mappings.values())
-                print(f"Mapeos cargados: {num_etiquetas} etiquetas con {total_nodos} nodos en total")
+            num_etiquetas = len(self.node_mappings)
+            total_nodos = sum(len(nodos) for nodos in self.node_mappings.values())
+            print(f"Mapeos cargados: {num_etiquetas} etiquetas con {total_nodos} nodos en total")
             
-            self.start_mdb_server()
-            self.run_benchmark()
+            if self.node_ranking == "fanout" and self.selected_scale:
+                self.generate_fanout_mappings()
+        
+        self.start_mdb_server()
+        try:
+            return self.run_benchmark()
+        finally:
+            self.stop_mdb_server()
+
+    def start(self):
+        """Punto de entrada de la línea de comandos: pantalla de bienvenida, run() y pausa final"""
+        signal.signal(signal.SIGINT, self.handle_interrupt)
+        
+        if not self.batch:
+            self.show_welcome_screen()
+        
+        try:
+            results = self.run()
+        except RuntimeError as e:
+            results = {'mode': self.operation_mode, 'status': 'error', 'error': str(e)}
+        
+        if not self.batch:
+            input("\nPresione Enter para salir...")
+        return results
 
 
 def validate_parameter_consistency(args):
@@ -2421,6 +4583,71 @@ def validate_selection_mode(value):
                 f"Modo inválido: {value}. Los modos válidos son: max, med, min, .25, .75"
             )
 
+def validate_concurrency_levels(value):
+    if value == 'auto':
+        return default_concurrency_levels()
+    try:
+        levels = sorted({int(level) for level in value.split(',') if level.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError("Debe ser una lista de enteros separados por comas, ej. 1,2,4,8")
+    if not levels or levels[0] < 1:
+        raise argparse.ArgumentTypeError("Los niveles de concurrencia deben ser enteros mayores que 0")
+    return levels
+
+def validate_arrival_rates(value):
+    try:
+        rates = [float(rate) for rate in value.split(',') if rate.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Debe ser una lista de tasas separadas por comas, ej. 50,100,200")
+    if not rates or min(rates) <= 0:
+        raise argparse.ArgumentTypeError("Las tasas de llegada deben ser mayores que 0")
+    return rates
+
+def validate_warmup_runs(value):
+    try:
+        runs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Debe ser un número entero")
+    if runs < 0:
+        raise argparse.ArgumentTypeError("Las ejecuciones de calentamiento no pueden ser negativas")
+    return runs
+
+def validate_repeat_runs(value):
+    try:
+        runs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Debe ser un número entero")
+    if runs < 1:
+        raise argparse.ArgumentTypeError("Debe haber al menos 1 ejecución medida por consulta")
+    return runs
+
+def validate_relative_width(value):
+    try:
+        width = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Debe ser un número, ej. 0.05")
+    if not 0 < width < 1:
+        raise argparse.ArgumentTypeError("El ancho relativo debe estar entre 0 y 1 (ej. 0.05 = 5%)")
+    return width
+
+def validate_run_budget(value):
+    try:
+        runs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Debe ser un número entero")
+    if runs < 0:
+        raise argparse.ArgumentTypeError("El máximo de ejecuciones no puede ser negativo")
+    return runs
+
+def validate_bootstrap_resamples(value):
+    try:
+        resamples = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Debe ser un número entero")
+    if resamples < 0:
+        raise argparse.ArgumentTypeError("El número de remuestreos no puede ser negativo")
+    return resamples
+
 def validate_select_query(value):
     if value == '*':
         return '*'
@@ -2474,6 +4701,36 @@ Ejemplos de uso (MODO SELECTIVO - por defecto):
   # NUEVO: Con rankings existentes
   python pathBenchmark.py --use-rankings 01 --aq 3 --rq 2
   python pathBenchmark.py --use-rankings 03 --aq 2 --tq 1 --rq 4
+  
+  # Conteo de grados de edges.txt en paralelo (0 = todos los núcleos)
+  python pathBenchmark.py --calculate-new --edge-workers 8
+  
+  # Reanalizar un log grande parseándolo en paralelo
+  python pathBenchmark.py --use-existing --result-file result_3.txt --log-workers 0
+  
+  # Latencia en estado estable: 2 ejecuciones de calentamiento y 5 medidas por consulta
+  python pathBenchmark.py --calculate-new --warmup 2 --repeat 5
+  
+  # Rankings ordenados por el percentil 99 de latencia, con 2000 remuestreos bootstrap
+  python pathBenchmark.py --use-existing --result-file result.txt --rank-by p99 --bootstrap 2000
+  
+  # Latencia en frío (reinicio + caché del SO vacía por plantilla) frente a caliente
+  python pathBenchmark.py --calculate-new --cache-mode cold --cold-restart template
+  
+  # Repetir cada consulta hasta que el IC95% de su mediana sea < 5% (máx. 50 por consulta, 20000 en total)
+  python pathBenchmark.py --calculate-new --warmup 1 --target-ci 0.05 --max-repeat 50 --max-total-runs 20000
+  
+  # Ejecución no interactiva (CI, campañas por script)
+  python pathBenchmark.py --batch --calculate-new --rq 2
+  
+  # Regenerar los Excel desde el almacén de mediciones por ejecución
+  python pathBenchmark.py --use-existing --result-file resultados_benchmark_1/mediciones.npz --export-workers 4
+  
+  # Barrido de concurrencia (1, 2, 4, 8 clientes) sobre el pool de los rankings
+  python pathBenchmark.py --use-rankings 01 --aq 3 --concurrency-sweep 1,2,4,8
+  
+  # Latencias a tasas de llegada fijas (lazo abierto, llegadas de Poisson)
+  python pathBenchmark.py --use-rankings 01 --open-loop 50,100,200 --sweep-duration 30
 
 CONFIGURACIÓN POR DEFECTO:
   --aq "*"     (todos los abstract queries)
@@ -2488,10 +4745,27 @@ CONFIGURACIÓN POR DEFECTO:
                         help='Número de nodos por etiqueta para el POOL TOTAL. Si se especifica explícitamente, NO se sincroniza con --rq (default: 3)')
     basic_group.add_argument('--db-path', type=str, 
                         help='Ruta a la base de datos MillenniumDB (default: MillenniumDB/data/db/01)')
+    basic_group.add_argument('--server-timeout', type=float, default=SERVER_READY_TIMEOUT,
+                        help=f'Segundos máximos de espera a que mdb-server responda tras arrancar (default: {SERVER_READY_TIMEOUT})')
+    basic_group.add_argument('--batch', action='store_true', default=False,
+                        help='Modo no interactivo para CI y campañas: sin pantalla de bienvenida, pausas ni preguntas; '
+                             'el código de salida indica si la ejecución fue correcta')
+    basic_group.add_argument('--edge-workers', type=int, default=1,
+                        help='Procesos para contar grados en edges.txt: 1 = serial, 0 = todos los núcleos (default: 1)')
+    basic_group.add_argument('--prune-empty', action='store_true', default=False,
+                        help='Omitir las consultas que el oráculo local sobre edges.txt demuestra sin resultados')
+    basic_group.add_argument('--no-degree-cache', action='store_true', default=False,
+                        help='No usar ni actualizar el caché de grados guardado junto a edges.txt')
+    basic_group.add_argument('--export-script', action='store_true', default=False,
+                        help='Exportar también las consultas como script bash con curl (la ejecución siempre es en proceso)')
     
     selection_group = parser.add_argument_group('Modos de selección de nodos')
     selection_group.add_argument('--node-selection-mode', type=validate_selection_mode, default='max',
                       help='Modo(s) de selección de nodos: max, med, min, .25, .75 o combinaciones (default: max)')
+    selection_group.add_argument('--node-ranking', choices=['degree', 'fanout'], default='degree',
+                      help='Ranking de nodos iniciales: grado de la etiqueta inicial o fan-out multi-salto de cada plantilla (default: degree)')
+    selection_group.add_argument('--label-pool', choices=['first', 'union'], default='first',
+                      help='Nodos por plantilla: los de su primera etiqueta inicial o la unión de todas sus etiquetas iniciales posibles (default: first)')
     selection_group.add_argument('--query-selection-mode', type=validate_selection_mode, default='max',
                       help='Modo(s) de selección de consultas: max, med, min, .25, .75 o combinaciones (default: max)')
     
@@ -2503,13 +4777,63 @@ CONFIGURACIÓN POR DEFECTO:
     selective_group.add_argument('--rq', type=int, default=3,
                         help='Consultas reales por template para SELECCIÓN FINAL (default: 3)')
     
+    load_group = parser.add_argument_group('Pruebas de carga')
+    load_group.add_argument('--concurrency-sweep', type=validate_concurrency_levels, nargs='?', const='auto',
+                        metavar='NIVELES',
+                        help='Barrido en ciclo cerrado con N clientes concurrentes, ej. 1,2,4,8 (sin valor: 1, 2, 4, ... núcleos)')
+    load_group.add_argument('--open-loop', type=validate_arrival_rates, metavar='TASAS',
+                        help='Carga en lazo abierto a tasas fijas en consultas/s, ej. 50,100,200')
+    load_group.add_argument('--arrival', choices=['poisson', 'constant'], default='poisson',
+                        help='Llegadas en lazo abierto: proceso de Poisson o intervalo constante (default: poisson)')
+    load_group.add_argument('--sweep-duration', type=float, default=5,
+                        help='Segundos de carga por nivel de concurrencia (y Q Number) o por tasa de llegada (default: 5)')
+    
+    protocol_group = parser.add_argument_group('Protocolo de medición')
+    protocol_group.add_argument('--warmup', type=validate_warmup_runs, default=0, metavar='K',
+                        help='Ejecuciones de calentamiento por consulta, excluidas de las estadísticas; al '
+                             'reanalizar un log se usa el protocolo guardado junto a él si existe (default: 0)')
+    protocol_group.add_argument('--repeat', type=validate_repeat_runs, default=1, metavar='M',
+                        help='Ejecuciones medidas por consulta tras el calentamiento; con --target-ci es el '
+                             f'mínimo (al menos {ADAPTIVE_MIN_RUNS}) (default: 1)')
+    protocol_group.add_argument('--target-ci', type=validate_relative_width, default=None, metavar='W',
+                        help='Repetir cada consulta hasta que el intervalo de confianza de la mediana sea más '
+                             'estrecho que W veces la mediana, ej. 0.05 (default: número fijo de ejecuciones)')
+    protocol_group.add_argument('--max-repeat', type=validate_repeat_runs, default=ADAPTIVE_MAX_RUNS, metavar='N',
+                        help=f'Con --target-ci, máximo de ejecuciones medidas por consulta (default: {ADAPTIVE_MAX_RUNS})')
+    protocol_group.add_argument('--max-total-runs', type=validate_run_budget, default=0, metavar='T',
+                        help='Con --target-ci, máximo de ejecuciones medidas en total: al alcanzarlo no se envían '
+                             'más ejecuciones y las consultas restantes quedan sin medir (default: 0, sin límite)')
+    
+    stats_group = parser.add_argument_group('Estadísticas de latencia')
+    stats_group.add_argument('--rank-by', choices=list(RANKING_ORDERS), default='paths',
+                        help='Ordenar los rankings por promedio de paths, por un percentil de latencia por '
+                             'ejecución o por el promedio de una fase (parser, optimizer, execution), de más '
+                             'lento a más rápido (default: paths)')
+    stats_group.add_argument('--bootstrap', type=validate_bootstrap_resamples, default=BOOTSTRAP_RESAMPLES, metavar='N',
+                        help=f'Remuestreos bootstrap para los intervalos de confianza; 0 los desactiva '
+                             f'(default: {BOOTSTRAP_RESAMPLES})')
+    
+    cache_group = parser.add_argument_group('Caché del sistema operativo')
+    cache_group.add_argument('--cache-mode', choices=list(CACHE_MODES), default='none',
+                        help='none: no tocar la caché; warm: precargar la base de datos antes de medir; '
+                             'cold: además, repetir las consultas reiniciando el servidor con la base de datos '
+                             'fuera de la caché y reportar frío y caliente lado a lado (default: none)')
+    cache_group.add_argument('--cold-restart', choices=list(COLD_RESTART_SCOPES), default='query',
+                        help='En modo cold, reiniciar el servidor antes de cada consulta o de cada plantilla '
+                             '(default: query)')
+    
     results_group = parser.add_argument_group('Manejo de archivos de resultados')
     results_group.add_argument('--use-existing', action='store_true', default=True,
                         help='Usar archivo de resultados existente (default: True)')
     results_group.add_argument('--calculate-new', action='store_true', default=False,
                         help='Calcular nuevos resultados ejecutando consultas')
     results_group.add_argument('--result-file', type=str, default='result_1.txt',
-                        help='Archivo de resultados a usar cuando --use-existing está activo (default: result_1.txt)')
+                        help='Archivo de resultados a usar cuando --use-existing está activo: log del servidor o almacén '
+                             'mediciones.npz de una ejecución anterior (default: result_1.txt)')
+    results_group.add_argument('--log-workers', type=int, default=1,
+                        help='Procesos para parsear el log de resultados: 1 = serial, 0 = todos los núcleos (default: 1)')
+    results_group.add_argument('--export-workers', type=int, default=1,
+                        help='Procesos para escribir los libros Excel de resultados: 1 = serial, 0 = todos los núcleos (default: 1)')
     results_group.add_argument('--use-rankings', type=str, metavar='SCALE',
                         help='Usar rankings existentes del scale factor especificado (ej: 01, 03, 1, 3)')
     
@@ -2569,14 +4893,41 @@ CONFIGURACIÓN POR DEFECTO:
             result_file=result_file,
             nodes_per_label_explicit=nodes_per_label_explicit,
             use_rankings=getattr(args, 'use_rankings', None),
-            calculate_new=args.calculate_new
+            calculate_new=args.calculate_new,
+            edge_workers=args.edge_workers,
+            degree_cache=not args.no_degree_cache,
+            node_ranking=args.node_ranking,
+            prune_empty=args.prune_empty,
+            label_pool=args.label_pool,
+            export_script=args.export_script,
+            concurrency_levels=args.concurrency_sweep,
+            sweep_duration=args.sweep_duration,
+            arrival_rates=args.open_loop,
+            arrival=args.arrival,
+            log_workers=args.log_workers,
+            export_workers=args.export_workers,
+            batch=args.batch,
+            server_ready_timeout=args.server_timeout,
+            warmup=args.warmup,
+            repeat=args.repeat,
+            cache_mode=args.cache_mode,
+            cold_restart=args.cold_restart,
+            bootstrap_resamples=args.bootstrap,
+            rank_by=args.rank_by,
+            target_ci=args.target_ci,
+            max_repeat=args.max_repeat,
+            max_total_runs=args.max_total_runs
         )
         
         if args.db_path:
             benchmark.db_path = args.db_path
         
-        benchmark.start()
+        results = benchmark.start()
+        if results.get('status') != 'ok':
+            sys.exit(1)
         
+    except KeyboardInterrupt:
+        sys.exit(130)
     except argparse.ArgumentTypeError as e:
         print(f"\nERROR DE TIPO: {e}")
         print("Ejemplos de modos válidos: max, med, min, .25, .75, max+min, med+min, max+med+min, .25+.75")